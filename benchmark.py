@@ -0,0 +1,112 @@
+"""
+Simulation scaling benchmark: time per day vs roster size (headless, no avatars).
+
+Usage:
+    python benchmark.py [sizes...] [--days N] [--seeds N] [--movement objects|array] [--map] [--memory]
+
+--movement picks the movement phase backend ("array" needs numpy), the "move ms"
+column is its share of a day. --map also times print_map() (rendering the map
+image), --memory reports peak traced memory per game (slower).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from game.game_state import GameState
+
+DEFAULT_SIZES = [48, 250, 500, 1000, 2500, 5000]
+
+def make_players(n: int) -> dict:
+    return {str(i): {"name": f"player{i:05d}", "img": ""} for i in range(n)}
+
+def run_game(world_data: dict, event_data: dict, n: int, seed: int, max_days: int, render_map: bool,
+             movement: str = "objects"):
+    """
+    Return: (player-days simulated, [turn seconds], [map seconds], [movement phase seconds])
+    """
+    game = GameState(world_data, make_players(n), event_data, output_function=lambda *args: None,
+                     seed=seed, avatars=False, movement=movement)
+    game.set_event_printer(lambda this, event_data: None)
+    turn_times = []
+    map_times = []
+    move_times = []
+    def timed(move):
+        def timed_move(*args):
+            start = time.perf_counter()
+            result = move(*args)
+            move_times.append(time.perf_counter() - start)
+            return result
+        return timed_move
+    if game._array_movement is not None:
+        game._array_movement.move = timed(game._array_movement.move)
+    else:
+        game._move = timed(game._move)
+    player_days = 0
+    while game.get_num_alive_players() > 1 and len(turn_times) < max_days:
+        player_days += game.get_num_alive_players()
+        start = time.perf_counter()
+        game.turn()
+        turn_times.append(time.perf_counter() - start)
+        if render_map:
+            start = time.perf_counter()
+            game.print_map()
+            map_times.append(time.perf_counter() - start)
+    return player_days, turn_times, map_times, move_times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=DEFAULT_SIZES)
+    parser.add_argument('--days', type=int, default=200, help="max days per game")
+    parser.add_argument('--seeds', type=int, default=3, help="games per size")
+    parser.add_argument('--movement', choices=["objects", "array"], default="objects", help="movement phase backend")
+    parser.add_argument('--map', action='store_true', help="also time print_map()")
+    parser.add_argument('--memory', action='store_true', help="report peak memory (tracemalloc)")
+    args = parser.parse_args()
+
+    with open('game/world_data.json') as f:
+        world_data = json.load(f)
+    with open('game/event_data.json') as f:
+        event_data = json.load(f)
+
+    header = f"{'players':>8} {'days':>6} {'day 1 ms':>9} {'avg day ms':>11} {'us/player-day':>14} {'move ms':>8}"
+    if args.map:
+        header += f" {'map ms':>8}"
+    if args.memory:
+        header += f" {'peak MB':>8}"
+    print(header)
+    for n in args.sizes:
+        days = []
+        first_day = []
+        total_time = 0
+        player_days = 0
+        map_times = []
+        move_times = []
+        peak = 0
+        for seed in range(args.seeds):
+            if args.memory:
+                tracemalloc.start()
+            game_player_days, turn_times, game_map_times, game_move_times = run_game(
+                    world_data, event_data, n, seed, args.days, args.map, args.movement)
+            if args.memory:
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            days.append(len(turn_times))
+            first_day.append(turn_times[0])
+            total_time += sum(turn_times)
+            map_times += game_map_times
+            move_times += game_move_times
+            player_days += game_player_days
+        line = (f"{n:>8} {sum(days) / len(days):>6.1f} {sum(first_day) / len(first_day) * 1000:>9.1f}"
+                f" {total_time / sum(days) * 1000:>11.2f} {total_time / player_days * 1e6:>14.2f}"
+                f" {sum(move_times) / len(move_times) * 1000:>8.2f}")
+        if args.map:
+            line += f" {sum(map_times) / len(map_times) * 1000:>8.1f}"
+        if args.memory:
+            line += f" {peak / 2**20:>8.1f}"
+        print(line, flush=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+Outgoing message dispatcher.
+
+Messages can be queued from any thread (game threads, http server) and are
+sent to the bound channel by a task on the bot's event loop. The task sleeps
+until something is queued instead of polling.
+
+Flow control:
+    - Short text messages are batched together (up to ~1000 characters).
+    - Consecutive attachments go out in one message (up to MAX_FILES_PER_MESSAGE
+      files and MESSAGE_MAX_BYTES), with the text queued just before them as its content.
+    - After `PAUSE_AFTER` sends in one burst, sending pauses until `resume()`
+      (the `$resume` command) is called.
+    - Sends go through a token bucket sized to discord's per-channel limit,
+      and a 429 response drains the bucket until its reset time.
+    - Other failed sends are retried up to SEND_ATTEMPTS times; after that the
+      message is dropped (and logged) so it can't hold up the rest of the queue.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from io import BytesIO
+from threading import Lock
+
+import discord
+from PIL import Image
+
+from encode import EncodedImage, encode_async
+
+log = logging.getLogger(__name__)
+
+PAUSE_AFTER = 5
+TEXT_BATCH_CHARS = 1000
+# Discord limits: attachments per message, upload size per message, message length.
+MAX_FILES_PER_MESSAGE = 10
+MESSAGE_MAX_BYTES = int(os.environ.get('MESSAGE_MAX_BYTES', 8 * 1024 * 1024))
+MESSAGE_MAX_CHARS = 2000
+# Discord allows 5 messages per 5 seconds per channel.
+RATE_LIMIT_COUNT = int(os.environ.get('RATE_LIMIT_COUNT', 5))
+RATE_LIMIT_SECONDS = float(os.environ.get('RATE_LIMIT_SECONDS', 5.0))
+SEND_ATTEMPTS = 3
+SEND_RETRY_SECONDS = 1.0
+PAUSE_MESSAGE = 'Paused sending messages -- type `$resume` or react ▶️ to resume'
+
+class TokenBucket:
+    """
+    Token bucket rate limiter (for use on one event loop).
+    """
+    def __init__(self, capacity: int, period: float):
+        """
+        capacity:   max burst size
+        period:     seconds to refill a full bucket
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._tokens = float(capacity)
+        self._last = time.monotonic()
+        self._blocked_until = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        if now < self._blocked_until:
+            self._last = now
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            wait = max((1 - self._tokens) / self.rate, self._blocked_until - time.monotonic())
+            await asyncio.sleep(wait)
+
+    def update_from_headers(self, headers):
+        """
+        Apply discord rate limit headers (X-RateLimit-Remaining, X-RateLimit-Reset-After, Retry-After).
+        """
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            self._tokens = min(self._tokens, float(remaining))
+        reset_after = headers.get('X-RateLimit-Reset-After', headers.get('Retry-After'))
+        if reset_after is not None and (remaining is None or float(remaining) == 0):
+            self._tokens = 0
+            self._blocked_until = time.monotonic() + float(reset_after)
+
+class MessageDispatcher:
+    """
+    Thread-safe outgoing message queue for one channel, drained by an asyncio task.
+    """
+    def __init__(self, channel=None, is_active=lambda: True):
+        """
+        channel:    channel to send to (can be set later)
+        is_active:  callable, messages are held while it returns False
+        """
+        self.channel = channel
+        self.paused = False
+        self._is_active = is_active
+        self._pending = deque()         # (enqueue time, content)
+        self._pending_lock = Lock()
+        self._loop: asyncio.AbstractEventLoop = None
+        self._wakeup: asyncio.Event = None
+        self._idle: asyncio.Event = None
+        self._sending: asyncio.Event = None
+        self._task = None
+        self._bucket = TokenBucket(RATE_LIMIT_COUNT, RATE_LIMIT_SECONDS)
+        self._failures = 0                      # failed sends of the current message
+        self.send_latency = deque(maxlen=100)   # seconds from queue to sent
+        self.sent_count = 0
+        self.dropped_count = 0
+
+    def start(self):
+        """
+        Start the dispatch task on the running event loop. Safe to call more than once.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._sending = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        self.wake()
+
+    def wake(self):
+        """
+        Wake the dispatch task. Callable from any thread.
+        """
+        if self._loop is None:
+            return
+        try:
+            if self._loop is asyncio.get_running_loop():
+                self._wakeup.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def queue_message(self, content):
+        """
+        Queue a string, PIL image or EncodedImage. Callable from any thread.
+        """
+        with self._pending_lock:
+            self._pending.append((time.monotonic(), content))
+        self.wake()
+
+    def resume(self):
+        self.paused = False
+        self.wake()
+
+    def clear(self):
+        with self._pending_lock:
+            self._pending.clear()
+
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        latency = list(self.send_latency)
+        return {
+            "queue_depth": self.queue_depth(),
+            "paused": self.paused,
+            "sent": self.sent_count,
+            "dropped": self.dropped_count,
+            "avg_send_latency": sum(latency) / len(latency) if latency else 0,
+            "max_send_latency": max(latency) if latency else 0,
+        }
+
+    def _pop(self):
+        with self._pending_lock:
+            if self._pending:
+                return self._pending.popleft()
+        return None
+
+    def _push_front(self, item):
+        with self._pending_lock:
+            self._pending.appendleft(item)
+
+    def _pop_attachment(self):
+        """
+        Pop the next item if it is an image.
+        """
+        with self._pending_lock:
+            if self._pending and isinstance(self._pending[0][1], (Image.Image, EncodedImage)):
+                return self._pending.popleft()
+        return None
+
+    async def _encoded(self, content) -> EncodedImage:
+        """
+        `content` as an EncodedImage, or None (counted as dropped) if it fails to encode.
+        """
+        if isinstance(content, EncodedImage):
+            return content
+        # Encode in the worker pool so zlib doesn't block the event loop.
+        try:
+            return await encode_async(content)
+        except Exception:
+            log.exception("Dropping image that failed to encode")
+            self.dropped_count += 1
+            return None
+
+    async def _collect_attachments(self, first) -> list:
+        """
+        `first` and the images queued right after it, as many as fit in one message.
+        Images that fail to encode are left out, so the list can be empty.
+        """
+        encoded = await self._encoded(first)
+        files = [encoded] if encoded is not None else []
+        nbytes = sum(encoded.nbytes for encoded in files)
+        while len(files) < MAX_FILES_PER_MESSAGE:
+            item = self._pop_attachment()
+            if item is None:
+                break
+            encoded = await self._encoded(item[1])
+            if encoded is None:
+                continue
+            if files and nbytes + encoded.nbytes > MESSAGE_MAX_BYTES:
+                self._push_front((item[0], encoded))
+                break
+            files.append(encoded)
+            nbytes += encoded.nbytes
+        return files
+
+    @staticmethod
+    def _discord_files(files: list) -> list:
+        names = set()
+        result = []
+        for i, encoded in enumerate(files):
+            filename = encoded.filename
+            if filename in names:
+                stem, _, ext = filename.rpartition('.')
+                filename = f"{stem}-{i}.{ext}"
+            names.add(filename)
+            result.append(discord.File(fp=BytesIO(encoded.data), filename=filename))
+        return result
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self.sending():
+                # Nothing will go out until resumed/rebound/reactivated: don't keep waiters blocked.
+                self._idle.set()
+                continue
+            self._sending.set()
+            self._idle.clear()
+            try:
+                await self._drain()
+            except Exception:
+                # Don't leave the rest of the queue (and anyone in wait_idle) stuck until the next message.
+                log.exception("Dispatcher error")
+                self._loop.call_later(1, self.wake)
+            if not self._pending or self.paused:
+                self._idle.set()
+
+    def sending(self) -> bool:
+        """
+        False while messages are held: paused, no channel, or the bot inactive.
+        """
+        return not self.paused and self.channel is not None and self._is_active()
+
+    async def wait_idle(self):
+        """
+        Wait until everything queued so far has been sent (or sending is held, see `sending()`).
+        """
+        if self._task is None:
+            return
+        while self._pending and self.sending():
+            self._idle.clear()
+            self.wake()
+            await self._idle.wait()
+
+    async def wait_sent(self) -> bool:
+        """
+        Wait until everything queued so far has been sent.
+        Return False instead of waiting if sending is held (paused, no channel, bot inactive)
+        with messages still queued, so callers holding a lock don't block until `resume()`.
+        """
+        if self._task is None:
+            return not self._pending
+        while self._pending or self.paused:
+            if not self.sending():
+                return False
+            self._idle.clear()
+            self.wake()
+            await self._idle.wait()
+        return True
+
+    async def wait_sending(self, timeout: float = None) -> bool:
+        """
+        Wait (at most `timeout` seconds) until sending is no longer held. Return `sending()`.
+        """
+        if self._task is not None and not self.sending():
+            self._sending.clear()
+            self.wake()
+            try:
+                await asyncio.wait_for(self._sending.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.sending()
+
+    async def _send(self, queued_at: float, **kwargs) -> bool:
+        """
+        Send one message. Return False if the caller should send it again (rate limited,
+        or failed fewer than SEND_ATTEMPTS times); True once it was sent or dropped.
+        """
+        await self._bucket.acquire()
+        try:
+            await self.channel.send(**kwargs)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self._bucket.update_from_headers(e.response.headers)
+                return False
+            return await self._failed(e)
+        except Exception as e:
+            return await self._failed(e)
+        self._failures = 0
+        self.sent_count += 1
+        self.send_latency.append(time.monotonic() - queued_at)
+        return True
+
+    async def _failed(self, error: Exception) -> bool:
+        self._failures += 1
+        if self._failures < SEND_ATTEMPTS:
+            log.warning("Send failed (attempt %d of %d): %s", self._failures, SEND_ATTEMPTS, error)
+            await asyncio.sleep(SEND_RETRY_SECONDS * self._failures)
+            return False
+        log.error("Dropping message after %d failed sends: %s", self._failures, error)
+        self._failures = 0
+        self.dropped_count += 1
+        return True
+
+    async def _drain(self):
+        sent_msgs = 0
+        buffered = []
+        buffered_len = 0
+        buffered_since = None
+        while True:
+            item = self._pop()
+            if item is None:
+                break
+            queued_at, content = item
+            if isinstance(content, str):
+                if not buffered:
+                    buffered_since = queued_at
+                buffered.append(content)
+                buffered_len += len(content) + 1
+                if buffered_len > TEXT_BATCH_CHARS:
+                    while not await self._send(buffered_since, content='\n'.join(buffered)):
+                        pass
+                    buffered = []
+                    buffered_len = 0
+                    sent_msgs += 1
+            else:
+                text = '\n'.join(buffered) if buffered else None
+                is_image = isinstance(content, (Image.Image, EncodedImage))
+                if text is not None and (not is_image or len(text) > MESSAGE_MAX_CHARS):
+                    while not await self._send(buffered_since, content=text):
+                        pass
+                    text = None
+                    sent_msgs += 1
+                if is_image:
+                    files = await self._collect_attachments(content)
+                    if files or text is not None:
+                        # Text queued just before the images rides along as the message content.
+                        since = buffered_since if text is not None else queued_at
+                        while not await self._send(since, content=text, files=self._discord_files(files)):
+                            pass
+                        sent_msgs += 1
+                buffered = []
+                buffered_len = 0
+            if sent_msgs >= PAUSE_AFTER and self._pending:
+                self.paused = True
+                break
+        if buffered:
+            while not await self._send(buffered_since, content='\n'.join(buffered)):
+                pass
+        if self.paused:
+            await self._send(time.monotonic(), content=PAUSE_MESSAGE)
@@ -0,0 +1,184 @@
+"""
+Image encoding for outgoing discord attachments.
+
+The map and event cards are mostly flat colour, so a palette PNG is usually a
+fraction of the size of a default RGBA PNG. Encoding is done off the asyncio
+thread (zlib is slow and pillow releases the GIL while compressing).
+
+Usage:
+    encoded = await encode_async(image)
+    await channel.send(file=discord.File(fp=BytesIO(encoded.data), filename=encoded.filename))
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+from typing import List, Optional
+
+from PIL import Image
+
+from metrics import histogram
+
+# Total time we are willing to spend trying profiles for one image (milliseconds).
+# The first applicable profile always runs, so an image is never dropped.
+ENCODE_BUDGET_MS = float(os.environ.get('ENCODE_BUDGET_MS', 250))
+ENCODE_WORKERS = int(os.environ.get('ENCODE_WORKERS', 2))
+# Allow lossy palette quantization for images with more than 256 colours (avatars).
+ENCODE_LOSSY = os.environ.get('ENCODE_LOSSY', '1') != '0'
+
+EncodedImage = namedtuple("EncodedImage", ["data", "filename", "profile", "nbytes", "encode_ms"])
+
+class EncodeProfile:
+    """
+    One way of turning an image into bytes.
+    Keeps a running estimate of its own cost (ms per megapixel) so the encoder
+    can skip it when it would not fit in the remaining budget.
+    """
+    def __init__(self, name: str, fmt: str, ext: str, save_args: dict, palette: str = None):
+        """
+        name:       profile name (for stats)
+        fmt:        pillow format name
+        ext:        file extension
+        save_args:  extra args for Image.save
+        palette:    None (keep mode), 'exact' (only if <= 256 colours), or 'quantize' (lossy)
+        """
+        self.name = name
+        self.fmt = fmt
+        self.ext = ext
+        self.save_args = save_args
+        self.palette = palette
+        self.ms_per_mpx = None
+
+    def prepare(self, image: Image) -> Optional[Image]:
+        """
+        Convert the image for this profile. Return None if the profile does not apply.
+        """
+        if self.palette is None:
+            return image
+        # Median cut is exact when there are <= 256 colours, but only works on RGB.
+        exact = image.mode == 'RGB' and image.getcolors(256) is not None
+        if self.palette == 'exact':
+            if not exact:
+                return None
+            return image.quantize(colors=256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+        if self.palette == 'quantize':
+            if exact or not ENCODE_LOSSY:
+                return None
+            return image.quantize(colors=256, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        return None
+
+    def predict_ms(self, megapixels: float) -> float:
+        if self.ms_per_mpx is None:
+            return 0
+        return self.ms_per_mpx * megapixels
+
+    def record(self, megapixels: float, elapsed_ms: float):
+        sample = elapsed_ms / max(megapixels, 1e-3)
+        if self.ms_per_mpx is None:
+            self.ms_per_mpx = sample
+        else:
+            self.ms_per_mpx = 0.8 * self.ms_per_mpx + 0.2 * sample
+
+# Tried in order. Cheap and likely-small first.
+PROFILES: List[EncodeProfile] = [
+    EncodeProfile("png-palette", "PNG", "png", {"optimize": True}, palette='exact'),
+    EncodeProfile("png-quantized", "PNG", "png", {"optimize": True}, palette='quantize'),
+    EncodeProfile("png-fast", "PNG", "png", {"compress_level": 3}),
+]
+
+ENCODE_POOL = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+_stats_lock = Lock()
+# Most recent attachments: (filename, profile, bytes, encode ms)
+ENCODE_STATS = deque(maxlen=256)
+# Running average of encoded bytes per megapixel, by image name (eg. "events"), for predict_bytes.
+_BYTES_PER_MPX = dict()
+ENCODE_SECONDS = histogram("atlas_encode_seconds", "Attachment encode time, by chosen profile", ["profile"])
+
+def _flatten(image: Image) -> Image:
+    """
+    Drop the alpha channel if the image is fully opaque (always true for our cards/maps).
+    """
+    if image.mode == 'RGBA':
+        alpha_min, _ = image.getextrema()[3]
+        if alpha_min == 255:
+            return image.convert('RGB')
+    elif image.mode not in ('RGB', 'L', 'P'):
+        return image.convert('RGBA')
+    return image
+
+def encode_image(image: Image, name: str = "content", budget_ms: float = None) -> EncodedImage:
+    """
+    Encode an image, picking the smallest output among the profiles that fit in the time budget.
+    Thread safe; meant to be run in ENCODE_POOL.
+    """
+    if budget_ms is None:
+        budget_ms = ENCODE_BUDGET_MS
+    start = time.perf_counter()
+    image = _flatten(image)
+    megapixels = image.size[0] * image.size[1] / 1e6
+
+    best = None
+    for profile in PROFILES:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if best is not None and elapsed_ms + profile.predict_ms(megapixels) > budget_ms:
+            continue
+        profile_start = time.perf_counter()
+        prepared = profile.prepare(image)
+        if prepared is None:
+            continue
+        with BytesIO() as buf:
+            prepared.save(buf, profile.fmt, **profile.save_args)
+            data = buf.getvalue()
+        profile.record(megapixels, (time.perf_counter() - profile_start) * 1000)
+        if best is None or len(data) < len(best[1]):
+            best = (profile, data)
+
+    profile, data = best
+    encode_ms = (time.perf_counter() - start) * 1000
+    result = EncodedImage(data, f"{name}.{profile.ext}", profile.name, len(data), encode_ms)
+    with _stats_lock:
+        ENCODE_STATS.append((result.filename, result.profile, result.nbytes, result.encode_ms))
+        density = len(data) / max(megapixels, 1e-3)
+        previous = _BYTES_PER_MPX.get(name, None)
+        _BYTES_PER_MPX[name] = density if previous is None else 0.8 * previous + 0.2 * density
+    ENCODE_SECONDS.labels(profile.name).observe(encode_ms / 1000)
+    return result
+
+def predict_bytes(name: str, size) -> Optional[float]:
+    """
+    Expected encoded size of a `size` (width, height) image named `name`, from recent
+    encodes of images with that name. None until one has been encoded.
+    """
+    density = _BYTES_PER_MPX.get(name, None)
+    if density is None:
+        return None
+    return density * size[0] * size[1] / 1e6
+
+async def encode_async(image: Image, name: str = "content") -> EncodedImage:
+    """
+    Encode an image in the encoder pool without blocking the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(ENCODE_POOL, encode_image, image, name)
+
+def encode_stats() -> dict:
+    """
+    Summary of recent attachment encodes.
+    """
+    with _stats_lock:
+        records = list(ENCODE_STATS)
+    if not records:
+        return {"count": 0}
+    return {
+        "count": len(records),
+        "total_bytes": sum(r[2] for r in records),
+        "avg_bytes": sum(r[2] for r in records) / len(records),
+        "avg_ms": sum(r[3] for r in records) / len(records),
+        "max_ms": max(r[3] for r in records),
+        "last": records[-1],
+    }
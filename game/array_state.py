@@ -0,0 +1,203 @@
+"""
+Array (NumPy) backed movement phase, for headless batch runs.
+
+GameState._move walks teams and players one at a time through the object model.
+Here the world is a CSR adjacency array and a day's movement is a handful of
+array operations over every team and player: positions, team ids, hunt counters
+and alive flags live in arrays, and only the result (new positions, players
+splitting off into solo teams) is written back to the objects for the event phase.
+
+Same rules and same keyed random draws (game/rng.py) as GameState._move,
+so a seeded game plays out exactly as with the object model.
+Select it with GameState(..., movement="array").
+
+numpy is optional (it's not in requirements.txt); only this backend needs it.
+"""
+from __future__ import annotations
+
+from collections import deque
+from itertools import compress
+from operator import attrgetter
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from game.game_constants import FOLLOW_TEAM_CHANCE, MOVE_CHANCE
+from game.world import WorldGraph
+
+class CSRWorld:
+    """
+    World graph as arrays (node indices 0..n-1, in WorldGraph.ids order).
+    """
+    __slots__ = ("ids", "index", "indptr", "indices", "degree", "bfs_rank", "next_hop")
+
+    def __init__(self, graph: WorldGraph):
+        self.ids = list(graph.ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.ids)}
+        edges = [[self.index[neighbor] for neighbor in graph.edges[node_id]] for node_id in self.ids]
+        n = len(edges)
+        self.degree = np.array([len(neighbors) for neighbors in edges], dtype=np.intp)
+        self.indptr = np.concatenate(([0], np.cumsum(self.degree))).astype(np.intp)
+        self.indices = np.array([neighbor for neighbors in edges for neighbor in neighbors], dtype=np.intp)
+        # BFS from every node in World.path_to order:
+        #   bfs_rank[s, t]: position of t in the visiting order from s (n if unreachable)
+        #   next_hop[s, t]: first step of the path from s to t (-1 if none)
+        self.bfs_rank = np.full((n, n), n, dtype=np.intp)
+        self.next_hop = np.full((n, n), -1, dtype=np.intp)
+        for source in range(n):
+            self.bfs_rank[source, source] = 0
+            rank = 1
+            q = deque([source])
+            while q:
+                cur = q.popleft()
+                for neighbor in edges[cur]:
+                    if self.bfs_rank[source, neighbor] == n and neighbor != source:
+                        self.bfs_rank[source, neighbor] = rank
+                        rank += 1
+                        self.next_hop[source, neighbor] = neighbor if cur == source else self.next_hop[source, cur]
+                        q.append(neighbor)
+
+    def random_neighbors(self, nodes, u):
+        """
+        One uniformly random neighbour per node. u: uniform [0, 1) draws, same shape as nodes.
+        """
+        return self.indices[self.indptr[nodes] + (u * self.degree[nodes]).astype(np.intp)]
+
+_LOCATION_ID = attrgetter("location.id")
+_HUNT = attrgetter("hunt")
+_TEAM_ID = attrgetter("team.id")
+
+def _rank_in_group(groups):
+    """
+    For each item, how many items before it have the same group.
+    """
+    order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    positions = np.arange(len(groups))
+    starts = np.ones(len(groups), dtype=bool)
+    starts[1:] = sorted_groups[1:] != sorted_groups[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, positions, 0))
+    rank = np.empty(len(groups), dtype=np.intp)
+    rank[order] = positions - group_start
+    return rank
+
+class ArrayMovement:
+    """
+    Movement phase of one game on arrays.
+
+    Players keep a fixed index (name order, like GameState._move); their positions
+    and alive flags persist between days. Teams change every day (events merge and
+    split them), so team arrays are rebuilt from GameState._teams at the start of each move.
+    """
+    def __init__(self, graph: WorldGraph, players: list, player_keys: dict):
+        """
+        players:     every player of the game
+        player_keys: map (player name, key for keyed random draws) (GameState._player_keys)
+        """
+        if np is None:
+            raise RuntimeError("movement='array' needs numpy (pip install numpy)")
+        self.world = CSRWorld(graph)
+        self.players = sorted(players, key=lambda p: p.name)
+        self.player_keys = np.array([player_keys[p.name] for p in self.players], dtype=np.intp)
+        self.player_node = np.array([self.world.index[p.location.id] for p in self.players], dtype=np.intp)
+        self.alive = np.array([p.alive for p in self.players], dtype=bool)
+        self._index = {p.name: i for i, p in enumerate(self.players)}
+        self._num_dead = 0
+
+    def move(self, game, event_list: list) -> set:
+        """
+        Move every team and player for one day, like GameState._move.
+        Return the names of players whose team started hunting (they sit out the event phase).
+        """
+        world = self.world
+        day = game._turn_counter
+        streams = game._streams
+        for player in game._dead_players[self._num_dead:]:
+            self.alive[self._index[player.name]] = False
+        self._num_dead = len(game._dead_players)
+
+        # map/attrgetter keep these per-object loops in C.
+        teams = list(game._teams.values())
+        team_ids = np.fromiter(game._teams.keys(), dtype=np.intp, count=len(teams))
+        team_index = dict(zip(game._teams.keys(), range(len(teams))))
+        num_teams = len(teams)
+        team_node = np.fromiter(map(world.index.__getitem__, map(_LOCATION_ID, teams)), dtype=np.intp, count=num_teams)
+        team_hunt = np.fromiter(map(_HUNT, teams), dtype=np.intp, count=num_teams)
+        alive_idx = np.flatnonzero(self.alive)
+        players = list(compress(self.players, self.alive))
+        player_team = np.fromiter(map(team_index.__getitem__, map(_TEAM_ID, players)), dtype=np.intp, count=len(players))
+        player_node = self.player_node[alive_idx]
+        team_size = np.bincount(player_team, minlength=num_teams)
+
+        # Teams: start hunting, follow a hunt, or random walk.
+        start_hunt = (team_hunt == 0) & (streams.draws("hunt", day).uniforms(team_ids) < game._hunt_chance)
+        moving = ~start_hunt & (streams.draws("move", day).uniforms(team_ids) < MOVE_CHANCE)
+        walking = moving & (team_hunt == 0)
+        new_team_node = team_node.copy()
+        hunters = np.flatnonzero(moving & (team_hunt > 0))
+        hunted = hunters[:0]
+        if len(hunters):
+            # Nearest node (in path_to order) with a player from another team.
+            n = len(world.ids)
+            row = np.full(num_teams, -1, dtype=np.intp)
+            row[hunters] = np.arange(len(hunters))
+            own = np.zeros((len(hunters), n), dtype=np.intp)
+            mine = row[player_team] >= 0
+            np.add.at(own, (row[player_team[mine]], player_node[mine]), 1)
+            enemy = np.bincount(player_node, minlength=n)[None, :] > own
+            src = team_node[hunters]
+            rank = np.where(enemy, world.bfs_rank[src], n)
+            target = rank.argmin(axis=1)
+            # No enemy anywhere, or one right here (empty path): random walk instead.
+            step = (rank[np.arange(len(hunters)), target] < n) & (target != src)
+            hunted = hunters[step]
+            new_team_node[hunted] = world.next_hop[src[step], target[step]]
+            walking[hunters[~step]] = True
+        walkers = np.flatnonzero(walking)
+        new_team_node[walkers] = world.random_neighbors(team_node[walkers],
+                                                        streams.draws("walk", day).uniforms(team_ids[walkers]))
+
+        # Players: follow the team, or split off (the last member of a team always stays).
+        active = ~start_hunt[player_team]
+        player_keys = self.player_keys[alive_idx]
+        wants_split = active & (streams.draws("follow", day).uniforms(player_keys) >= FOLLOW_TEAM_CHANCE)
+        split = np.zeros(len(players), dtype=bool)
+        candidates = np.flatnonzero(wants_split)
+        if len(candidates):
+            split[candidates] = _rank_in_group(player_team[candidates]) < team_size[player_team[candidates]] - 1
+        new_player_node = player_node.copy()
+        follow = active & ~split
+        new_player_node[follow] = new_team_node[player_team[follow]]
+        splitters = np.flatnonzero(split)
+        new_player_node[splitters] = world.random_neighbors(player_node[splitters],
+                                                            streams.draws("split", day).uniforms(player_keys[splitters]))
+        self.player_node[alive_idx] = new_player_node
+
+        # Write back to the objects.
+        nodes = [game._world.node(node_id) for node_id in world.ids]
+        hunting_players = set()
+        for i in np.flatnonzero(start_hunt).tolist():
+            game._start_hunt(teams[i], event_list)
+            hunting_players.update(teams[i].players.keys())
+        for i in hunted.tolist():
+            teams[i].hunt -= 1
+        moved = np.flatnonzero(new_team_node != team_node)
+        for i, node in zip(moved.tolist(), new_team_node[moved].tolist()):
+            teams[i].move_to(nodes[node])
+        moved = np.flatnonzero(new_player_node != player_node)
+        for i, node in zip(moved.tolist(), new_player_node[moved].tolist()):
+            players[i].move_to(nodes[node])
+        for i in splitters.tolist():
+            player = players[i]
+            del player.team.players[player.name]
+            player.team = game._new_team(None, {player.name: player}, player.location)
+        return hunting_players
+
+    def positions(self) -> List[int]:
+        """
+        Node id of every player (dead players: where they died), in name order.
+        """
+        return [self.world.ids[i] for i in self.player_node]
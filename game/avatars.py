@@ -0,0 +1,56 @@
+"""
+Process-wide cache of downloaded player avatars (64x64 thumbnails), keyed by url.
+
+Avatars rarely change between games, so $newgame only downloads the ones it
+hasn't seen yet. Cached images are shared between games and must not be mutated.
+"""
+from __future__ import annotations
+
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from PIL import Image
+
+from metrics import counter
+
+AVATAR_CACHE_SIZE = int(os.environ.get('AVATAR_CACHE_SIZE', 2048))
+
+AVATAR_LOOKUPS = counter("atlas_avatar_cache_lookups", "Avatar cache lookups", ["result"])
+_HIT = AVATAR_LOOKUPS.labels("hit")
+_MISS = AVATAR_LOOKUPS.labels("miss")
+
+class AvatarCache:
+    """
+    Thread-safe LRU of url -> Image.
+    """
+    def __init__(self, max_size: int = AVATAR_CACHE_SIZE):
+        self.max_size = max_size
+        self._images = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, url: str) -> Image:
+        if not url:
+            return None
+        with self._lock:
+            image = self._images.get(url, None)
+            if image is not None:
+                self._images.move_to_end(url)
+        (_HIT if image is not None else _MISS).inc()
+        return image
+
+    def put(self, url: str, image: Image):
+        if not url:
+            return
+        with self._lock:
+            self._images[url] = image
+            self._images.move_to_end(url)
+            while len(self._images) > self.max_size:
+                self._images.popitem(last=False)
+
+    def __len__(self):
+        return len(self._images)
+
+AVATAR_CACHE = AvatarCache()
+# Stand-in for every player when avatars are off (large/headless games).
+BLANK_AVATAR = Image.new(mode='RGBA', size=(64, 64), color=(114, 118, 125, 255))
@@ -0,0 +1,230 @@
+"""
+Compiled world + event data ("data pack"), shared by every game.
+
+The world graph and event tables are parsed, validated and compiled once into
+immutable objects (WorldGraph, tuples of read-only event mappings). Compiled packs
+are cached on disk keyed by the sha256 of the source files, so a restart with
+unchanged data skips parsing and validation.
+
+DataPackLoader.get() returns the current pack and reloads it when the source
+files change; the swap is a single reference assignment, so running games keep
+the pack they started with and new games get the new one. A pack that fails
+validation is reported and the previous one stays in use.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from threading import Lock
+from types import MappingProxyType
+from typing import List, Mapping
+
+from game.event_parse import check_event, event_metadata
+from game.game_constants import EVENT_PROBABILITY
+from game.world import WorldGraph
+
+WORLD_DATA_PATH = "game/world_data.json"
+EVENT_DATA_PATH = "game/event_data.json"
+DATAPACK_CACHE_DIR = os.environ.get('DATAPACK_CACHE_DIR', ".datapack_cache")
+# Don't stat the source files more often than this.
+DATAPACK_CHECK_SECONDS = float(os.environ.get('DATAPACK_CHECK_SECONDS', 2.0))
+# Bump when the compiled format changes.
+DATAPACK_FORMAT = 2
+
+class DataPackError(ValueError):
+    """
+    Invalid world/event data. `errors` lists every problem found.
+    """
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} data pack error(s):\n" + "\n".join(errors))
+        self.errors = errors
+
+class DataPack:
+    """
+    Immutable compiled world and events.
+    """
+    __slots__ = ("world", "events", "digest")
+
+    def __init__(self, world: WorldGraph, events: Mapping[str, tuple], digest: str):
+        self.world = world          # WorldGraph (pass to GameState as world_data)
+        self.events = events        # Mapping (event type, tuple of events) (pass to GameState as event_data)
+        self.digest = digest        # sha256 of the source files
+
+def validate_world(world_data: dict) -> List[str]:
+    errors = []
+    nodes = world_data.get("nodes", {})
+    for key in ("nodes", "connections", "coordinates", "starting"):
+        if key not in world_data:
+            errors.append(f"world: missing '{key}'")
+    if errors:
+        return errors
+    names = set()
+    for node_id, name in nodes.items():
+        if name in names:
+            errors.append(f"world: duplicate node name {name!r}")
+        names.add(name)
+        if node_id not in world_data["connections"]:
+            errors.append(f"world: node {node_id} has no connections entry")
+        elif not world_data["connections"][node_id]:
+            errors.append(f"world: node {node_id} has no neighbours")
+        else:
+            for neighbor in world_data["connections"][node_id]:
+                if str(neighbor) not in nodes:
+                    errors.append(f"world: node {node_id} connects to unknown node {neighbor}")
+        coords = world_data["coordinates"].get(node_id, None)
+        if coords is None or len(coords) != 2:
+            errors.append(f"world: node {node_id} has no valid coordinates")
+    for node_id in world_data["starting"]:
+        if str(node_id) not in nodes:
+            errors.append(f"world: unknown starting node {node_id}")
+    return errors
+
+def validate_events(event_data: dict) -> List[str]:
+    errors = [f"events: no '{event_type}' events" for event_type in EVENT_PROBABILITY if not event_data.get(event_type)]
+    for event_type, events in event_data.items():
+        for idx, event in enumerate(events):
+            errors += [f"events: {event_type}[{idx}]: {problem}" for problem in check_event(event)]
+    return errors
+
+def _freeze_event(event: Mapping) -> Mapping:
+    frozen = dict(event)
+    frozen["deaths"] = tuple(event["deaths"])
+    frozen["team_list"] = tuple(tuple(team) for team in event["team_list"])
+    frozen["complement_list"] = tuple(tuple(team) for team in event["complement_list"])
+    frozen["team_sizes"] = tuple(event["team_sizes"])
+    frozen["complement_sizes"] = tuple(event["complement_sizes"])
+    frozen["template"] = tuple(tuple(part) for part in event["template"])
+    if "location_ids" in event:
+        frozen["location_ids"] = tuple(event["location_ids"])
+    return MappingProxyType(frozen)
+
+def compile_events(event_data: dict, name_ids: Mapping[str, int], warnings: List[str] = None) -> Mapping[str, tuple]:
+    """
+    Valid event json -> read-only event tables with (re)computed metadata (see game/event_parse.py).
+    """
+    compiled = dict()
+    for event_type, events in event_data.items():
+        frozen = []
+        for idx, event in enumerate(events):
+            event_warnings = []
+            frozen.append(_freeze_event({**event, **event_metadata(event, name_ids, event_warnings)}))
+            if warnings is not None:
+                warnings += [f"events: {event_type}[{idx}]: {warning}" for warning in event_warnings]
+        compiled[event_type] = tuple(frozen)
+    return MappingProxyType(compiled)
+
+def compile_datapack(world_data: dict, event_data: dict, digest: str = "") -> DataPack:
+    """
+    Validate and compile parsed json. Raises DataPackError listing every problem.
+    """
+    errors = validate_world(world_data) + validate_events(event_data)
+    if errors:
+        raise DataPackError(errors)
+    world = WorldGraph.from_json(world_data)
+    warnings = []
+    events = compile_events(event_data, world.name_ids, warnings)
+    for warning in warnings:
+        print(f"Data pack warning: {warning}")
+    return DataPack(world, events, digest)
+
+def _pickle_pack(pack: DataPack) -> bytes:
+    # MappingProxyType can't be pickled; store plain dicts.
+    events = {event_type: [dict(e) for e in events] for event_type, events in pack.events.items()}
+    return pickle.dumps((DATAPACK_FORMAT, pack.world, events, pack.digest), protocol=pickle.HIGHEST_PROTOCOL)
+
+def _unpickle_pack(data: bytes) -> DataPack:
+    version, world, events, digest = pickle.loads(data)
+    if version != DATAPACK_FORMAT:
+        raise ValueError("stale data pack format")
+    events = MappingProxyType({event_type: tuple(_freeze_event(e) for e in events)
+                               for event_type, events in events.items()})
+    return DataPack(world, events, digest)
+
+def load_datapack(world_path: str = WORLD_DATA_PATH, event_path: str = EVENT_DATA_PATH,
+                  cache_dir: str = DATAPACK_CACHE_DIR) -> DataPack:
+    """
+    Load a data pack, from the on-disk cache if these exact files were compiled before.
+    """
+    with open(world_path, 'rb') as f:
+        world_bytes = f.read()
+    with open(event_path, 'rb') as f:
+        event_bytes = f.read()
+    digest = hashlib.sha256(world_bytes + b"\0" + event_bytes).hexdigest()
+    cache_path = os.path.join(cache_dir, f"datapack-{digest[:32]}.pickle") if cache_dir else None
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                pack = _unpickle_pack(f.read())
+            if pack.digest == digest:
+                return pack
+        except Exception as e:
+            print(f"Ignoring data pack cache {cache_path}: {e}")
+    pack = compile_datapack(json.loads(world_bytes), json.loads(event_bytes), digest)
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_pickle_pack(pack))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write data pack cache: {e}")
+    return pack
+
+class DataPackLoader:
+    """
+    Current data pack, reloaded when the source files change.
+    """
+    def __init__(self, world_path: str = WORLD_DATA_PATH, event_path: str = EVENT_DATA_PATH,
+                 cache_dir: str = DATAPACK_CACHE_DIR, check_interval: float = DATAPACK_CHECK_SECONDS):
+        self.world_path = world_path
+        self.event_path = event_path
+        self.cache_dir = cache_dir
+        self.check_interval = check_interval
+        self.pack: DataPack = None
+        self.last_error: Exception = None
+        self._stat_key = None
+        self._checked_at = 0
+        self._lock = Lock()
+
+    def _stat(self):
+        return tuple((st.st_mtime_ns, st.st_size) for st in (os.stat(self.world_path), os.stat(self.event_path)))
+
+    def get(self) -> DataPack:
+        """
+        The current pack (loads it on first use; raises DataPackError if the first load fails).
+        """
+        now = time.monotonic()
+        if self.pack is not None and now - self._checked_at < self.check_interval:
+            return self.pack
+        with self._lock:
+            if self.pack is not None and now - self._checked_at < self.check_interval:
+                return self.pack
+            self._checked_at = now
+            try:
+                key = self._stat()
+            except OSError as e:
+                if self.pack is None:
+                    raise
+                print(f"Data pack files unreadable, keeping the loaded pack: {e}")
+                return self.pack
+            if key == self._stat_key:
+                return self.pack
+            try:
+                pack = load_datapack(self.world_path, self.event_path, self.cache_dir)
+            except (DataPackError, ValueError, OSError) as e:
+                self.last_error = e
+                if self.pack is None:
+                    raise
+                self._stat_key = key     # Don't retry until the files change again
+                print(f"Data pack reload failed, keeping the loaded pack: {e}")
+                return self.pack
+            self._stat_key = key
+            if self.pack is None or pack.digest != self.pack.digest:
+                print(f"Loaded data pack {pack.digest[:12]}")
+            self.pack = pack
+            self.last_error = None
+            return pack
@@ -1,105 +1,211 @@
-import sys
+"""
+Compile events from the gdoc export (tsv) to json.
+
+Usage: python3 event_parse.py [fname] [--world world_data.json] [--output event_data.json]
+
+The tsv is read once, top to bottom, and every problem is reported at the end
+(with line numbers); nothing is written if there are errors. Each event also
+gets precomputed metadata, so the game doesn't re-derive it for every draw:
+    - team_sizes:       len() of each team_list group (team_sizes[0] is the minimum
+                        team size for the source team)
+    - complement_sizes: len() of each complement_list group
+    - solo_count:       players that are neither in a team group nor a complement group
+    - location_ids:     node ids of the special location(s), only for localized events
+                        (empty if none of the names are on the map: the event can't happen)
+    - template:         the text split into [literal, player index or null] pairs
+
+game/datapack.py recomputes the metadata when loading, so hand-edited json stays consistent.
+"""
+from __future__ import annotations
+
+import argparse
 import json
+import string
+import sys
+from typing import Iterable, List, Mapping, Tuple
 
 # Event Text|NumPlayers|Death List|TeamList|Solo|Complement|Radius|type|Special Location Req
 #   0           1           2       3       4       5        6      7           8
+NUM_COLUMNS = 9
 
-"""
-Parse event from gdoc to json.
-
-Usage: python3 event_parse.py [fname]
-"""
+# Keys every event needs (the rest is metadata).
+EVENT_KEYS = ("text", "num_players", "deaths", "team_list", "complement_list", "radius")
 
+_FORMATTER = string.Formatter()
 
-def strToLst(string):
+def parse_list(text: str) -> List[List[int]]:
+    """
+    "[0,1] [2]" -> [[0, 1], [2]]. Brackets are optional for a single group.
+    """
     lst = []
-    if string == '':
+    if text == '':
         return []
-    teststring = string.translate({ord(" "): None, ord('['): " ", ord(']'): " "})
-    lst_of_strings = teststring.split(" ")
-    for item in lst_of_strings:
-        if item not in ['',',']:
-            midway = []
-            for x in item.split(','):
-                    if x.isnumeric():
-                        midway.append(int(x))
-            lst.append(midway)
+    text = text.translate({ord(" "): None, ord('['): " ", ord(']'): " "})
+    for item in text.split(" "):
+        if item not in ['', ',']:
+            lst.append([int(x) for x in item.split(',') if x.isnumeric()])
     return lst
 
-events_by_type = dict()
-
-with open(sys.argv[1], 'r') as input_file:
-    for number,line in enumerate(input_file):
-        if line.endswith('\n'):
-            line = line[:-1]
-        parts = line.split('\t')
-        print(parts)
-        event_type = parts[7]
-        event_data = {
-            "text": parts[0],
-            "num_players": int(parts[1]),
-            "deaths": strToLst(parts[2])[0] if parts[2] != '' else [],
-            "team_list": strToLst(parts[3]),
-            "complement_list": strToLst(parts[5]),
-            "radius": int(parts[6]),
-        }
-
-        if parts[8]:
-            event_data["location"] = parts[8]
-        if event_type in events_by_type:
-            events_by_type[event_type].append(event_data)
+def parse_row(parts: List[str]) -> Tuple[str, dict, int]:
+    """
+    One tsv row -> (event type, event, solo count). Raises ValueError for malformed rows.
+    """
+    if len(parts) < NUM_COLUMNS:
+        raise ValueError(f"expected {NUM_COLUMNS} columns, got {len(parts)}")
+    deaths = parse_list(parts[2])
+    event = {
+        "text": parts[0],
+        "num_players": int(parts[1]),
+        "deaths": deaths[0] if deaths else [],
+        "team_list": parse_list(parts[3]),
+        "complement_list": parse_list(parts[5]),
+        "radius": int(parts[6]),
+    }
+    if parts[8]:
+        event["location"] = parts[8]
+    return parts[7], event, int(parts[4])
+
+def parse_template(text: str) -> List[list]:
+    """
+    "{0} hits {1}." -> [["", 0], [" hits ", 1], [".", None]]. Raises ValueError for anything but {<index>} fields.
+    """
+    template = []
+    for literal, field, format_spec, conversion in _FORMATTER.parse(text):
+        if field is None:
+            template.append([literal, None])
+        elif not field.isdigit() or format_spec or conversion:
+            raise ValueError(f"unsupported field {{{field}}}")
         else:
-            events_by_type[event_type] = [event_data]
-
-        '''
-        Data Validation section
-        '''
-        event_line_number = number + 1
-
-        teamlist = []
-        complist = []
-        deathlist = []
-        teamset = set()
-        compset = set()
-        deathset = set()
-
-        for team in event_data['team_list']:
-            for player in team:
-                teamlist.append(player)
-                teamset.add(player)
-        for team in event_data['complement_list']:
-            for player in team:
-                complist.append(player)
-                compset.add(player)
-        for player in event_data['deaths']:
-            deathlist.append(player)
-            deathset.add(player)
-
-        # Data Validation - checks if the number of players given is equal to TeamList + Solo + Complement
-        if event_data['num_players'] != len(teamset | compset) + int(parts[4]):
-            print(f">>> num_players != TeamList + Solo + Complement in line {event_line_number}\n")
-
-        # Data Validation - checks for duplicates in the different lists
-        if len(teamlist) != len(teamset) or len(complist) != len(compset) or len(deathlist) != len(deathset):
-            print(f">>> a certain list has duplicates in line {event_line_number}\n")
-
-        # Data Validation - checks for TeamList and ComplementList intersection
-        if len(teamset & compset) != 0:
-            print(f">>> team_list and complement_list intersect in line {event_line_number}\n")
-
-        # Data Validation - checks list indices
-        for i in (teamset | compset | deathset):
-            if event_data['num_players'] <= i:
-                print(f">>> list indice is bigger than num_players in line {event_line_number}\n")
-
-        # Data Validation - checks location existence
-        with open('world_data.json') as f:
-            world_data = json.load(f)
-            if 'location' in event_data:
-                for loc in event_data['location'].split(','):
-                    if loc.strip(' ') not in world_data['nodes'].values():
-                        print(f">>> WARNING: {loc} is not a valid location (line {event_line_number})\n")
-
-
-with open("event_data.json", 'w') as outfile:
-    json.dump(events_by_type, outfile)
+            template.append([literal, int(field)])
+    return template
+
+def location_names(event: Mapping) -> List[str]:
+    """
+    Special location requirement, split on commas ("Sky Islands, SE-2" means either of them).
+    """
+    if "location" not in event:
+        return []
+    return [name.strip() for name in event["location"].split(',') if name.strip()]
+
+def check_event(event: Mapping, template: List[list] = None) -> List[str]:
+    """
+    Problems with one event (empty if it's fine). `template`: parse_template(event["text"]), if already parsed.
+    """
+    missing = [key for key in EVENT_KEYS if key not in event]
+    if missing:
+        return [f"missing {', '.join(missing)}"]
+    errors = []
+    n = event["num_players"]
+    team = [i for group in event["team_list"] for i in group]
+    comp = [i for group in event["complement_list"] for i in group]
+    deaths = event["deaths"]
+    team_set = set(team)
+    comp_set = set(comp)
+    if len(team) != len(team_set) or len(comp) != len(comp_set) or len(deaths) != len(set(deaths)):
+        errors.append("a list has duplicates")
+    if team_set & comp_set:
+        errors.append("team_list and complement_list intersect")
+    indices = team_set | comp_set | set(deaths)
+    if indices and (min(indices) < 0 or max(indices) >= n):
+        errors.append(f"player index out of range (num_players={n})")
+    if not all(event["team_list"]):
+        errors.append("empty team_list group")
+    if len(event["complement_list"]) > len(event["team_list"]):
+        errors.append("more complement groups than teams")
+    try:
+        if template is None:
+            template = parse_template(event["text"])
+        if any(index is not None and index >= n for _, index in template):
+            errors.append(f"text refers to players beyond num_players: {event['text']!r}")
+    except ValueError as e:
+        errors.append(f"bad format text ({e}): {event['text']!r}")
+    return errors
+
+def event_metadata(event: Mapping, name_ids: Mapping[str, int], warnings: List[str] = None,
+                   template: List[list] = None) -> dict:
+    """
+    Precomputed metadata for a valid event (see module docstring).
+    name_ids: map (node name, node id). Unknown location names are appended to `warnings`.
+    """
+    team_sizes = [len(group) for group in event["team_list"]]
+    complement_sizes = [len(group) for group in event["complement_list"]]
+    meta = {
+        "team_sizes": team_sizes,
+        "complement_sizes": complement_sizes,
+        "solo_count": event["num_players"] - sum(team_sizes) - sum(complement_sizes),
+        "template": template if template is not None else parse_template(event["text"]),
+    }
+    if "location" in event:
+        meta["location_ids"] = []
+        for name in location_names(event):
+            if name in name_ids:
+                meta["location_ids"].append(name_ids[name])
+            elif warnings is not None:
+                warnings.append(f"unknown location {name!r}")
+        if not meta["location_ids"] and warnings is not None:
+            warnings.append("no known location, event can't happen")
+    return meta
+
+def node_name_ids(world_data: Mapping) -> dict:
+    return {name: int(node_id) for node_id, name in world_data["nodes"].items()}
+
+def compile_tsv(lines: Iterable[str], name_ids: Mapping[str, int]) -> Tuple[dict, List[str], List[str]]:
+    """
+    Return (events by type, errors, warnings). Events are emitted with their metadata.
+    """
+    events_by_type = dict()
+    errors = []
+    warnings = []
+    for number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if not line.strip():
+            continue
+        try:
+            event_type, event, solo = parse_row(line.split('\t'))
+        except ValueError as e:
+            errors.append(f"line {number}: {e}")
+            continue
+        try:
+            template = parse_template(event["text"])
+        except ValueError:
+            template = None     # check_event reports it
+        problems = check_event(event, template)
+        if problems:
+            errors += [f"line {number}: {problem}" for problem in problems]
+            continue
+        event_warnings = []
+        meta = event_metadata(event, name_ids, event_warnings, template)
+        if meta["solo_count"] != solo:
+            # The Solo column is informational; the json doesn't use it.
+            event_warnings.append("num_players != TeamList + Solo + Complement")
+        event.update(meta)
+        warnings += [f"line {number}: {warning}" for warning in event_warnings]
+        events_by_type.setdefault(event_type, []).append(event)
+    return events_by_type, errors, warnings
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile the event tsv to json.")
+    parser.add_argument('input', help="tsv exported from the event gdoc (eg. raw_event_data)")
+    parser.add_argument('--world', default='world_data.json', help="world json, to resolve locations")
+    parser.add_argument('--output', '-o', default='event_data.json')
+    args = parser.parse_args(argv)
+
+    with open(args.world) as f:
+        name_ids = node_name_ids(json.load(f))
+    with open(args.input, 'r') as input_file:
+        events_by_type, errors, warnings = compile_tsv(input_file, name_ids)
+    for warning in warnings:
+        print(f"WARNING: {warning}")
+    if errors:
+        for error in errors:
+            print(f"ERROR: {error}")
+        print(f"{len(errors)} error(s), {args.output} not written.")
+        return 1
+    with open(args.output, 'w') as outfile:
+        # json.dumps is the C encoder; json.dump streams through the pure python one.
+        outfile.write(json.dumps(events_by_type))
+    print(f"Wrote {sum(len(events) for events in events_by_type.values())} events to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
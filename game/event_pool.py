@@ -0,0 +1,199 @@
+"""
+Per-turn pool of players still waiting for an event.
+
+GameState.turn() hands out events until every player has one. Fitting an event
+needs "random players near X", "random team with at least N free players near X"
+and so on; with thousands of players, building and sorting those candidate lists
+for every event made a day quadratic. The pool keeps the free players indexed by
+node and by team size so each query costs O(event size), independent of roster size.
+"""
+from __future__ import annotations
+
+from collections import Counter, defaultdict
+from random import Random
+from typing import Callable, Iterable, List, Optional, Sequence
+
+# Rejection sampling gives up (and scans the candidates) after this many draws per wanted item.
+MAX_REJECTIONS = 4
+
+class RandomSet:
+    """
+    Set with O(1) add/remove and uniform random choice.
+    Iteration order only depends on the order of operations (not on hashing).
+    """
+    __slots__ = ("items", "_index")
+
+    def __init__(self, items: Iterable = ()):
+        self.items = []
+        self._index = dict()
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        if item in self._index:
+            return
+        self._index[item] = len(self.items)
+        self.items.append(item)
+
+    def remove(self, item):
+        index = self._index.pop(item)
+        last = self.items.pop()
+        if index < len(self.items):
+            self.items[index] = last
+            self._index[last] = index
+
+    def discard(self, item):
+        if item in self._index:
+            self.remove(item)
+
+    def choice(self, rng: Random):
+        return self.items[rng.randrange(len(self.items))]
+
+    def __contains__(self, item):
+        return item in self._index
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+class EventPool:
+    """
+    Players without an event this turn, indexed for _fit_event.
+
+    Regions are tuples of node ids (World.ball), or None for the whole map.
+    A team "is at" every node where it has a free player, and is bucketed by its
+    number of free players.
+    """
+    def __init__(self, players: Iterable):
+        """
+        players: free players, in a deterministic order (eg. sorted by name)
+        """
+        self.players = RandomSet()
+        self.by_node = defaultdict(RandomSet)               # node id -> free players there
+        self.team_count = Counter()                         # team id -> free players in team
+        self.team_nodes = defaultdict(Counter)              # team id -> Counter(node id -> free players there)
+        self.teams_by_count = defaultdict(RandomSet)        # free player count -> team ids
+        self.node_teams = defaultdict(lambda: defaultdict(RandomSet))   # node id -> count -> team ids
+        for player in players:
+            self.add(player)
+
+    def __len__(self):
+        return len(self.players)
+
+    def __contains__(self, player):
+        return player in self.players
+
+    def _move_team(self, team_id: int, old: int, new: int):
+        if old > 0:
+            self.teams_by_count[old].remove(team_id)
+            for node_id in self.team_nodes[team_id]:
+                self.node_teams[node_id][old].remove(team_id)
+        if new > 0:
+            self.teams_by_count[new].add(team_id)
+            for node_id in self.team_nodes[team_id]:
+                self.node_teams[node_id][new].add(team_id)
+        else:
+            del self.team_count[team_id]
+            del self.team_nodes[team_id]
+
+    def add(self, player):
+        team_id = player.team.id
+        node_id = player.location.id
+        self.players.add(player)
+        self.by_node[node_id].add(player)
+        old = self.team_count[team_id]
+        self.team_count[team_id] = old + 1
+        nodes = self.team_nodes[team_id]
+        nodes[node_id] += 1
+        if old > 0 and nodes[node_id] == 1:
+            self.node_teams[node_id][old].add(team_id)
+        self._move_team(team_id, old, old + 1)
+
+    def remove(self, player):
+        team_id = player.team.id
+        node_id = player.location.id
+        self.players.remove(player)
+        self.by_node[node_id].remove(player)
+        old = self.team_count[team_id]
+        nodes = self.team_nodes[team_id]
+        nodes[node_id] -= 1
+        if nodes[node_id] == 0:
+            del nodes[node_id]
+            self.node_teams[node_id][old].remove(team_id)
+        self.team_count[team_id] = old - 1
+        self._move_team(team_id, old, old - 1)
+
+    def count(self, region: Optional[Sequence[int]]) -> int:
+        if region is None:
+            return len(self.players)
+        return sum(len(self.by_node[node_id]) for node_id in region if node_id in self.by_node)
+
+    def _sets(self, region):
+        if region is None:
+            return [self.players]
+        return [self.by_node[node_id] for node_id in region if node_id in self.by_node and len(self.by_node[node_id])]
+
+    @staticmethod
+    def _draw(rng: Random, sets: List[RandomSet], total: int):
+        index = rng.randrange(total)
+        for candidates in sets:
+            if index < len(candidates):
+                return candidates.items[index]
+            index -= len(candidates)
+
+    def sample_players(self, rng: Random, region, k: int, exclude: Callable = None) -> Optional[list]:
+        """
+        k distinct random free players in the region, none matching `exclude`. None if there aren't enough.
+        """
+        if k <= 0:
+            return []
+        sets = self._sets(region)
+        total = sum(len(candidates) for candidates in sets)
+        if total < k:
+            return None
+        picked = []
+        seen = set()
+        for _ in range(MAX_REJECTIONS * k + 8):
+            player = self._draw(rng, sets, total)
+            if player in seen:
+                continue
+            seen.add(player)
+            if exclude is not None and exclude(player):
+                continue
+            picked.append(player)
+            if len(picked) == k:
+                return picked
+        # Mostly excluded (or tiny) region: scan it.
+        candidates = [p for s in sets for p in s if p not in picked and (exclude is None or not exclude(p))]
+        if len(candidates) < k - len(picked):
+            return None
+        return picked + rng.sample(candidates, k - len(picked))
+
+    def pick_team(self, rng: Random, region, nplayer_min: int, exclude_ids: Sequence[int]) -> Optional[int]:
+        """
+        Random team with at least `nplayer_min` free players, at a node in the region, not in `exclude_ids`.
+        """
+        if region is None:
+            buckets = [teams for count, teams in self.teams_by_count.items() if count >= nplayer_min and len(teams)]
+        else:
+            buckets = [teams for node_id in region if node_id in self.node_teams
+                       for count, teams in self.node_teams[node_id].items() if count >= nplayer_min and len(teams)]
+        total = sum(len(teams) for teams in buckets)
+        if total == 0:
+            return None
+        for _ in range(MAX_REJECTIONS + len(exclude_ids)):
+            team_id = self._draw(rng, buckets, total)
+            if team_id not in exclude_ids:
+                return team_id
+        candidates = sorted(set(t for teams in buckets for t in teams if t not in exclude_ids))
+        if not candidates:
+            return None
+        return rng.choice(candidates)
+
+    def team_players(self, team) -> list:
+        """
+        Free players of a team, in team order.
+        """
+        return [p for p in team.players.values() if p in self.players]
@@ -11,14 +11,22 @@ import random
 import copy
 import threading
 from PIL import Image
-import requests
 import math
+from types import MappingProxyType
 
 from emojis import ATLOSS
 from game.world import World
 from game.players import Player, Team, try_merge_teams
 from game.game_constants import *
 from game.game_visualizer import render_map
+from game.avatars import AVATAR_CACHE, BLANK_AVATAR
+from game.event_pool import EventPool
+from game.rng import GameRng
+from game.datapack import compile_events
+from metrics import counter
+
+EVENTS_DRAWN = counter("atlas_events_drawn", "Events drawn from the event tables", ["type"])
+EVENTS_REJECTED = counter("atlas_events_rejected", "Drawn events that _fit_event could not place", ["type"])
 
 
 """
@@ -31,25 +39,31 @@ class Event:
     - complement_list: list of indices that have to complement those in team_list
     - radius: event radius
     - location: Specific location
+    + precomputed metadata (team_sizes, complement_sizes, location_ids, ...), see game/event_parse.py
 """
 
 class GameState:
     """
     Class holding the important info needed for the game.
     """
-    def __init__(self, world_data: dict, player_data: dict, event_data: dict, output_function=print, seed: int=None, bot = None):
+    def __init__(self, world_data: dict, player_data: dict, event_data: dict, output_function=print, seed: int=None, bot = None,
+                 avatars: bool=True, movement: str="objects"):
         """
         world_data: World json
         player_data: player json
-        event_data: event json
+        event_data: event json, or compiled event tables (DataPack.events, see game/datapack.py)
         output_function: thing to call when printing output
         seed: rng seed, or None
+        avatars: download player avatars (False: every player gets a blank placeholder, for large/headless games)
+        movement: "objects", or "array" to run the movement phase on NumPy arrays (game/array_state.py, headless batch runs)
         """
         #TODO: output_function should be more customizable for different output types
         self._world = World(world_data)                 # World object.
-        self._event_data = event_data                   # event data store (do not mutate)
-        self._teams: List[Team] = []                    # List of teams, including inactive teams. Index in list is team id.
-                                                        #   NOTE: Do not sort!
+        if not isinstance(event_data, MappingProxyType):
+            event_data = compile_events(event_data, self._world.graph.name_ids)
+        self._event_data = event_data                   # compiled event tables (read-only, shared)
+        self._teams: Mapping[int, Team] = dict()        # Map (team id, Team) of teams with players. Empty teams are dropped after each turn.
+        self._next_team_id = 0                          # Team ids are never reused.
         self._players: Mapping[str, Player] = dict()    # Map (str, Player) of alive players.
                                                         #   NOTE: players must have unique names.
         self._dead_players: List[Player] = []           # List of dead players in order of death.
@@ -61,7 +75,12 @@ class GameState:
 
         img_map: Mapping[str, Image] = dict()
         def download_imgs(urlmap: Mapping[str, str], idx_low: int, idx_high: int) -> List[Image]:
+            import requests
             for i in range(idx_low, idx_high):
+                cached = AVATAR_CACHE.get(name_url_data[i][2])
+                if cached is not None:
+                    img_map[name_url_data[i][1]] = cached
+                    continue
                 try:
                     image = Image.open(requests.get(name_url_data[i][2], stream=True).raw)
                 except Exception as e:
@@ -79,6 +98,7 @@ class GameState:
                         raise e
                 image.thumbnail((64, 64), Image.LANCZOS)
                 image = image.resize((64, 64))
+                AVATAR_CACHE.put(name_url_data[i][2], image)
                 img_map[name_url_data[i][1]] = image
 
         name_url_data = []
@@ -91,7 +111,7 @@ class GameState:
 
         num_players = len(name_url_data)
         thread_objs = []
-        NUM_THREADS = 4
+        NUM_THREADS = 4 if avatars else 0
         for i in range(NUM_THREADS):
             thread = threading.Thread(target = download_imgs, args = (name_url_data, round(i / NUM_THREADS * num_players), round((i+1) / NUM_THREADS * num_players), ) )
             thread_objs.append(thread)
@@ -118,11 +138,10 @@ class GameState:
             if team_name in teams_by_name:
                 player_team = teams_by_name[team_name]
             else:
-                player_team = Team(len(self._teams), None)
+                player_team = self._new_team()
                 teams_by_name[team_name] = player_team
-                self._teams.append(player_team)
 
-            new_player = Player(data["name"], data.get("img", ""), player_team, img = img_map[data['name']])
+            new_player = Player(data["name"], data.get("img", ""), player_team, img = img_map[data['name']] if avatars else BLANK_AVATAR)
             self._players[new_player.name] = new_player
             player_team.players[new_player.name] = new_player
 
@@ -134,17 +153,47 @@ class GameState:
         if seed is None:
             seed = random.randrange(2**31)
         self._print(f"Random seed: {seed}")
-        self._rng = random.Random(seed)
+        self._seed = seed
+        # Every phase draws from its own substream of the seed (game/rng.py).
+        self._streams = GameRng(seed)
+        self._new_day_streams()
+        # Key of each player for keyed random draws (stable for the whole game).
+        self._player_keys = {name: i for i, name in enumerate(sorted(self._players))}
 
         # Distribute teams
         # Distribution method(subject to change): Uniform over world "starting nodes"
         start_points = self._world.get_starting_nodes()
-        for team in self._teams:
-            start_point = self._world.node(self._rng.choice(start_points))
+        start_rng = self._streams.random("start")
+        for team in self._teams.values():
+            start_point = self._world.node(start_rng.choice(start_points))
             team.move_to(start_point)
             for player in team.players.values():
                 player.move_to(start_point)
 
+        if movement == "array":
+            # Imported here: it pulls in numpy, which nothing else needs.
+            from game.array_state import ArrayMovement
+            self._array_movement = ArrayMovement(self._world.graph, self._players.values(), self._player_keys)
+        elif movement == "objects":
+            self._array_movement = None
+        else:
+            raise ValueError(f"unknown movement backend {movement!r}")
+
+    def _new_day_streams(self):
+        """
+        Sequential substreams for today's event choice, event fitting and team merges.
+        """
+        day = self._turn_counter
+        self._event_rng = self._streams.random("events", day)
+        self._fit_rng = self._streams.random("fit", day)
+        self._merge_rng = self._streams.random("merge", day)
+
+    def _new_team(self, name: str=None, player_map: dict=None, location=None) -> Team:
+        team = Team(self._next_team_id, name, player_map, location)
+        self._next_team_id += 1
+        self._teams[team.id] = team
+        return team
+
     def set_event_printer(self, print_func):
         """
         Set the "event printer".
@@ -160,7 +209,7 @@ class GameState:
         """
         Get a random event weighted by category then uniformly.
         """
-        result = self._rng.random()
+        result = self._event_rng.random()
         event_type = None
         for etype, prob in self._event_probability.items():
             if result < prob:
@@ -170,7 +219,7 @@ class GameState:
         if event_type is None:
             # Unlikely event of floating point error
             return self.get_random_event()
-        return (self._rng.choice(self._event_data[event_type]), event_type)
+        return (self._event_rng.choice(self._event_data[event_type]), event_type)
 
     def process_event(self, event: Event, event_type: str, players: List[Player]):
         """
@@ -188,7 +237,7 @@ class GameState:
             List of killed players (may be empty)
         """
         if event_type == 'bond':
-            try_merge_teams(players, self._rng)
+            try_merge_teams(players, self._merge_rng)
 
         event_text = event['text'].format(*(p.name for p in players))
         killed_players = []
@@ -197,11 +246,15 @@ class GameState:
             for index in event['deaths']:
                 killed_player = players[index]
                 killed_player.deathmsg = event_text
+                killed_player.death_day = self._turn_counter
                 killed_player.remove()
                 del self._players[killed_player.name]
                 killed_players.append(killed_player)
                 self._dead_players.append(killed_player)
                 kill_credit[index] = False
+            killers = [p.name for p, alive in zip(players, kill_credit) if alive]
+            for player in killed_players:
+                player.killers = killers
             for i, alive in enumerate(kill_credit):
                 if alive:
                     players[i].kills += len(event['deaths'])
@@ -210,6 +263,69 @@ class GameState:
         return killed_players
 
 
+    def _start_hunt(self, team: Team, event_list: list):
+        """
+        `team` goes hunting: it skips today's events and chases the nearest other team for a few days.
+        """
+        team.hunt += int(5*max(1, self._hunt_chance))
+        player_names = sorted(team.players.keys())
+        if len(team.players) == 1:
+            event_text = "{0} hunts for other tributes..."
+        elif len(team.players) == 2:
+            event_text = "{0} and {1} hunt for other tributes."
+        else:
+            event_text = "{"+"}, {".join(str(x) for x in range(len(player_names) - 1))+"}, and {"+str(len(player_names) - 1)+"} hunt for other tributes."
+        event_list.append(({
+                'text': event_text,
+                'deaths': []
+            }, 'hunt', team.players.values()))
+
+    def _move(self, event_list: list) -> set:
+        """
+        Movement phase (steps 2 and 3 of turn()) on the object model.
+        Return the names of players whose team started hunting.
+        """
+        day = self._turn_counter
+        hunt_draws = self._streams.draws("hunt", day)
+        move_draws = self._streams.draws("move", day).table(self._next_team_id)
+        walk_draws = self._streams.draws("walk", day).table(self._next_team_id)
+        follow_draws = self._streams.draws("follow", day)
+        split_draws = self._streams.draws("split", day)
+        hunting_players = set()
+        for team in list(self._teams.values()):
+            if len(team.players) > 0:
+                if team.hunt == 0 and self._hunt_chance > 0 and hunt_draws.uniform(team.id) < self._hunt_chance:
+                    self._start_hunt(team, event_list)
+                    hunting_players.update(team.players.keys())
+                    continue;
+                if move_draws[team.id] < MOVE_CHANCE:
+                    if team.hunt > 0:
+                        def has_enemy(node):
+                            for player in node.active_players.values():
+                                if player.team.id != team.id:
+                                    return True
+                            return False
+                        hunt_path = self._world.path_to(team.location, has_enemy)
+                        if hunt_path is not None and len(hunt_path) > 0:
+                            move_to = hunt_path[0]
+                            team.move_to(move_to)
+                            team.hunt -= 1
+                            continue
+                    move_to = team.location.neighbor_at(walk_draws[team.id])
+                    team.move_to(move_to)
+        for player in sorted(self._players.values(), key=lambda p: p.name):
+            if player.name in hunting_players:
+                continue
+            # Keyed draws: skipping one (solo players always follow) doesn't shift the others.
+            if player.team.player_count() == 1 or follow_draws.uniform(self._player_keys[player.name]) < FOLLOW_TEAM_CHANCE:
+                player.move_to(player.team.location)
+            else:
+                player.move_to(player.location.neighbor_at(split_draws.uniform(self._player_keys[player.name])))
+                del player.team.players[player.name]
+                solo_team = self._new_team(None, {player.name: player}, player.location)
+                player.team = solo_team
+        return hunting_players
+
     def turn(self):
         """
         One day of the game simulation.
@@ -250,66 +366,29 @@ class GameState:
         if self._turn_counter >= 3:
             self._hunt_chance += 0.05
         self._turn_counter += 1
+        self._new_day_streams()
 
         event_list = []
 
-        hunting_players = set()
-        for team in self._teams:
-            if len(team.players) > 0:
-                if team.hunt == 0 and self._rng.random() < self._hunt_chance:
-                    team.hunt += int(5*max(1, self._hunt_chance))
-                    hunting_players.update(team.players.keys())
-                    player_names = sorted(team.players.keys())
-                    if len(team.players) == 1:
-                        event_text = "{0} hunts for other tributes..."
-                    elif len(team.players) == 2:
-                        event_text = "{0} and {1} hunt for other tributes."
-                    else:
-                        event_text = "{"+"}, {".join(str(x) for x in range(len(player_names) - 1))+"}, and {"+str(len(player_names) - 1)+"} hunt for other tributes."
-                    event_list.append(({
-                            'text': event_text,
-                            'deaths': []
-                        }, 'hunt', team.players.values()))
-                    continue;
-                if self._rng.random() < MOVE_CHANCE:
-                    if team.hunt > 0:
-                        def has_enemy(node):
-                            for player in node.active_players.values():
-                                if player.team.id != team.id:
-                                    return True
-                            return False
-                        hunt_path = self._world.path_to(team.location, has_enemy)
-                        if hunt_path is not None and len(hunt_path) > 0:
-                            move_to = hunt_path[0]
-                            team.move_to(move_to)
-                            team.hunt -= 1
-                            continue
-                    move_to = team.location.random_neighbor(self._rng)
-                    team.move_to(move_to)
-        for player in sorted(self._players.values(), key=lambda p: p.name):
-            if player.name in hunting_players:
-                continue
-            if self._rng.random() < FOLLOW_TEAM_CHANCE or player.team.player_count() == 1:
-                player.move_to(player.team.location)
-            else:
-                player.move_to(player.location.random_neighbor(self._rng))
-                del player.team.players[player.name]
-                solo_team = Team(len(self._teams), None, {player.name: player}, player.location)
-                player.location.active_teams[solo_team.id] = solo_team
-                player.team = solo_team
-                self._teams.append(solo_team)
+        if self._array_movement is not None:
+            hunting_players = self._array_movement.move(self, event_list)
+        else:
+            hunting_players = self._move(event_list)
 
-        players_need_event = set(filter(lambda k: k not in hunting_players, self._players.keys()))
-        n_players = len(self._players)
-        n_deaths = 0
-        while len(players_need_event):
+        # Players sorted by name so the pool (and the rng draws) don't depend on dict/set order.
+        pool = EventPool(p for p in sorted(self._players.values(), key=lambda p: p.name)
+                         if p.name not in hunting_players)
+        while len(pool):
             event, event_type = self.get_random_event()
-            player_set = self._fit_event(event, players_need_event)
-            if player_set is not None:
+            player_set = self._fit_event(event, pool)
+            EVENTS_DRAWN.labels(event_type).inc()
+            if player_set is None:
+                EVENTS_REJECTED.labels(event_type).inc()
+            else:
                 event_list.append((event, event_type, player_set))
                 for player in player_set:
                     player._active = False
-                    players_need_event.remove(player.name)
+                    pool.remove(player)
 
         killed_players = []
         for event, event_type, player_set in event_list:
@@ -322,12 +401,14 @@ class GameState:
             self._print(f"{ATLOSS} {player.name}")
         for player in self._players.values():
             player._active = True
+        # Drop teams emptied by merges, splits and deaths (keeps memory bounded on long games).
+        self._teams = {team_id: team for team_id, team in self._teams.items() if team.players}
 
 
     def print_map(self, location_list: List(Team or Player)=None):
         coordlst = []
         obj_names = []
-        if location_list:
+        if location_list is not None:
             for obj in location_list:
                 center_x = obj.location.coords[0]
                 center_y = obj.location.coords[1]
@@ -348,95 +429,63 @@ class GameState:
             return worldmap
 
         else:
-            teams_copy = self._teams.copy()
+            teams_copy = list(self._teams.values())
             teams_sorted = sorted(teams_copy,key=lambda team: team.active_player_count(),reverse = True)
             return self.print_map(teams_sorted)
 
-    def _fit_event(self, event, remaining_player_set):
+    def _fit_event(self, event, pool: EventPool):
         """
-        'Fit' an event into the set of remaining players.
+        'Fit' an event into the pool of remaining players.
 
         Parameters:
         - event: The event in question
-        - remaining_player_set: set containing remaining player names (prefer actual set for fast "in" comparison)
+        - pool: EventPool of players that don't have an event yet this turn
 
         Picking process:
-        0) Set up player pool and team pool, check preconditions
-            - IF the event is localized, set player pool to players in radius, compute team pool.
-            - OTHERWISE the player pool and team pool are just all players/teams still active this turn.
-            - IF there aren't enough players left in total: return None.
-        1) Pick a qualified team (team requiring event) or a player (solo only event) from the pool of all teams or players
+        0) Set up the region (set of map nodes) to pick from, check preconditions
+            - IF the event is localized, the region is the nodes in radius of its location.
+            - OTHERWISE the region is the whole map.
+            - IF there aren't enough players left in the region: return None.
+        1) Pick a qualified team (team requiring event) or a player (solo only event) from the region
                 (skip this step if the event is already localized or is infinite range)
             - IF no qualified team exists for team events: We're permastuck, return None.
-        2) Set this event to occur centered on the picked thing's location (skip this step if the event
-                is already localized)
-        3) Filter the player pool down to the players within specified radius of this location
-                (skip this step if the event is already localized or is infinite range)
-        4) Recompute the team pool using the player pool
-                (skip this step if the event is already localized or is infinite range)
-        5) Fill out event (randomly pick teams/players from the pool that satisfy the event's constraints)
+        2) Set this event to occur centered on the picked thing's location, and shrink the region
+                to the nodes within the event radius of it (skip this step if the event is already
+                localized or is infinite range)
+        3) Fill out event (randomly pick teams/players from the region that satisfy the event's constraints)
             - IF we fail at this step: Retry from step 1) to `EVENT_NUM_TRIES` times
+
+        All picks go through the pool's indexes, so a fit costs O(event size) regardless of the
+        number of players.
         """
 
         # Step 0
         if 'location' in event:
             # Location specified + infinite radius unsupported.
-            target_location = self._world.node_from_name(event['location'])
-            if target_location is None:
+            location_ids = event['location_ids']
+            if not location_ids:
                 return None
-
             _localized = True
-            player_pool = self._world.players_near(target_location, event['radius'],
-                        filter_func = lambda p: p.name in remaining_player_set)
-            # Team pools are sorted in descending order of size for use later.
-            team_pool = sorted([self._teams[i] for i in set(p.team.id for p in player_pool)],
-                                    key=lambda t: (t.active_player_count(), t.id), reverse=True)
+            if len(location_ids) == 1:
+                _region = self._world.ball(location_ids[0], event['radius'])
+            else:
+                _region = tuple(dict.fromkeys(node_id for location_id in location_ids
+                                              for node_id in self._world.ball(location_id, event['radius'])))
         else:
             _localized = event['radius'] == -1
-            # player pool needs sorting to avoid uncontrollable randomness from set data structures..
-            player_pool = sorted([self._players[p_id] for p_id in remaining_player_set], key=lambda p: p.name)
-            team_pool = sorted([self._teams[i] for i in set(p.team.id for p in player_pool)],
-                                    key=lambda t: (t.active_player_count(), t.id), reverse=True)
+            _region = None
 
         # Step 0 (condition check)
-        if len(player_pool) < event['num_players']:
+        if pool.count(_region) < event['num_players']:
             # Definitely not enough players for this event.
             return None
 
-        def pick_team(team_pool, teams_select, nplayer_min):
-            """
-            Helper function to pick a team out of the team pool with at least `nplayer_min` players
-            that are still "active" this turn.
-
-            Parameters:
-            - team_pool:    List of teams to pick from
-            - teams_select: List of team ids that were already picked
-            - nplayer_min:  Team size we're looking for
-            """
-
-            # Part 1: Grab subset of teams that have enough players.
-            # NOTE: Team pool is sorted in descending order of active player count.
-            index_last = 0
-            while index_last < len(team_pool):
-                if team_pool[index_last].active_player_count() < nplayer_min:
-                    break
-                index_last += 1
-            if index_last == 0:
-                return None     # No team large enough...
-
-            # Part 2: Pick a random team out of the ones that match the player size
-            # Take first `index_last` elements and return them shuffled
-            possibilities = self._rng.sample(team_pool[:index_last], index_last)
-            for team in possibilities:
-                if team.id not in teams_select:
-                    return team
-            return None
-
         for k in range(EVENT_NUM_TRIES):
             localized = _localized
-            remaining_players = player_pool
+            region = _region
             i = event['num_players']    # Track how many slots are filled so far
             player_select = [None]*i    # Initialize return value
+            chosen = set()              # Players already in player_select
             # event['team_list'] is a list of lists of indices into the final `player_select` array
             #   Each sublist is (part of) a unique team -- players from different teams cannot fill
             #   spots in the same sublist, players on the same team cannot fill spots in different sublists.
@@ -444,78 +493,72 @@ class GameState:
             #   while indices 2 and 3 must be two players from a different team.
             if len(event['team_list']) > 0:
                 teams_select: List[int] = []
+                team_idx = 0
                 if not localized:
-                    team_idx = 1
                     # Step 1 (for team events): Pick one qualified team as the source.
-                    source_team = pick_team(team_pool, teams_select, len(event['team_list'][0]))
+                    source_team = pool.pick_team(self._fit_rng, region, event['team_sizes'][0], teams_select)
                     if source_team is None:
                         # No teams large enough.
                         return None
-                    teams_select.append(source_team.id)
+                    teams_select.append(source_team)
+                    team_idx = 1
 
-                    # Step 2, 3, 4: Recompute player pool and team pool
+                    # Step 2: Center the event on the source team
                     localized = True
-                    remaining_players = self._world.players_near(source_team.location, event['radius'],
-                            filter_func = lambda p: p.name in remaining_player_set)
-                    remaining_team_pool = sorted([self._teams[i] for i in set(p.team.id for p in remaining_players)],
-                                                    key=lambda t: (t.active_player_count(), t.id))
-                else:
-                    team_idx = 0
-                    remaining_team_pool = team_pool
-                while team_idx < len(event['team_list']):
-                    # Step 5: Fill remaining slots that need team grouping
-                    team = pick_team(remaining_team_pool, teams_select, len(event['team_list'][team_idx]))
+                    region = self._world.ball(self._teams[source_team].location.id, event['radius'])
+                while team_idx < len(event['team_sizes']):
+                    # Step 3: Fill remaining slots that need team grouping
+                    team = pool.pick_team(self._fit_rng, region, event['team_sizes'][team_idx], teams_select)
                     if team is None:
                         break   # No teams large enough in this subset.
-                    teams_select.append(team.id)
+                    teams_select.append(team)
                     team_idx += 1
 
-                if len(teams_select) != len(event['team_list']):
+                if len(teams_select) != len(event['team_sizes']):
                     continue
-                for team_id, targets in zip(teams_select, event['team_list']):
-                    team_players = self._rng.sample(self._teams[team_id].active_players(), len(targets))
+                for team_id, targets, size in zip(teams_select, event['team_list'], event['team_sizes']):
+                    team_players = self._fit_rng.sample(pool.team_players(self._teams[team_id]), size)
                     for player, spot in zip(team_players, targets):
                         player_select[spot] = player
+                        chosen.add(player)
                         i -= 1
 
-                remaining_players = list(filter(lambda p: p not in player_select, remaining_players))
-
                 complement_filled = 0
-                for team_id, player_set in zip(teams_select, event['complement_list']):
-                    filtered_player_pool = list(filter(lambda p: p.team.id != team_id, remaining_players))
-                    if len(filtered_player_pool) < len(player_set):
+                for team_id, player_set, size in zip(teams_select, event['complement_list'], event['complement_sizes']):
+                    # Players from anywhere in the region except this team
+                    select_set = pool.sample_players(self._fit_rng, region, size,
+                            exclude=lambda p: p in chosen or p.team.id == team_id)
+                    if select_set is None:
                         # Not enough players in the complement set
                         break
-                    select_set = self._rng.sample(remaining_players, len(player_set))
                     for player, spot in zip(select_set, player_set):
-                        try:
-                            player_select[spot] = player
-                        except:
-                            print(event)
+                        player_select[spot] = player
+                        chosen.add(player)
                         i -= 1
-                    remaining_players = list(filter(lambda p: p.name not in select_set, remaining_players))
                     complement_filled += 1
 
-                if complement_filled != len(event['complement_list']):
+                if complement_filled != len(event['complement_sizes']):
                     continue
-            if len(remaining_players) < i:
-                # Not enough players for solos
-                continue
 
             if i > 0:
                 solos_set = []
                 if not localized:
-                    solo_source = self._rng.choice(remaining_players)
-                    remaining_players = self._world.players_near(solo_source.location, event['radius'],
-                        filter_func = lambda p: p.name in remaining_player_set and p not in player_select and p.name != solo_source.name)
+                    # Step 1, 2 (for solo events): pick a source player and center the event on them.
+                    solo_source = pool.sample_players(self._fit_rng, region, 1, exclude=lambda p: p in chosen)
+                    if solo_source is None:
+                        continue
+                    solo_source = solo_source[0]
+                    chosen.add(solo_source)
+                    region = self._world.ball(solo_source.location.id, event['radius'])
                     solos_set.append(solo_source)
                     i -= 1
 
                 if i > 0:
-                    if len(remaining_players) < i:
+                    solos = pool.sample_players(self._fit_rng, region, i, exclude=lambda p: p in chosen)
+                    if solos is None:
                         # Not enough players for solos
                         continue
-                    solos_set = self._rng.sample(remaining_players, i) + solos_set
+                    solos_set = solos + solos_set
 
                 for i, v in enumerate(player_select):
                     if v is None:
@@ -524,6 +567,65 @@ class GameState:
             return player_select
         return None
 
+    def snapshot(self) -> dict:
+        """
+        Plain (json-able) copy of the current state: day, alive/dead players, teams, kills.
+        """
+        teams = []
+        for team in self._teams.values():
+            if team.player_count() == 0:
+                continue
+            teams.append({
+                    "id": team.id,
+                    "name": team.get_display_name(),
+                    "location": team.location.name,
+                    "players": sorted(team.players.keys())
+                })
+        return {
+            "day": self._turn_counter,
+            "seed": self._seed,
+            "alive": [{
+                    "name": p.name,
+                    "team": p.team.id,
+                    "location": p.location.name,
+                    "kills": p.kills
+                } for p in sorted(self._players.values(), key=lambda p: p.name)],
+            "dead": [{
+                    "name": p.name,
+                    "location": p.location.name,
+                    "kills": p.kills,
+                    "death": p.deathmsg
+                } for p in self._dead_players],
+            "teams": teams
+        }
+
+    def results(self) -> list:
+        """
+        Standings of a finished game, winner first: survivors (by kills), then the dead, last to die first.
+        """
+        standings = sorted(self._players.values(), key=lambda p: (-p.kills, p.name)) + self._dead_players[::-1]
+        return [{
+                "name": p.name,
+                "placement": placement,
+                "kills": p.kills,
+                "killers": list(p.killers),
+                "death": p.deathmsg,
+                "day": p.death_day
+            } for placement, p in enumerate(standings, start=1)]
+
+    def team_positions(self) -> list:
+        """
+        Teams with living players as (team id, (x, y) map coordinates, player names).
+        """
+        return [(team.id, tuple(team.location.coords), tuple(team.players.keys()))
+                for team in self._teams.values() if team.player_count() != 0]
+
+    def get_day(self):
+        return self._turn_counter
+
+    def get_seed(self):
+        return self._seed
+
     def get_num_alive_players(self):
         return len(self._players)
 
@@ -7,6 +7,8 @@ if __name__ == "__main__":
     path = os.path.join(os.path.dirname(__file__), '..')
     sys.path.append(path)
 
+import hashlib
+from threading import Lock
 from typing import List
 from PIL import Image, ImageDraw
 from draw import LARGE_FONT, break_text
@@ -15,16 +17,86 @@ _src_dir = os.path.dirname(os.path.realpath(__file__))
 N_MARKER_MAX = 10;
 MARKER_WIDTH = 77;
 MARKER_HEIGHT = 77;
-TEAM_IMAGES = [Image.open(_src_dir+f"/resources/team{i}.png").resize((MARKER_WIDTH, MARKER_HEIGHT)).convert('RGBA') for i in range(N_MARKER_MAX)]
-MAP_IMAGE = Image.open(_src_dir+"/resources/map.png").convert('RGBA')
 # scale things down.. too slow
 SCALE_FACTOR=2
-MAP_IMAGE = MAP_IMAGE.resize((int(MAP_IMAGE.size[0]/SCALE_FACTOR), int(MAP_IMAGE.size[1]/SCALE_FACTOR)))
+
+# Scaled map/markers, as raw pixels. Loading these skips decoding and resizing the
+# full size map.png, which used to happen on import and dominated startup.
+# `python game/game_visualizer.py --build-cache` fills it ahead of time (bin/post_compile).
+ASSET_CACHE_DIR = os.environ.get('ASSET_CACHE_DIR', os.path.join(_src_dir, "resources", ".cache"))
+
+_assets = dict()
+_assets_lock = Lock()
+
+def _scaled_asset(name: str, prepare) -> Image:
+    """
+    resources/<name> passed through prepare() (which returns an RGBA image), via the asset cache.
+    The cache key hashes the source file and the scaling constants, so changing either invalidates it.
+    """
+    src_path = os.path.join(_src_dir, "resources", name)
+    with open(src_path, 'rb') as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(repr((SCALE_FACTOR, MARKER_WIDTH, MARKER_HEIGHT)).encode())
+    cache_path = os.path.join(ASSET_CACHE_DIR, f"{name}.{digest.hexdigest()[:16]}.rgba") if ASSET_CACHE_DIR else None
+    if cache_path is not None and os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                header = f.readline().split()
+                return Image.frombytes('RGBA', (int(header[0]), int(header[1])), f.read())
+        except (OSError, ValueError, IndexError) as e:
+            print(f"Ignoring asset cache {cache_path}: {e}")
+    image = prepare(Image.open(src_path))
+    if cache_path is not None:
+        try:
+            os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(f"{image.size[0]} {image.size[1]}\n".encode())
+                f.write(image.tobytes())
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Could not write asset cache: {e}")
+    return image
+
+def _prepare_map(image: Image) -> Image:
+    image = image.convert('RGBA')
+    return image.resize((int(image.size[0]/SCALE_FACTOR), int(image.size[1]/SCALE_FACTOR)))
+
+def _prepare_marker(image: Image) -> Image:
+    return image.resize((MARKER_WIDTH, MARKER_HEIGHT)).convert('RGBA')
+
+def map_image() -> Image:
+    """
+    The map, scaled down by SCALE_FACTOR (loaded on first use; do not mutate).
+    """
+    image = _assets.get("map")
+    if image is None:
+        with _assets_lock:
+            image = _assets.get("map")
+            if image is None:
+                image = _scaled_asset("map.png", _prepare_map)
+                _assets["map"] = image
+    return image
+
+def team_images() -> List[Image]:
+    """
+    Team markers (loaded on first use; do not mutate).
+    """
+    images = _assets.get("teams")
+    if images is None:
+        with _assets_lock:
+            images = _assets.get("teams")
+            if images is None:
+                images = [_scaled_asset(f"team{i}.png", _prepare_marker) for i in range(N_MARKER_MAX)]
+                _assets["teams"] = images
+    return images
 
 def render_map(pois: List[Point], labels: List[str]):
     pois = pois[:min(N_MARKER_MAX, len(pois))]
     labels = labels[:min(N_MARKER_MAX, len(labels))]
-    base_width, base_height = MAP_IMAGE.size
+    base_map = map_image()
+    markers = team_images()
+    base_width, base_height = base_map.size
 
     label_start_y = base_height
     result_height = label_start_y + MARKER_HEIGHT;
@@ -33,7 +105,7 @@ def render_map(pois: List[Point], labels: List[str]):
     label_start_x_center = (base_width - used_width + single_width)/2
     max_label_width = single_width - 10;
 
-    draw = ImageDraw.Draw(MAP_IMAGE)
+    draw = ImageDraw.Draw(base_map)
 
     label_text_y = result_height
     label_text_max_height = 0
@@ -46,18 +118,23 @@ def render_map(pois: List[Point], labels: List[str]):
     # Arbitrary bottom padding?
     result_height += label_text_max_height + 15
     result = Image.new(mode='RGBA', size=(base_width, result_height), color=(54, 57, 63))
-    result.paste(im=MAP_IMAGE, box=(0, 0), mask=MAP_IMAGE)
+    result.paste(im=base_map, box=(0, 0), mask=base_map)
 
     for i, (poi, label) in enumerate(zip(pois, labels)):
         layer = Image.new(mode='RGBA', size=(base_width, result_height), color=(0, 0, 0, 0))
-        layer.paste(im=TEAM_IMAGES[i], box=(int(label_start_x_center - MARKER_WIDTH/2 + i*single_width), label_start_y))
-        layer.paste(im=TEAM_IMAGES[i], box=(int(poi[0]/SCALE_FACTOR - MARKER_WIDTH/2), int(poi[1]/SCALE_FACTOR - MARKER_WIDTH/2)))
+        layer.paste(im=markers[i], box=(int(label_start_x_center - MARKER_WIDTH/2 + i*single_width), label_start_y))
+        layer.paste(im=markers[i], box=(int(poi[0]/SCALE_FACTOR - MARKER_WIDTH/2), int(poi[1]/SCALE_FACTOR - MARKER_WIDTH/2)))
         draw = ImageDraw.Draw(layer)
         draw.text((int(label_start_x_center + i*single_width), label_text_y+LARGE_FONT.size), label, font=LARGE_FONT.normal, anchor="ms", fill=(255, 255, 255))
         result = Image.alpha_composite(result, layer)
     return result
 
 if __name__ == "__main__":
+    if "--build-cache" in sys.argv:
+        map_image()
+        team_images()
+        print(f"Asset cache built in {ASSET_CACHE_DIR}")
+        sys.exit(0)
     out = render_map([[500, 500], [1000, 1000], [1000, 500], [500, 1000], [1500, 500], [1500, 1000], [1500, 1500]], ["nuts", "bothades", "stress", "test", "longer team name go brr", "hello", "world"])
     with open("out.png", 'wb') as outfile:
         out.save(outfile)
@@ -1,7 +1,6 @@
 # Type annotations without import
 from __future__ import annotations
 from typing import List
-import requests
 from PIL import Image
 
 from game.game_constants import MAX_TEAM_SIZE, TEAM_CHANGE_CHANCE
@@ -23,6 +22,7 @@ class Player:
         self.name = name
 
         if img is None:
+            import requests
             self.img_path = img_path
             self.image = Image.open(requests.get(img_path, stream=True).raw)
             self.image.thumbnail((64, 64), Image.ANTIALIAS)
@@ -39,6 +39,8 @@ class Player:
         self.kills = kills
         self.alive = True
         self.deathmsg = deathmsg #probably shouldn't initialize them dead
+        self.death_day = None   # Day of death
+        self.killers = []       # Names of the players credited with the kill
         self._active = True
     
     def get_active_image(self):
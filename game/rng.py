@@ -0,0 +1,98 @@
+"""
+Seeded random substreams for GameState.
+
+With one shared random.Random, every phase of a day consumed numbers from the
+same sequence, so drawing one more number anywhere (or visiting teams in another
+order) changed everything after it. Here every phase gets its own stream derived
+from (game seed, phase, day):
+
+    - GameRng.random(phase, day): a random.Random, for phases that draw in
+      sequence (event choice, event fitting, team merges).
+    - GameRng.draws(phase, day): draws keyed by a team id or player key. The
+      draw for a key doesn't depend on which other keys were drawn or in what
+      order, so the same numbers can be computed one at a time
+      (Draws.uniform) or for a whole array at once (Draws.uniforms, needs numpy).
+      That's what lets the object model and game/array_state.py play the exact
+      same game, and lets a phase be reordered or split up without changing it.
+
+Substream seeds are a hash of (seed, phase, day).
+"""
+from __future__ import annotations
+
+import hashlib
+import random
+
+class Draws:
+    """
+    Uniform [0, 1) draws keyed by non-negative ints, for one (phase, day).
+
+    The draw for key k is the k-th output of a random.Random seeded for this
+    (phase, day); outputs are generated (and kept) up to the largest key asked for.
+    """
+    __slots__ = ("_seed", "_rng", "_table", "_array")
+
+    def __init__(self, seed: int):
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._table = []
+        self._array = None
+
+    def _extend(self, size: int):
+        table = self._table
+        if size > len(table):
+            # Grow geometrically; the values don't depend on how the table grew.
+            rand = self._rng.random
+            table += [rand() for _ in range(max(size, 2*len(table)) - len(table))]
+
+    def uniform(self, key: int) -> float:
+        if key >= len(self._table):
+            self._extend(key + 1)
+        return self._table[key]
+
+    def table(self, size: int) -> list:
+        """
+        List with (at least) the draws for keys 0..size-1, for hot loops: table[key] == uniform(key).
+        """
+        self._extend(size)
+        return self._table
+
+    def uniforms(self, keys):
+        """
+        Draws for an array of keys (same values as uniform(key) for each key, needs numpy).
+        """
+        import numpy as np  # Only the array backend calls this; keep numpy off the startup path
+        keys = np.asarray(keys, dtype=np.intp)
+        if len(keys) == 0:
+            return np.zeros(0)
+        size = int(keys.max()) + 1
+        if self._array is None or len(self._array) < size:
+            # numpy's legacy MT19937 seeded with the same 32-bit words (init_by_array) and
+            # random_sample() produce exactly random.Random(seed).random()'s sequence.
+            # (Not for seeds below 2**32, which numpy seeds differently; GameRng never makes those.)
+            words = [(self._seed >> shift) & 0xFFFFFFFF for shift in range(0, self._seed.bit_length(), 32)]
+            self._array = np.random.RandomState(np.array(words, dtype=np.uint32)).random_sample(size)
+        return self._array[keys]
+
+class GameRng:
+    """
+    All the randomness of one game, derived from its seed.
+    """
+    def __init__(self, seed: int):
+        self.seed = seed
+
+    def _derive(self, *key) -> int:
+        digest = hashlib.blake2b(repr((self.seed,) + key).encode(), digest_size=8).digest()
+        # Top bit set: always two 32-bit words, which Draws.uniforms relies on.
+        return int.from_bytes(digest, 'big') | (1 << 63)
+
+    def random(self, phase: str, *key) -> random.Random:
+        """
+        Sequential stream for (phase, *key), eg. random("events", day).
+        """
+        return random.Random(self._derive(phase, *key))
+
+    def draws(self, phase: str, *key) -> Draws:
+        """
+        Keyed draws for (phase, *key), eg. draws("follow", day).uniform(player_key).
+        """
+        return Draws(self._derive(phase, *key))
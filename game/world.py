@@ -4,27 +4,88 @@ from typing import List
 from queue import SimpleQueue
 from game.players import Player, Team
 
+class WorldGraph:
+    """
+    Immutable compiled world graph, shared by every game using the same world data.
+    Per-game state (who is where) lives in World/GraphNode.
+    """
+    __slots__ = ("ids", "names", "coords", "edges", "name_ids", "starting", "_distances", "_max_distance", "_balls")
+
+    def __init__(self, names: dict, coords: dict, edges: dict, starting: tuple):
+        """
+        names/coords/edges: node id -> name / [x, y] / tuple of neighbour ids
+        starting:           ids of the starting nodes
+        """
+        self.ids = tuple(names)
+        self.names = dict(names)
+        self.coords = {node_id: tuple(coords[node_id]) for node_id in self.ids}
+        self.edges = {node_id: tuple(edges[node_id]) for node_id in self.ids}
+        self.name_ids = {name: node_id for node_id, name in self.names.items()}
+        self.starting = tuple(starting)
+        # All-pairs hop distances (BFS from every node; the map is small).
+        self._distances = {node_id: self._bfs(node_id) for node_id in self.ids}
+        self._max_distance = max((d for dist in self._distances.values() for d in dist.values()), default=0)
+        # (node id, radius) -> nodes within radius, for every radius up to the graph diameter
+        self._balls = dict()
+        for node_id, dist in self._distances.items():
+            by_distance = sorted(dist, key=lambda other: dist[other])
+            for radius in range(self._max_distance + 1):
+                self._balls[(node_id, radius)] = tuple(other for other in by_distance if dist[other] <= radius)
+
+    @classmethod
+    def from_json(cls, world_data: dict) -> WorldGraph:
+        names = {int(node_id): name for node_id, name in world_data["nodes"].items()}
+        coords = {int(node_id): world_data["coordinates"][node_id] for node_id in world_data["nodes"]}
+        edges = {int(node_id): world_data["connections"][node_id] for node_id in world_data["nodes"]}
+        return cls(names, coords, edges, world_data["starting"])
+
+    def _bfs(self, source: int) -> dict:
+        dist = {source: 0}
+        frontier = [source]
+        while frontier:
+            next_frontier = []
+            for cur in frontier:
+                for neighbor in self.edges[cur]:
+                    if neighbor not in dist:
+                        dist[neighbor] = dist[cur] + 1
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return dist
+
+    def distance(self, a: int, b: int) -> int:
+        """
+        Hop distance between two nodes (None if unreachable).
+        """
+        return self._distances[a].get(b, None)
+
+    def ball(self, node_id: int, distance: int) -> tuple:
+        """
+        Ids of nodes within `distance` steps of this node, nearest first. Negative distance: just the node.
+        """
+        return self._balls[(node_id, min(max(distance, 0), self._max_distance))]
+
 class World:
     """
     Class representing a World. (a graph)
     Holds info about the nodes and their connections, has some BFS routines.
     """
 
-    def __init__(self, world_data: dict):
+    def __init__(self, world_data):
         """
         Populate the game world object.
         Its just a graph.
+        world_data: world json, or a compiled WorldGraph (shared, see game/datapack.py)
         """
+        if not isinstance(world_data, WorldGraph):
+            world_data = WorldGraph.from_json(world_data)
+        self.graph = world_data
         self._nodes = dict()
         self._name_nodes = dict()
-        self._starting_nodes = world_data["starting"]
-        for node_id, node_name in world_data["nodes"].items():
-            edges = world_data["connections"][node_id]
-            node_coords = world_data["coordinates"][node_id]
-            node_id = int(node_id)
-            node = GraphNode(node_id, node_coords, node_name, edges, self)
+        self._starting_nodes = self.graph.starting
+        for node_id in self.graph.ids:
+            node = GraphNode(node_id, self.graph.coords[node_id], self.graph.names[node_id], self.graph.edges[node_id], self)
             self._nodes[node_id] = node
-            self._name_nodes[node_name] = node
+            self._name_nodes[node.name] = node
 
     def get_starting_nodes(self):
         return tuple(self._starting_nodes)
@@ -53,6 +114,12 @@ class World:
 
         return retval
 
+    def ball(self, node_id: int, distance: int):
+        """
+        Ids of nodes within `distance` steps of this node. Negative distance: just the node.
+        """
+        return self.graph.ball(node_id, distance)
+
     def path_to(self, node: GraphNode, filter_func = lambda node: True):
         q = SimpleQueue()
         q.put((node, []))
@@ -82,3 +149,9 @@ class GraphNode:
 
     def random_neighbor(self, rand):
         return self._graph.node(rand.choice(self.edges))
+
+    def neighbor_at(self, u: float):
+        """
+        Neighbour picked by a uniform [0, 1) draw (see game/rng.py).
+        """
+        return self._graph.node(self.edges[int(u * len(self.edges))])
@@ -0,0 +1,325 @@
+"""
+Local snapshot of the wynnbuilder item database (research mode).
+
+The item db used to be downloaded in DiscordBot.__init__ on every restart.
+Now it is loaded lazily (first research command) from a local snapshot file,
+and refreshed from wynnbuilder in a background thread when the snapshot is old.
+
+Name lookups go through an ItemIndex built once per load (exact lookups are a
+dict hit, typo suggestions walk a trie).
+
+Snapshot format:
+    8 bytes     magic b"ATLASIDB"
+    4 bytes     header length (big endian)
+    header      json: {"format", "source", "version", "fetched", "count", "sha256"}
+    payload     zlib compressed json list of items (only the fields we use)
+
+Usage: python3 itemdb.py        (fetch and write a fresh snapshot)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import List, Mapping
+
+ITEM_DB_URL = "https://wynnbuilder.github.io/compress.json"
+ITEM_SNAPSHOT = os.environ.get('ITEM_SNAPSHOT', "item_db.snapshot")
+# Refresh in the background if the snapshot is older than this (seconds).
+ITEM_DB_MAX_AGE = float(os.environ.get('ITEM_DB_MAX_AGE', 24 * 3600))
+
+SNAPSHOT_MAGIC = b"ATLASIDB"
+SNAPSHOT_FORMAT = 1
+# Item fields kept in the snapshot (everything research mode looks at).
+SKILLPOINTS = ["str", "dex", "int", "def", "agi"]
+ITEM_FIELDS = ["id", "name", "displayName", "tier", "type"] + SKILLPOINTS + [sp+"Req" for sp in SKILLPOINTS]
+
+def get_name(item: dict) -> str:
+    """
+    Display name of an item.
+    """
+    if "displayName" in item:
+        return item["displayName"]
+    return item["name"]
+
+def simplify_item(item: dict) -> dict:
+    """
+    Research mode view of an item: id, tier, type, name, skillpoint bonuses and requirements.
+    """
+    simplified_item = {key: item[key] for key in ["id", "tier", "type"]}
+    simplified_item["name"] = get_name(item)
+    simplified_item["type"] = simplified_item["type"].lower()
+    simplified_item["sp"] = [item.get(sp, 0) for sp in SKILLPOINTS]
+    simplified_item["req"] = [item.get(sp+"Req", 0) for sp in SKILLPOINTS]
+    return simplified_item
+
+def normalize_name(name: str) -> str:
+    """
+    Lookup key for a name: case folded, whitespace collapsed.
+    """
+    return ' '.join(name.casefold().split())
+
+class _TrieNode:
+    __slots__ = ("children", "ids")
+    def __init__(self):
+        self.children: Mapping[str, _TrieNode] = dict()
+        self.ids: List[int] = None
+
+class ItemIndex:
+    """
+    Name -> item id index over normalized display and internal names.
+    Exact lookups are O(1); prefix and fuzzy (edit distance) suggestions walk a trie.
+    """
+    def __init__(self, id_map: Mapping[int, dict]):
+        self._exact: Mapping[str, int] = dict()
+        self._names: Mapping[int, str] = dict()
+        self._root = _TrieNode()
+        # Display names win over internal names if they collide.
+        for item_id, item in id_map.items():
+            self._names[item_id] = get_name(item)
+            if "name" in item:
+                self._add(normalize_name(item["name"]), item_id)
+        for item_id, item in id_map.items():
+            key = normalize_name(get_name(item))
+            self._exact[key] = item_id
+            self._add(key, item_id, exact=False)
+
+    def _add(self, key: str, item_id: int, exact: bool = True):
+        if exact:
+            self._exact.setdefault(key, item_id)
+        node = self._root
+        for char in key:
+            child = node.children.get(char, None)
+            if child is None:
+                child = _TrieNode()
+                node.children[char] = child
+            node = child
+        if node.ids is None:
+            node.ids = [item_id]
+        elif item_id not in node.ids:
+            node.ids.append(item_id)
+
+    def lookup(self, name: str) -> int:
+        """
+        Item id for an exact (normalized) name, or None.
+        """
+        return self._exact.get(normalize_name(name), None)
+
+    def prefix(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Names starting with `prefix` (shortest first).
+        """
+        node = self._root
+        key = normalize_name(prefix)
+        for char in key:
+            node = node.children.get(char, None)
+            if node is None:
+                return []
+        result = []
+        level = [node]
+        while level and len(result) < limit:
+            next_level = []
+            for cur in level:
+                if cur.ids is not None:
+                    result.extend(self._names[item_id] for item_id in cur.ids)
+                next_level.extend(cur.children.values())
+            level = next_level
+        return list(dict.fromkeys(result))[:limit]
+
+    def suggest(self, name: str, limit: int = 5, max_distance: int = 2) -> List[str]:
+        """
+        Names within `max_distance` edits of `name`, closest first.
+        Standard trie walk carrying one levenshtein row per node; branches whose
+        row minimum exceeds max_distance are pruned.
+        """
+        key = normalize_name(name)
+        first_row = list(range(len(key) + 1))
+        found = []  # (distance, name)
+
+        stack = [(child, char, first_row) for char, child in self._root.children.items()]
+        while stack:
+            node, char, prev_row = stack.pop()
+            row = [prev_row[0] + 1]
+            for col in range(1, len(key) + 1):
+                row.append(min(row[col-1] + 1, prev_row[col] + 1,
+                               prev_row[col-1] + (key[col-1] != char)))
+            if node.ids is not None and row[-1] <= max_distance:
+                for item_id in node.ids:
+                    found.append((row[-1], self._names[item_id]))
+            if min(row) <= max_distance:
+                for next_char, child in node.children.items():
+                    stack.append((child, next_char, row))
+        found.sort()
+        return list(dict.fromkeys(item_name for _, item_name in found))[:limit]
+
+def _trim(item: dict) -> dict:
+    return {key: item[key] for key in ITEM_FIELDS if key in item}
+
+def write_snapshot(path: str, items, meta: dict):
+    """
+    Atomically write a snapshot file.
+    """
+    payload = zlib.compress(json.dumps([_trim(item) for item in items], separators=(',', ':')).encode('utf8'), 9)
+    header = dict(meta)
+    header.update({"format": SNAPSHOT_FORMAT, "count": len(items), "sha256": hashlib.sha256(payload).hexdigest()})
+    header = json.dumps(header).encode('utf8')
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as outfile:
+        outfile.write(SNAPSHOT_MAGIC)
+        outfile.write(struct.pack(">I", len(header)))
+        outfile.write(header)
+        outfile.write(payload)
+    os.replace(tmp_path, path)
+
+def read_snapshot_header(path: str) -> dict:
+    with open(path, 'rb') as infile:
+        if infile.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path}: not an item snapshot")
+        header_len, = struct.unpack(">I", infile.read(4))
+        return json.loads(infile.read(header_len))
+
+def read_snapshot(path: str):
+    """
+    Return (header, items).
+    """
+    with open(path, 'rb') as infile:
+        data = infile.read()
+    if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path}: not an item snapshot")
+    offset = len(SNAPSHOT_MAGIC)
+    header_len, = struct.unpack_from(">I", data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset+header_len])
+    if header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path}: unsupported snapshot format {header.get('format')}")
+    payload = data[offset+header_len:]
+    if hashlib.sha256(payload).hexdigest() != header["sha256"]:
+        raise ValueError(f"{path}: snapshot is corrupt")
+    return header, json.loads(zlib.decompress(payload))
+
+def fetch_items(url: str = ITEM_DB_URL):
+    """
+    Download the item db. Return (meta, items).
+    """
+    import requests
+    item_dat = requests.get(url, timeout=30).json()
+    meta = {"source": url, "version": item_dat.get("version", None), "fetched": time.time()}
+    return meta, item_dat["items"]
+
+class ItemDatabase:
+    """
+    Lazily loaded item db. Thread safe.
+    """
+    def __init__(self, snapshot_path: str = ITEM_SNAPSHOT, url: str = ITEM_DB_URL, max_age: float = ITEM_DB_MAX_AGE):
+        self.snapshot_path = snapshot_path
+        self.url = url
+        self.max_age = max_age
+        self.meta = None
+        self._id_map: Mapping[int, dict] = None
+        self._index: ItemIndex = None
+        self._simplified: Mapping[int, dict] = dict()   # memoized simplify_item, reset on reload
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def is_loaded(self) -> bool:
+        return self._id_map is not None
+
+    def id_map(self) -> Mapping[int, dict]:
+        """
+        Map (item id, item). Loads the db on first use.
+        """
+        if self._id_map is None:
+            self.load()
+        return self._id_map
+
+    def index(self) -> ItemIndex:
+        """
+        Name index over the current item db. Loads the db on first use.
+        """
+        if self._index is None:
+            self.load()
+        return self._index
+
+    def find(self, name: str) -> dict:
+        """
+        Item with this display or internal name (case insensitive), or None.
+        """
+        item_id = self.index().lookup(name)
+        if item_id is None:
+            return None
+        return self._id_map[item_id]
+
+    def simplified(self, item_id: int) -> dict:
+        """
+        simplify_item() of an item by id (memoized, do not mutate), or None if there is no such item.
+        """
+        cache = self._simplified
+        result = cache.get(item_id, None)
+        if result is None:
+            item = self.id_map().get(item_id, None)
+            if item is None:
+                return None
+            result = simplify_item(item)
+            cache[item_id] = result
+        return result
+
+    def load(self):
+        """
+        Load the snapshot (or download, if there is no usable snapshot). Blocking.
+        """
+        with self._lock:
+            if self._id_map is not None:
+                return
+            try:
+                meta, items = read_snapshot(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                print(f"No usable item snapshot ({e}), downloading")
+                meta, items = fetch_items(self.url)
+                write_snapshot(self.snapshot_path, items, meta)
+            self._install(meta, items)
+        if time.time() - meta.get("fetched", 0) > self.max_age:
+            self.refresh_async()
+
+    def _install(self, meta: dict, items):
+        id_map = {item["id"]: item for item in items}
+        # Build the index before publishing so readers never see a mismatched pair.
+        index = ItemIndex(id_map)
+        self._id_map, self._index, self._simplified = id_map, index, dict()
+        self.meta = meta
+        print(f"Loaded item db version {meta.get('version')} ({len(self._id_map)} items)")
+
+    def refresh(self):
+        """
+        Download the item db, write a new snapshot and swap it in. Blocking.
+        """
+        meta, items = fetch_items(self.url)
+        write_snapshot(self.snapshot_path, items, meta)
+        items = [_trim(item) for item in items]
+        with self._lock:
+            self._install(meta, items)
+
+    def refresh_async(self):
+        """
+        Refresh in a background thread (no-op if one is already running).
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        def work():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Item db refresh failed, keeping snapshot: {e}")
+            finally:
+                self._refreshing = False
+        threading.Thread(target=work, name="itemdb-refresh", daemon=True).start()
+
+if __name__ == "__main__":
+    db = ItemDatabase()
+    db.refresh()
+    print(read_snapshot_header(db.snapshot_path))
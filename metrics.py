@@ -0,0 +1,263 @@
+"""
+Minimal Prometheus-style metrics (text exposition format), served at /api/metrics.
+
+Counters, gauges and histograms are plain python objects updated under a small
+per-series lock, cheap enough for hot paths (turn loop, encoder, dispatcher).
+Values that already live elsewhere (queue depth, persistence lag) are read at
+scrape time through callback gauges instead of being pushed.
+
+Usage:
+    TURN_SECONDS = histogram("atlas_turn_seconds", "GameState.turn duration")
+    with TURN_SECONDS.time():
+        ...
+    EVENTS = counter("atlas_events_total", "Events by type", ["type"])
+    EVENTS.labels("combat").inc()
+"""
+from __future__ import annotations
+
+import math
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable, Dict, Iterable, Sequence, Tuple
+
+# Default histogram buckets (seconds): 1ms .. 60s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class _Timer:
+    __slots__ = ("_series", "_start")
+
+    def __init__(self, series):
+        self._series = series
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._series.observe(time.perf_counter() - self._start)
+
+class _CounterSeries:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labelnames, labelvalues):
+        yield f"{name}_total{_format_labels(labelnames, labelvalues)} {_format_value(self.value)}"
+
+class _GaugeSeries:
+    __slots__ = ("_lock", "value")
+
+    def __init__(self):
+        self._lock = Lock()
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def samples(self, name: str, labelnames, labelvalues):
+        yield f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(self.value)}"
+
+class _HistogramSeries:
+    __slots__ = ("_lock", "_buckets", "_counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float]):
+        self._lock = Lock()
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)     # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def samples(self, name: str, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self.sum, self.count
+        cumulative = 0
+        for bound, n in zip(self._buckets + (math.inf,), counts):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            yield f"{name}_bucket{_format_labels(labelnames, labelvalues, le)} {cumulative}"
+        yield f"{name}_sum{_format_labels(labelnames, labelvalues)} {_format_value(total)}"
+        yield f"{name}_count{_format_labels(labelnames, labelvalues)} {count}"
+
+class Metric:
+    """
+    A named metric family, optionally split by labels.
+    Without labels the family forwards inc/set/observe/time to its single series.
+    """
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), **kwargs):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._series: Dict[tuple, object] = dict()
+        self._lock = Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Series for these label values (created on first use).
+        """
+        key = tuple(str(v) for v in values)
+        series = self._series.get(key, None)
+        if series is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {key}")
+            with self._lock:
+                series = self._series.setdefault(key, self._new_series())
+        return series
+
+    def __getattr__(self, attr):
+        # inc/set/observe/time on an unlabelled metric
+        if attr.startswith('_') or 'labelnames' not in self.__dict__ or self.labelnames:
+            raise AttributeError(attr)
+        return getattr(self._default, attr)
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for key, series in sorted(list(self._series.items())):
+            yield from series.samples(self.name, self.labelnames, key)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterSeries()
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_series(self):
+        return _GaugeSeries()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, buckets=tuple(sorted(buckets)))
+
+    def _new_series(self):
+        return _HistogramSeries(self._kwargs["buckets"])
+
+class CallbackGauge:
+    """
+    Gauge read at scrape time.
+    func() returns a number, or a dict {label value(s): number} when labelnames are given.
+    """
+    def __init__(self, name: str, documentation: str, func: Callable, labelnames: Iterable[str] = (), kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._func = func
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        try:
+            values = self._func()
+        except Exception as e:
+            print(f"Metric {self.name} failed: {e}")
+            return
+        name = self.name + "_total" if self.kind == "counter" else self.name
+        if not self.labelnames:
+            yield f"{name} {_format_value(values)}"
+            return
+        for key, value in sorted(values.items()):
+            if not isinstance(key, tuple):
+                key = (key,)
+            yield f"{name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+class Registry:
+    """
+    Set of metrics rendered together.
+    """
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = Lock()
+
+    def register(self, metric):
+        """
+        Register a metric. Registering the same name twice returns the existing one (module reloads).
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> bytes:
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        lines.append("")
+        return "\n".join(lines).encode('utf8')
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+REGISTRY = Registry()
+
+def counter(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+def histogram(name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+def callback(name: str, documentation: str, func: Callable, labelnames: Iterable[str] = (), kind: str = "gauge") -> CallbackGauge:
+    """
+    Replaces any previous callback with the same name (the callback usually closes over an object).
+    """
+    REGISTRY.unregister(name)
+    return REGISTRY.register(CallbackGauge(name, documentation, func, labelnames, kind))
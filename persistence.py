@@ -0,0 +1,234 @@
+"""
+Write-behind persistence for the atlas-games_store git repo.
+
+Commands used to rewrite a json file and then shell out to `git commit --amend`
+and `git push --force` inline, freezing the bot for the whole push. Now writes
+go into a pending map and a background thread writes them out, commits and
+pushes in batches:
+    - writes to the same file are coalesced (only the latest content is written)
+    - a batch is committed once no new writes came in for `debounce` seconds
+        (or `max_delay` seconds after the first pending write, whichever is first)
+    - failed commits/pushes are retried with exponential backoff
+    - `flush()` commits everything now (call on shutdown)
+
+The remote defaults to the github store, but can be any git url/path (eg. a
+local bare repo) via STORE_REMOTE.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import subprocess
+import time
+from threading import Condition, Thread
+from typing import Callable, Mapping
+
+STORE_DIR = "atlas-games_store"
+STORE_REMOTE = os.environ.get('STORE_REMOTE',
+        f"https://hppeng-wynn:{os.environ.get('GITHUB', '')}@github.com/hppeng-wynn/atlas-games_store.git")
+STORE_DEBOUNCE = float(os.environ.get('STORE_DEBOUNCE', 5.0))
+STORE_MAX_DELAY = float(os.environ.get('STORE_MAX_DELAY', 30.0))
+STORE_MAX_BACKOFF = 300.0
+GIT_USER = "hppeng"
+
+class PersistenceError(Exception):
+    pass
+
+class GitPersistence:
+    """
+    Background git writer for one checkout of the store repo (one branch; the bot keeps one per branch).
+    """
+    def __init__(self, repo_dir: str = STORE_DIR, remote: str = STORE_REMOTE,
+                debounce: float = STORE_DEBOUNCE, max_delay: float = STORE_MAX_DELAY):
+        """
+        repo_dir:   local checkout directory
+        remote:     git url (or path) of the store repo
+        debounce:   seconds of quiet before committing a batch
+        max_delay:  max seconds a write can stay pending
+        """
+        self.repo_dir = repo_dir
+        self.remote = remote
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.branch = None
+        self._cond = Condition()
+        self._pending: Mapping[str, Callable] = dict()  # Map (path relative to repo, () -> file contents)
+        self._first_pending = None                  # time.monotonic() of oldest write not yet picked up
+        self._inflight_since = None                 # time.monotonic() of oldest write in the batch being committed
+        self._last_write = None
+        self._flush_requested = False
+        self._flushing = False
+        self._failures = 0
+        self._retry_at = 0
+        self._running = True
+        self.commit_count = 0
+        self.last_commit_time = None
+        self.last_error = None
+        self._thread = Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+
+    def _git(self, *args, cwd=None):
+        result = subprocess.run(["git", "-c", f"user.name={GIT_USER}", "-c", f"user.email={GIT_USER}", *args],
+                                cwd=self.repo_dir if cwd is None else cwd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise PersistenceError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    def checkout(self, branch: str):
+        """
+        Fresh clone of the store, switched to `branch` (created from the default branch if missing).
+        Blocking: run in an executor.
+        Writes queued before the first checkout are kept and committed to `branch`.
+        """
+        if self.branch is not None:
+            self.flush()
+            self.branch = None
+        if os.path.isdir(self.repo_dir):
+            shutil.rmtree(self.repo_dir)
+        self._git("clone", self.remote, self.repo_dir, cwd=".")
+        self._git("checkout", "-B", branch)
+        if self._git("ls-remote", "--heads", "origin", branch).strip():
+            self._git("reset", "--hard", f"origin/{branch}")
+        self._git("push", "--set-upstream", "origin", branch, "--force")
+        self.branch = branch
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.repo_dir, name)
+
+    def write_json(self, name: str, data):
+        """
+        Queue a json file write (path relative to the repo). Returns immediately.
+        The data is serialized now, so the caller can keep mutating it.
+        """
+        contents = json.dumps(data)
+        self._queue(name, lambda: contents)
+
+    def write_deferred(self, name: str, producer: Callable):
+        """
+        Queue a json file write whose data is produced (by calling `producer()`) only
+        when the batch is committed, in the worker thread. Use when building the data
+        is expensive and writes come in often (eg. exporting a roster).
+        """
+        self._queue(name, lambda: json.dumps(producer()))
+
+    def _queue(self, name: str, contents: Callable):
+        with self._cond:
+            now = time.monotonic()
+            self._pending[name] = contents
+            if self._first_pending is None:
+                self._first_pending = now
+            self._last_write = now
+            self._cond.notify_all()
+
+    def read_json(self, name: str):
+        """
+        Read a json file from the store, seeing writes that are still pending.
+        """
+        with self._cond:
+            contents = self._pending.get(name, None)
+        if contents is not None:
+            return json.loads(contents())
+        with open(self.path(name), 'r') as read_file:
+            return json.load(read_file)
+
+    def lag(self) -> float:
+        """
+        Seconds the oldest unflushed write has been waiting (0 if nothing pending).
+        """
+        times = [t for t in (self._first_pending, self._inflight_since) if t is not None]
+        if not times:
+            return 0
+        return time.monotonic() - min(times)
+
+    def flush(self, timeout: float = 60) -> bool:
+        """
+        Commit and push everything pending now, and wait for it.
+        Return True if nothing is left pending.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._retry_at = 0
+            self._cond.notify_all()
+            while (self._pending or self._flushing) and self._running:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._flush_requested = False
+            return not self._pending
+
+    def stop(self, timeout: float = 60):
+        """
+        Flush and stop the worker (shutdown hook).
+        """
+        self.flush(timeout)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _ready_at(self):
+        """
+        When the pending batch should be committed. Caller holds the lock.
+        """
+        if self._flush_requested:
+            return self._retry_at
+        return max(min(self._last_write + self.debounce, self._first_pending + self.max_delay), self._retry_at)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                wait = self._ready_at() - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                batch = self._pending
+                self._pending = dict()
+                self._inflight_since = self._first_pending
+                self._first_pending = None
+                self._flushing = True
+
+            try:
+                self._commit(batch)
+                with self._cond:
+                    self._failures = 0
+                    self._retry_at = 0
+                    self.commit_count += 1
+                    self.last_commit_time = time.time()
+                    self.last_error = None
+            except Exception as e:
+                print(f"Persistence commit failed: {e}")
+                with self._cond:
+                    # Put the batch back unless it was overwritten meanwhile.
+                    for name, contents in batch.items():
+                        self._pending.setdefault(name, contents)
+                    self._first_pending = self._inflight_since
+                    if self._last_write is None or self._last_write < self._inflight_since:
+                        self._last_write = self._inflight_since
+                    self._failures += 1
+                    self._retry_at = time.monotonic() + min(STORE_MAX_BACKOFF, 2 ** self._failures)
+                    self.last_error = str(e)
+            finally:
+                with self._cond:
+                    self._inflight_since = None
+                    self._flushing = False
+                    self._cond.notify_all()
+
+    def _commit(self, batch: Mapping[str, Callable]):
+        if self.branch is None:
+            raise PersistenceError("store not checked out")
+        for name, contents in batch.items():
+            tmp_path = self.path(name) + ".tmp"
+            with open(tmp_path, 'w') as write_file:
+                write_file.write(contents())
+            os.replace(tmp_path, self.path(name))
+        self._git("add", "--", *batch.keys())
+        # The store keeps a single commit per branch.
+        self._git("commit", "--amend", "--allow-empty", "-m", time.strftime("%c"))
+        self._git("push", "--force", "origin", f"HEAD:{self.branch}")
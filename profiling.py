@@ -0,0 +1,202 @@
+"""
+Opt-in profiling of commands, turns and renderers.
+
+Off by default. Enable with the ATLAS_PROFILE environment variable or the
+`$profile` admin command:
+    cprofile    deterministic profile of the wrapped call, written as .pstats
+    sample      stack sampler on the calling thread, written as .collapsed
+                (one "frame;frame;frame count" line per stack, for flamegraph.pl / speedscope)
+    all         both
+
+Each profiled invocation writes its own files to PROFILE_DIR; only the newest
+PROFILE_KEEP files are kept. When disabled, `profile()` returns a shared no-op
+context manager and `profiled` wrappers do a single attribute check.
+
+Note that profiling an async command also captures whatever else the event
+loop runs while the command awaits.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+
+PROFILE_MODES = ("cprofile", "sample", "all")
+PROFILE_DIR = os.environ.get('ATLAS_PROFILE_DIR', "profiles")
+PROFILE_KEEP = int(os.environ.get('ATLAS_PROFILE_KEEP', 50))
+SAMPLE_INTERVAL = float(os.environ.get('ATLAS_PROFILE_INTERVAL', 0.005))
+
+_NULL = nullcontext()
+# Profiles don't nest: an inner profile() on a profiled thread is a no-op.
+_active = threading.local()
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread every `interval` seconds until stopped.
+    """
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id, None)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class _Profile:
+    """
+    Profiles the block it wraps (on the current thread) and writes the results on exit.
+    """
+    def __init__(self, profiler: Profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+        self._cprofile = None
+        self._sampler = None
+
+    def __enter__(self):
+        self._nested = getattr(_active, "profiling", False)
+        if self._nested:
+            return self
+        _active.profiling = True
+        mode = self._profiler.mode
+        if mode in ("cprofile", "all"):
+            self._cprofile = cProfile.Profile()
+            try:
+                self._cprofile.enable()
+            except ValueError:
+                # Python 3.12+ allows one cProfile per process; skip if another thread holds it.
+                self._cprofile = None
+        if mode in ("sample", "all"):
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self._nested:
+            return
+        _active.profiling = False
+        elapsed = time.perf_counter() - self._start
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+        try:
+            self._profiler.write(self._name, elapsed, self._cprofile, self._sampler)
+        except OSError as e:
+            print(f"Failed to write profile {self._name}: {e}")
+
+class Profiler:
+    """
+    Profiling switch and output directory.
+    """
+    def __init__(self, mode: str = None, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.mode = None
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.set_mode(mode)
+
+    def set_mode(self, mode: str):
+        """
+        Set the profiling mode (one of PROFILE_MODES), or None/"off" to disable.
+        """
+        if mode in (None, "", "off", "0"):
+            self.mode = None
+            return
+        if mode == "1":
+            mode = "cprofile"
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode {mode}, expected one of {', '.join(PROFILE_MODES)}")
+        self.mode = mode
+
+    def profile(self, name: str):
+        """
+        Context manager profiling a block as `name` (no-op when disabled).
+        """
+        if self.mode is None:
+            return _NULL
+        return _Profile(self, name)
+
+    def write(self, name: str, elapsed: float, cprofile_obj, sampler):
+        os.makedirs(self.directory, exist_ok=True)
+        with self._lock:
+            self._counter += 1
+            base = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self._counter:04d}-{name}-{elapsed*1000:.0f}ms")
+        if cprofile_obj is not None:
+            cprofile_obj.dump_stats(base + ".pstats")
+        if sampler is not None:
+            with open(base + ".collapsed", 'w') as f:
+                f.write(sampler.collapsed())
+        self.rotate()
+
+    def rotate(self):
+        """
+        Delete all but the newest `keep` profile files.
+        """
+        with self._lock:
+            files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                     if f.endswith(".pstats") or f.endswith(".collapsed")]
+            files.sort(key=os.path.getmtime)
+            for path in files[:-self.keep] if self.keep > 0 else files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def files(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.listdir(self.directory))
+
+PROFILER = Profiler(os.environ.get('ATLAS_PROFILE', None))
+
+def profile(name: str):
+    return PROFILER.profile(name)
+
+def profiled(name: str):
+    """
+    Decorator profiling every call of a function or coroutine function as `name`.
+    """
+    def decorator(f):
+        if asyncio.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                if PROFILER.mode is None:
+                    return await f(*args, **kwargs)
+                with _Profile(PROFILER, name):
+                    return await f(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if PROFILER.mode is None:
+                return f(*args, **kwargs)
+            with _Profile(PROFILER, name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
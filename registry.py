@@ -0,0 +1,127 @@
+"""
+Player registry backed by sqlite.
+
+Players are partitioned by guild and keyed by discord user id, so registering
+is a single upsert and loading a roster only touches that guild's rows.
+The git store still holds players.json (same format as before); it is
+bulk-imported when the store is checked out and exported in the background
+by the persistence worker.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from typing import Mapping
+
+REGISTRY_PATH = os.environ.get('REGISTRY_PATH', "atlas-games_players.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    guild_id    TEXT NOT NULL,
+    player_id   TEXT NOT NULL,
+    name        TEXT NOT NULL,
+    img         TEXT NOT NULL DEFAULT '',
+    active      INTEGER NOT NULL DEFAULT 1,
+    team        TEXT,
+    PRIMARY KEY (guild_id, player_id)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO players (guild_id, player_id, name, img, active, team) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (guild_id, player_id) DO UPDATE SET
+    name=excluded.name, img=excluded.img, active=excluded.active, team=excluded.team
+"""
+
+def _row(guild_id: str, player_id: str, data: dict):
+    return (str(guild_id), str(player_id), data["name"], data.get("img", ""),
+            int(data.get("active", True)), data.get("team", None))
+
+class PlayerRegistry:
+    """
+    Thread safe player store. Each thread gets its own sqlite connection.
+    """
+    def __init__(self, path: str = REGISTRY_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def upsert(self, guild_id, player_id, data: dict):
+        """
+        Insert or update one player (data in players.json format).
+        """
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute(_UPSERT, _row(guild_id, player_id, data))
+
+    def set_active(self, guild_id, player_id, active: bool) -> bool:
+        """
+        Return False if the player isn't registered.
+        """
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                cur = conn.execute("UPDATE players SET active=? WHERE guild_id=? AND player_id=?",
+                                   (int(active), str(guild_id), str(player_id)))
+        return cur.rowcount > 0
+
+    def import_json(self, guild_id, player_data: Mapping[str, dict], replace: bool = True):
+        """
+        Bulk import a players.json dict into a guild, in one transaction.
+        replace: drop the guild's existing players first.
+        """
+        rows = [_row(guild_id, player_id, data) for player_id, data in player_data.items()]
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM players WHERE guild_id=?", (str(guild_id),))
+                conn.executemany(_UPSERT, rows)
+
+    def roster(self, guild_id, active_only: bool = False) -> dict:
+        """
+        A guild's players as a players.json dict.
+        """
+        query = "SELECT player_id, name, img, active, team FROM players WHERE guild_id=?"
+        if active_only:
+            query += " AND active=1"
+        result = dict()
+        for player_id, name, img, active, team in self._conn().execute(query, (str(guild_id),)):
+            data = {"name": name, "img": img, "active": bool(active)}
+            if team is not None:
+                data["team"] = team
+            result[player_id] = data
+        return result
+
+    def get(self, guild_id, player_id) -> dict:
+        row = self._conn().execute("SELECT name, img, active, team FROM players WHERE guild_id=? AND player_id=?",
+                                   (str(guild_id), str(player_id))).fetchone()
+        if row is None:
+            return None
+        name, img, active, team = row
+        data = {"name": name, "img": img, "active": bool(active)}
+        if team is not None:
+            data["team"] = team
+        return data
+
+    def names(self, guild_id):
+        return [row[0] for row in self._conn().execute(
+                    "SELECT name FROM players WHERE guild_id=? ORDER BY player_id", (str(guild_id),))]
+
+    def count(self, guild_id) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM players WHERE guild_id=?", (str(guild_id),)).fetchone()[0]
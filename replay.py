@@ -0,0 +1,328 @@
+"""
+Animated whole-game replays.
+
+Each published day records where every team is (ReplayDay: a tuple per team, cheap
+to keep for the whole game). render_replay() turns the days into an animated GIF,
+or into a directory of numbered PNG frames for a video encoder
+(eg. ffmpeg -framerate 12 -i replay/%05d.png replay.mp4), with REPLAY_FRAMES_PER_DAY
+frames of movement interpolated between days.
+
+Frames are rendered in a small process pool (replay_pool()). Worker processes are
+forked, and forking a process that is already running threads is unsafe (and copies
+whatever it holds by then), so the bot starts the pool before its other threads
+(start_replay_pool()); if there is no pool by the time threads are running, frames
+are rendered in the calling thread instead. Each worker process scales and
+palettizes the base map once and keeps it, then draws every frame as a palette image
+on a copy of it and encodes it (GIF LZW / PNG) itself. Frames come back in order
+through a bounded window of pending renders and are written out as they arrive, so
+memory doesn't grow with the length of the game. (Pillow's GIF and WebP writers want
+every frame up front, so the GIF is written block by block here; there is no
+streaming WebP output.)
+
+Usage:
+    python replay.py [--players N] [--seed N] [--days N] [--width PX] [-o replay.gif | -o frames_dir]
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from io import BytesIO
+from threading import Lock
+
+from PIL import GifImagePlugin, Image, ImageChops, ImageDraw
+
+from draw import NORMAL_FONT
+
+# Processes rendering replay frames (0: render in the calling thread). Each one is a fork
+# of the bot process, so keep this small on small dynos.
+REPLAY_WORKERS = int(os.environ.get('REPLAY_WORKERS', min(2, os.cpu_count() or 1)))
+REPLAY_WIDTH = int(os.environ.get('REPLAY_WIDTH', 480))
+REPLAY_FRAMES_PER_DAY = int(os.environ.get('REPLAY_FRAMES_PER_DAY', 6))
+REPLAY_FRAME_MS = int(os.environ.get('REPLAY_FRAME_MS', 80))
+# How long each day's final positions stay on screen.
+REPLAY_HOLD_MS = int(os.environ.get('REPLAY_HOLD_MS', 700))
+# Discord's attachment size limit.
+REPLAY_MAX_BYTES = int(os.environ.get('REPLAY_MAX_BYTES', 8 * 1024 * 1024))
+
+BACKGROUND = (54, 57, 63)
+TEXT_COLOR = (255, 255, 255)
+OUTLINE_COLOR = (16, 16, 16)
+TRANSPARENT = (255, 0, 255)     # GIF frames: pixels left as the base map
+TEAM_COLORS = [(230, 25, 75), (60, 180, 75), (255, 225, 25), (0, 130, 200), (245, 130, 48), (145, 30, 180),
+               (70, 240, 240), (240, 50, 230), (210, 245, 60), (250, 190, 212), (0, 128, 128), (170, 110, 40)]
+# Palette: base map colours, then these (so frames never need requantizing).
+EXTRA_COLORS = [BACKGROUND, TEXT_COLOR, OUTLINE_COLOR, TRANSPARENT] + TEAM_COLORS
+MAP_COLORS = 256 - len(EXTRA_COLORS)
+CAPTION_HEIGHT = NORMAL_FONT.size + 10
+
+class ReplayDay:
+    """
+    Team positions at the end of one day.
+    """
+    __slots__ = ("day", "teams", "alive")
+
+    def __init__(self, day: int, teams: tuple):
+        self.day = day
+        self.teams = teams      # ((team id, (x, y), player names), ...), see GameState.team_positions
+        self.alive = sum(len(players) for _, _, players in teams)
+
+    @classmethod
+    def capture(cls, game) -> ReplayDay:
+        return cls(game.get_day(), tuple(game.team_positions()))
+
+def _jitter(team_id: int, coords) -> tuple:
+    """
+    Fixed offset for a team around its node (like print_map, but the same every frame).
+    """
+    rng = random.Random(team_id)
+    theta = rng.uniform(0, 2*math.pi)
+    gamma = rng.uniform(0, 1)
+    return (coords[0] + 200 * math.sqrt(gamma) * math.cos(theta),
+            coords[1] + 100 * math.sqrt(gamma) * math.sin(theta))
+
+def _caption(day: ReplayDay) -> str:
+    return f"Day {day.day}  -  {day.alive} alive" if day.day > 0 else f"Start  -  {day.alive} players"
+
+class Replay:
+    """
+    Days of one game, appended as they are published.
+    """
+    def __init__(self):
+        self.days = []
+
+    def append(self, day: ReplayDay):
+        self.days.append(day)
+
+    def __len__(self):
+        return len(self.days)
+
+    def frames(self, frames_per_day: int = REPLAY_FRAMES_PER_DAY, frame_ms: int = REPLAY_FRAME_MS,
+               hold_ms: int = REPLAY_HOLD_MS):
+        """
+        Frame specs, generated lazily: (caption, duration ms, ((x, y, team size, team id), ...)).
+        Between two days teams move in a straight line. A team that split off starts where its
+        players were; a team that merged moves to the team it merged into; a wiped out team stays put.
+        """
+        days = list(self.days)
+        previous = None
+        for day in days:
+            positions = {team_id: _jitter(team_id, coords) for team_id, coords, _ in day.teams}
+            team_of = {name: team_id for team_id, _, players in day.teams for name in players}
+            if previous is not None:
+                prev_day, prev_positions, prev_team_of = previous
+                paths = []
+                for team_id, _, players in prev_day.teams:
+                    if team_id not in positions:
+                        end = next((positions[team_of[name]] for name in players if name in team_of), prev_positions[team_id])
+                        paths.append((prev_positions[team_id], end, len(players), team_id))
+                for team_id, _, players in day.teams:
+                    start = prev_positions.get(team_id)
+                    if start is None:
+                        start = prev_positions.get(prev_team_of.get(players[0]), positions[team_id])
+                    paths.append((start, positions[team_id], len(players), team_id))
+                caption = _caption(day)
+                for k in range(1, frames_per_day):
+                    t = k / frames_per_day
+                    yield caption, frame_ms, tuple((x0 + (x1 - x0)*t, y0 + (y1 - y0)*t, size, team_id)
+                                                   for (x0, y0), (x1, y1), size, team_id in paths)
+            hold = hold_ms if day is not days[-1] else 3*hold_ms
+            yield _caption(day), hold, tuple((*positions[team_id], len(players), team_id)
+                                             for team_id, _, players in day.teams)
+            previous = (day, positions, team_of)
+
+# Per process: width -> (palette base image, map scale). Filled once per worker by the pool initializer.
+_BASE_MAPS = dict()
+
+def _base_map(width: int):
+    """
+    Base map scaled to `width`, with a caption bar on top, as a palette image (cached).
+    """
+    cached = _BASE_MAPS.get(width)
+    if cached is None:
+        from game.game_visualizer import SCALE_FACTOR, map_image
+        game_map = map_image()
+        full = Image.new('RGB', game_map.size, BACKGROUND)
+        full.paste(game_map, (0, 0), game_map)
+        scale = width / (game_map.size[0] * SCALE_FACTOR)
+        map_height = round(game_map.size[1] * width / game_map.size[0])
+        base = Image.new('RGB', (width, map_height + CAPTION_HEIGHT), BACKGROUND)
+        base.paste(full.resize((width, map_height), Image.LANCZOS), (0, CAPTION_HEIGHT))
+        base = base.quantize(colors=MAP_COLORS)
+        palette = base.getpalette()[:3*MAP_COLORS]
+        palette += [0] * (3*MAP_COLORS - len(palette))
+        base.putpalette(palette + [c for color in EXTRA_COLORS for c in color])
+        cached = (base, scale)
+        _BASE_MAPS[width] = cached
+    return cached
+
+def _render_frame(spec: tuple, width: int, fmt: str) -> bytes:
+    """
+    Render and encode one frame: a GIF image block (fmt "gif") or a PNG file.
+    """
+    caption, duration, dots = spec
+    base, scale = _base_map(width)
+    frame = base.copy()
+    draw = ImageDraw.Draw(frame)
+    draw.fontmode = "1"     # Antialiasing would blend palette indices
+    team_color = MAP_COLORS + EXTRA_COLORS.index(TEAM_COLORS[0])
+    outline = MAP_COLORS + EXTRA_COLORS.index(OUTLINE_COLOR)
+    unit = width / 480
+    for x, y, size, team_id in dots:
+        r = (2.5 + 1.5*math.sqrt(size)) * unit
+        cx = x * scale
+        cy = y * scale + CAPTION_HEIGHT
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=team_color + team_id % len(TEAM_COLORS), outline=outline)
+    draw.text((6, 5), caption, font=NORMAL_FONT.bold, fill=MAP_COLORS + EXTRA_COLORS.index(TEXT_COLOR))
+    if fmt == "gif":
+        # Only the part that differs from the base map (first image of the GIF), the rest
+        # transparent; disposal 3 restores the base map before the next frame.
+        diff = ImageChops.difference(Image.frombytes('L', frame.size, frame.tobytes()),
+                                     Image.frombytes('L', base.size, base.tobytes()))
+        box = diff.getbbox() or (0, 0, 1, 1)
+        transparent = MAP_COLORS + EXTRA_COLORS.index(TRANSPARENT)
+        changed = Image.new('P', (box[2] - box[0], box[3] - box[1]), transparent)
+        changed.putpalette(base.getpalette())
+        changed.paste(frame.crop(box), (0, 0), diff.crop(box).point(lambda v: 255 if v else 0))
+        return b"".join(GifImagePlugin.getdata(changed, offset=box[:2], duration=duration,
+                                               disposal=3, transparency=transparent))
+    out = BytesIO()
+    frame.save(out, "PNG")
+    return out.getvalue()
+
+class _GifWriter:
+    """
+    Animated GIF written one frame at a time. The base map is the first image (and
+    the global palette), frames are drawn over it (see _render_frame).
+    """
+    def __init__(self, path: str, width: int):
+        base = _base_map(width)[0]
+        header, _ = GifImagePlugin.getheader(base.copy(), info={"loop": 0, "optimize": False})
+        self._file = open(path, 'wb')
+        self._file.write(b"".join(header))
+        self._file.write(b"".join(GifImagePlugin.getdata(base.copy())))
+
+    def write(self, data: bytes, duration: int):
+        self._file.write(data)
+
+    def close(self):
+        self._file.write(b";")
+        self._file.close()
+
+class _FrameDirWriter:
+    """
+    Numbered PNG frames at a constant frame rate (longer frames are repeated).
+    """
+    def __init__(self, path: str, frame_ms: int):
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._frame_ms = frame_ms
+        self._count = 0
+
+    def write(self, data: bytes, duration: int):
+        for _ in range(max(1, round(duration / self._frame_ms))):
+            with open(os.path.join(self._path, f"{self._count:05d}.png"), 'wb') as f:
+                f.write(data)
+            self._count += 1
+
+    def close(self):
+        pass
+
+_POOL = None
+_POOL_LOCK = Lock()
+
+def start_replay_pool():
+    """
+    Start the replay pool and fork its workers now. Call while the process has no other
+    threads (the bot does this before starting the http server and connecting).
+    Return the pool (None if REPLAY_WORKERS is 0).
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None and REPLAY_WORKERS > 0:
+            import multiprocessing      # Not needed until the pool starts
+            from concurrent.futures import ProcessPoolExecutor
+            # Explicitly fork (the default elsewhere is spawn/forkserver, which would re-run server.py in each worker).
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("fork" if "fork" in methods else None)
+            _POOL = ProcessPoolExecutor(max_workers=REPLAY_WORKERS, mp_context=context,
+                                        initializer=_base_map, initargs=(REPLAY_WIDTH,))
+            # With fork, the first submit starts every worker at once.
+            _POOL.submit(int)
+        return _POOL
+
+def replay_pool():
+    """
+    Shared process pool for replay frames, or None: REPLAY_WORKERS is 0, or the pool
+    wasn't started before other threads were running (see start_replay_pool).
+    """
+    if _POOL is None and threading.active_count() == 1:
+        return start_replay_pool()
+    return _POOL
+
+def render_replay(replay: Replay, path: str, width: int = REPLAY_WIDTH, frames_per_day: int = REPLAY_FRAMES_PER_DAY,
+                  frame_ms: int = REPLAY_FRAME_MS, parallel: bool = True) -> int:
+    """
+    Render a replay to `path`: an animated GIF if it ends in .gif, otherwise a directory of PNG frames.
+    Blocking (run in a worker thread). Return: number of frames rendered.
+    """
+    fmt = "gif" if path.lower().endswith(".gif") else "png"
+    writer = _GifWriter(path, width) if fmt == "gif" else _FrameDirWriter(path, frame_ms)
+    pool = replay_pool() if parallel else None
+    # At most this many frames rendered but not yet written.
+    window_size = 4 * max(REPLAY_WORKERS, 1)
+    window = deque()
+    count = 0
+    try:
+        for spec in replay.frames(frames_per_day, frame_ms):
+            if pool is None:
+                writer.write(_render_frame(spec, width, fmt), spec[1])
+            else:
+                window.append((pool.submit(_render_frame, spec, width, fmt), spec[1]))
+                if len(window) >= window_size:
+                    future, duration = window.popleft()
+                    writer.write(future.result(), duration)
+            count += 1
+        while window:
+            future, duration = window.popleft()
+            writer.write(future.result(), duration)
+    finally:
+        for future, _ in window:
+            future.cancel()
+        writer.close()
+    return count
+
+def main():
+    from benchmark import make_players
+    from game.datapack import load_datapack
+    from game.game_state import GameState
+
+    parser = argparse.ArgumentParser(description="Simulate a headless game and render its replay.")
+    parser.add_argument('--players', type=int, default=48)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--days', type=int, default=100, help="stop after this many days")
+    parser.add_argument('--width', type=int, default=REPLAY_WIDTH)
+    parser.add_argument('--frames-per-day', type=int, default=REPLAY_FRAMES_PER_DAY)
+    parser.add_argument('--serial', action='store_true', help="render in this process")
+    parser.add_argument('--output', '-o', default='replay.gif', help="*.gif, or a directory for PNG frames")
+    args = parser.parse_args()
+
+    pack = load_datapack()
+    game = GameState(pack.world, make_players(args.players), pack.events, output_function=lambda *args: None,
+                     seed=args.seed, avatars=False)
+    game.set_event_printer(lambda this, event_data: None)
+    replay = Replay()
+    replay.append(ReplayDay.capture(game))
+    while game.get_num_alive_players() > 1 and game.get_day() < args.days:
+        game.turn()
+        replay.append(ReplayDay.capture(game))
+    start = time.perf_counter()
+    frames = render_replay(replay, args.output, args.width, args.frames_per_day, parallel=not args.serial)
+    print(f"{len(replay)} days, {frames} frames -> {args.output} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()
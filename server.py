@@ -1,34 +1,79 @@
 from __future__ import annotations
 
+import os
+import time
+
+def _process_age() -> float:
+    """
+    Seconds since this process started (Linux; 0 elsewhere), so startup times include interpreter startup.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf('SC_CLK_TCK'))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0.0
+
+# Startup phases, reported once the bot connects (see DiscordBot.startup_times).
+PROCESS_START = time.monotonic() - _process_age()
+
 from copy import deepcopy
 from functools import wraps
 import json
 
-import requests
-
 from emojis import ATLAS
 
 from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from threading import Thread, Lock
-import time
 import asyncio
 import json
-from io import BytesIO
-from PIL import Image, ImageDraw
-from queue import Queue
+import tempfile
 
-import os
+import shutil
 SERVER_PORT = int(os.environ['PORT'])
 
 import discord
-from discord.ext import tasks, commands
+from discord.ext import commands
 
 from typing import Union
-
-from game.game_state import GameState
-from draw import NORMAL_FONT, break_text, render_text
-
-PLAYER_DAT_FILE = "atlas-games_store/players.json"
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from session import ChannelSession, RENDER_POOL
+from replay import REPLAY_MAX_BYTES, REPLAY_WIDTH, render_replay, start_replay_pool
+from persistence import STORE_DIR, GitPersistence
+from registry import PlayerRegistry
+from stats import LEADERBOARDS, GameStats
+from itemdb import ItemDatabase, simplify_item
+from summary import ResearchSummary
+from webcache import CachedResponse, StaticAssets, send_cached
+from stream import serve_stream
+from game.avatars import AVATAR_CACHE
+from game.datapack import DataPackError, DataPackLoader
+import metrics
+from profiling import PROFILER, PROFILE_MODES, profiled
+from wynnbuilder import DEFAULT_SLOTS, decode_build, decode_builds
+
+# Relative to the store repo.
+PLAYER_DAT_FILE = "players.json"
+STATS_DAT_FILE = "stats.json"
+
+# /api/decode limits: request body size and urls per request.
+DECODE_MAX_BYTES = int(os.environ.get('DECODE_MAX_BYTES', 1 << 20))
+DECODE_MAX_URLS = int(os.environ.get('DECODE_MAX_URLS', 1000))
+
+# $auto: default/max number of days, and seconds between days once the previous day has been sent.
+AUTO_DEFAULT_DAYS = int(os.environ.get('AUTO_DEFAULT_DAYS', 10))
+AUTO_MAX_DAYS = int(os.environ.get('AUTO_MAX_DAYS', 100))
+AUTO_DAY_DELAY = float(os.environ.get('AUTO_DAY_DELAY', 5))
+
+STARTUP_SECONDS = metrics.gauge("atlas_startup_seconds", "Seconds from process start to each startup phase "
+                                "(imports, run, connected)", ["phase"])
+COMMAND_SECONDS = metrics.histogram("atlas_command_seconds", "Discord command latency", ["command"])
+COMMAND_ERRORS = metrics.counter("atlas_command_errors", "Discord commands that raised", ["command"])
+
+IMPORTS_DONE = time.monotonic()
 
 class DiscordBot():
     """
@@ -43,75 +88,104 @@ class DiscordBot():
 
         self._bot_running = False
         # self._client = discord.Client(intents=intents)
-        # Message queue for things to send (text for now)
-        self._messages = Queue()
-        self._message_send_pause = False
-        self._bind_channel = None
         self._running = True
-
-        self._game_lock = Lock()
-        self._game = None
+        # Map (channel id, ChannelSession). One game + message queue per bound channel.
+        self._sessions = dict()
+        self._sessions_lock = Lock()
+        # Shared by all sessions (do not mutate). Loaded on first $newgame.
+        self._datapack = DataPackLoader()
         self._github_guild_id = None
-        self._github_init = False
-
-        item_dat = json.loads(requests.get("https://wynnbuilder.github.io/compress.json").text)
-        self.id_map = {}
-        for item in item_dat["items"]:
-            self.id_map[item["id"]] = item
+        # Write-behind git store: one checkout (and worker) per branch, ie. per guild, plus "research".
+        # Commits/pushes happen in the background.
+        self._stores = dict()        # Map (branch, GitPersistence)
+        self._stores_lock = Lock()
+        self._checkouts = dict()     # Map (branch, future for its checkout) (shared by concurrent commands)
+        # Indexed player store (per guild). players.json in the git store is imported on checkout.
+        self._registry = PlayerRegistry()
+        # Cross-game stats (per guild), exported to the git store as stats.json.
+        self._stats = GameStats()
+
+        # Item db for research mode, loaded from a local snapshot on first use.
+        self._items = ItemDatabase()
         self.current_entry = None
-        b64_digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz+-"
-        self.b64_reverse = {c: i for i, c in enumerate(b64_digits)}
         self.research_mode = False
-
-        def toInt(digits):
-            result = 0;
-            for digit in digits:
-                result = (result << 6) + self.b64_reverse[digit]
-            return result
-        def toIntSigned(digits):
-            result = 0;
-            if self.b64_reverse[digits[0]] & 0x20:
-                result = -1
-            for digit in digits:
-                result = (result << 6) + self.b64_reverse[digit]
-            return result
+        # /api/summary view of build_data, updated on every change.
+        self.summary = ResearchSummary()
+        # time.monotonic() at each startup phase (see startup_times)
+        self._started = {"imports": IMPORTS_DONE}
+
+        metrics.callback("atlas_queue_depth", "Outgoing messages waiting to be sent",
+                         lambda: {c: session.messages.queue_depth() for c, session in list(self._sessions.items())}, ["channel"])
+        metrics.callback("atlas_messages_sent", "Messages sent to discord",
+                         lambda: {c: session.messages.sent_count for c, session in list(self._sessions.items())}, ["channel"], kind="counter")
+        metrics.callback("atlas_lookahead_days", "Days simulated ahead of $next",
+                         lambda: {c: session.lookahead_depth() for c, session in list(self._sessions.items())}, ["channel"])
+        metrics.callback("atlas_persistence_lag_seconds", "Age of the oldest write not yet pushed to the git store",
+                         lambda: {branch: store.lag() for branch, store in self.stores()}, ["branch"])
+        metrics.callback("atlas_persistence_commits", "Commits pushed to the git store",
+                         lambda: {branch: store.commit_count for branch, store in self.stores()}, ["branch"], kind="counter")
+        metrics.callback("atlas_avatar_cache_size", "Avatars held in the avatar cache", lambda: len(AVATAR_CACHE))
 
         def binding(f):
             @wraps(f)
             async def wrapper(ctx, *args, **kwargs):
                 if self.research_mode:
                     return
-                if self._bind_channel is None:
-                    self._bind_channel = ctx.channel
+                if self.get_session(ctx.channel) is None:
+                    self.open_session(ctx.channel)
                     await ctx.send('Bound to '+ctx.channel.name)
                 return await f(ctx, *args, **kwargs)
             return wrapper
 
+        def checkout_guild(guild_id):
+            store = self.store(guild_id)
+            store.checkout(guild_id)
+            self._registry.import_json(guild_id, store.read_json(PLAYER_DAT_FILE))
+            try:
+                self._stats.import_json(guild_id, store.read_json(STATS_DAT_FILE))
+            except FileNotFoundError:
+                pass
+            except ValueError as e:
+                # Keep the local aggregates rather than replace them with another guild's.
+                print(f"Skipping stats import: {e}")
+
+        async def checkout_store(branch, checkout=None):
+            """
+            Check out a store branch once (in a worker thread, cloning is slow).
+            Concurrent callers for the same branch wait on the same checkout.
+            """
+            future = self._checkouts.get(branch, None)
+            if future is None:
+                if checkout is None:
+                    checkout = lambda branch: self.store(branch).checkout(branch)
+                future = asyncio.get_running_loop().run_in_executor(None, checkout, branch)
+                self._checkouts[branch] = future
+            try:
+                await future
+            except Exception:
+                if self._checkouts.get(branch, None) is future:
+                    del self._checkouts[branch]
+                raise
+
         def github_init(f):
             @wraps(f)
             async def wrapper(ctx, *args, **kwargs):
-                if not self._github_init:
-                    #TODO error check
-                    guild = ctx.guild
-                    guild_id: int = guild.id
-                    os.system(f"sh github_init.sh {guild_id}")
-                    self._github_init = True
+                await checkout_store(str(ctx.guild.id), checkout_guild)
                 return await f(ctx, *args, **kwargs)
             return wrapper
 
         def github_init_research(f):
             @wraps(f)
             async def wrapper(ctx, *args, **kwargs):
-                if not self._github_init:
-                    #TODO error check
-                    guild = ctx.guild
-                    os.system("sh github_init.sh research")
-                    self._github_init = True
-                    self.research_mode = True
-                    with open(PLAYER_DAT_FILE, 'r') as build_file:
-                        self.build_data = json.load(build_file)
-                    if "id" not in self.build_data:
-                        self.build_data = {"id": 0, "builds": {}}
+                if not self.research_mode:
+                    await asyncio.get_running_loop().run_in_executor(None, self._items.load)
+                    await checkout_store("research")
+                    if not self.research_mode:
+                        self.research_mode = True
+                        self.build_data = self.store("research").read_json(PLAYER_DAT_FILE)
+                        if "id" not in self.build_data:
+                            self.build_data = {"id": 0, "builds": {}}
+                        self.summary.load(self.build_data)
                 return await f(ctx, *args, **kwargs)
             return wrapper
 
@@ -121,27 +195,34 @@ class DiscordBot():
             Callback triggered when discord bot is connected.
             """
             print('We have logged in as {0.user}'.format(self._bot))
-            loop.self = self
-            loop.start()
-
-        skillpoint_order = ["str", "dex", "int", "def", "agi"]
-        def simplify_item(item):
-            keys = ["id", "tier", "type"]
-            simplified_item = {key: item[key] for key in keys}
-            simplified_item["name"] = get_name(item)
-            simplified_item["type"] = simplified_item["type"].lower()
-            simplified_item["sp"] = []
-            simplified_item["req"] = []
-            for sp in skillpoint_order:
-                simplified_item["sp"].append(item.get(sp, 0))
-                simplified_item["req"].append(item.get(sp+"Req", 0))
-            return simplified_item
-
-        def get_name(item):
-            if "displayName" in item:
-                return item["displayName"]
-            return item["name"]
-
+            if "connected" not in self._started:
+                # on_ready also fires after reconnects; only the first one is startup.
+                self._started["connected"] = time.monotonic()
+                times = self.startup_times()
+                for phase, seconds in times.items():
+                    STARTUP_SECONDS.labels(phase).set(seconds)
+                print("Startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in times.items()))
+            for session in self.sessions():
+                session.messages.start()
+
+        @self._bot.before_invoke
+        async def start_command_timer(ctx):
+            ctx.command_start = time.perf_counter()
+
+        @self._bot.after_invoke
+        async def record_command_time(ctx):
+            name = ctx.command.qualified_name
+            COMMAND_SECONDS.labels(name).observe(time.perf_counter() - ctx.command_start)
+            if ctx.command_failed:
+                COMMAND_ERRORS.labels(name).inc()
+
+        def item_not_found(item_name):
+            suggestions = self._items.index().suggest(item_name)
+            if not suggestions:
+                suggestions = self._items.index().prefix(item_name, limit=5)
+            if suggestions:
+                return "Item not found. Did you mean: " + ", ".join(suggestions) + "?"
+            return "Item not found"
 
         alias_list = (("boots", "boot"),
                     ("leggings", "legs", "leg"),
@@ -161,30 +242,12 @@ class DiscordBot():
                         return dat[0]
             return slot
 
-        default_slots = ["No "+x for x in ["Helmet", "Chestplate", "Leggings", "Boots", "Ring 1", "Ring 2", "Bracelet", "Necklace", "Weapon"]]
         @self._bot.command(name='build')
         @github_init_research
         async def build(ctx, url: str):
-            wb_hash = url.split('_')[1]
-            equips = [None]*9
-            skillpoints = [0]*5
             # Hard coded to v5 protocol
-            start_idx = 0
-            for i in range(len(equips)):
-                equipment_str = wb_hash[start_idx:start_idx+3]
-                start_idx += 3;
-                item_id = toInt(equipment_str)
-                if item_id not in self.id_map:
-                    equips[i] = {"id": -1, "name": default_slots[i]}
-                    continue
-                item = self.id_map[item_id]
-                equips[i] = simplify_item(item)
-            wb_hash = wb_hash[start_idx:]
-            skillpoint_info = wb_hash[:10]
-            for i in range(5):
-                skillpoints[i] = toIntSigned(skillpoint_info[i+i:i+i+2])
-
-            build = {"equips": equips, "sp": skillpoints}
+            build = decode_build(url, self._items)
+            equips = build["equips"]
             self.current_entry = {"build": build, "add": None, "pops": [], "id": self.build_data["id"]}
             await ctx.send("Set build: " + str([e['name'] for e in equips]))
 
@@ -195,6 +258,36 @@ class DiscordBot():
             else:
                 await ctx.send(str(error))
 
+        @self._bot.command(name='importbuilds')
+        @github_init_research
+        async def importbuilds(ctx, *urls):
+            """
+            Bulk import builds: wynnbuilder urls as arguments and/or attached text files (one url per line).
+            """
+            for attachment in ctx.message.attachments:
+                urls += tuple((await attachment.read()).decode('utf8').splitlines())
+            if not urls:
+                await ctx.send("`$importbuilds <wynnbuilder_url>...` (or attach a file with one url per line)")
+                return
+            decoded = await asyncio.get_running_loop().run_in_executor(None, decode_builds, urls, self._items)
+            imported = []
+            errors = 0
+            for url, build, error in decoded:
+                if build is None:
+                    errors += 1
+                    continue
+                entry_id = self.build_data["id"]
+                entry = {"build": build, "add": None, "pops": [], "id": entry_id}
+                self.build_data["builds"][str(entry_id)] = entry
+                self.build_data["id"] += 1
+                self.summary.set_entry(entry)
+                imported.append(entry_id)
+            if imported:
+                self.store("research").write_json(PLAYER_DAT_FILE, self.build_data)
+                await ctx.send(f"Imported {len(imported)} builds (ids {imported[0]}-{imported[-1]}), {errors} failed")
+            else:
+                await ctx.send(f"No builds imported, {errors} failed")
+
         @self._bot.command(name='copy')
         @github_init_research
         async def copy(ctx, entry_id: int):
@@ -235,22 +328,21 @@ class DiscordBot():
                 await ctx.send("Set a build first with `$build`")
                 return
             slot = abbreviate_slot(slot)
-            item_name = item_name.lower()
-            for item in self.id_map.values():
-                if get_name(item).lower() == item_name:
-                    item = simplify_item(item)
-                    if not slot.startswith(item['type']):   # Jank workaround for ring1 ring2
-                        await ctx.send("Invalid slot for " + item["name"])
-                        return
-                        
-                    old_item = self.current_entry["build"]["equips"][slot_idx[slot]]
-                    for i, (loss, gain) in enumerate(zip(old_item.get('sp', [0]*5), item['sp'])):
-                        self.current_entry["build"]["sp"][i] -= loss
-                        self.current_entry["build"]["sp"][i] += gain
-                    self.current_entry["build"]["equips"][slot_idx[slot]] = item
-                    await ctx.send(f"replaced {old_item['name']} with {item['name']}")
-                    return
-            await ctx.send("Item not found")
+            item = self._items.find(item_name)
+            if item is None:
+                await ctx.send(item_not_found(item_name))
+                return
+            item = simplify_item(item)
+            if not slot.startswith(item['type']):   # Jank workaround for ring1 ring2
+                await ctx.send("Invalid slot for " + item["name"])
+                return
+
+            old_item = self.current_entry["build"]["equips"][slot_idx[slot]]
+            for i, (loss, gain) in enumerate(zip(old_item.get('sp', [0]*5), item['sp'])):
+                self.current_entry["build"]["sp"][i] -= loss
+                self.current_entry["build"]["sp"][i] += gain
+            self.current_entry["build"]["equips"][slot_idx[slot]] = item
+            await ctx.send(f"replaced {old_item['name']} with {item['name']}")
 
         @replace.error
         async def replace_error(ctx, error):
@@ -268,7 +360,7 @@ class DiscordBot():
             old_item = self.current_entry["build"]["equips"][slot_idx[slot]]
             for i, loss in enumerate(old_item['sp']):
                 self.current_entry["build"]["sp"][i] -= loss
-            self.current_entry["build"]["equips"][slot_idx[slot]] = {"id": -1, "name": default_slots[slot_idx[slot]]}
+            self.current_entry["build"]["equips"][slot_idx[slot]] = {"id": -1, "name": DEFAULT_SLOTS[slot_idx[slot]]}
             await ctx.send(f"removed {slot} ({old_item['name']})")
 
         @remove.error
@@ -293,14 +385,13 @@ class DiscordBot():
             if self.current_entry is None:
                 await ctx.send("Set a build first with `$build`")
                 return
-            item_name = item_name.lower()
-            for item in self.id_map.values():
-                if get_name(item).lower() == item_name:
-                    self.current_entry["add"] = simplify_item(item)
-                    self.current_entry["pops"] = []
-                    await ctx.send("Set add item ("+item['name']+"), reset pops")
-                    return
-            await ctx.send("Item not found")
+            item = self._items.find(item_name)
+            if item is None:
+                await ctx.send(item_not_found(item_name))
+                return
+            self.current_entry["add"] = simplify_item(item)
+            self.current_entry["pops"] = []
+            await ctx.send("Set add item ("+item['name']+"), reset pops")
 
         @add.error
         async def add_error(ctx, error):
@@ -340,25 +431,24 @@ class DiscordBot():
 
         @self._bot.command(name='save')
         async def save(ctx):
-            self.build_data["builds"][str(self.current_entry["id"])] = deepcopy(self.current_entry)
+            entry = deepcopy(self.current_entry)
+            self.build_data["builds"][str(entry["id"])] = entry
             self.build_data["id"] += 1
-            with open(PLAYER_DAT_FILE, 'w') as write_file:
-                json.dump(self.build_data, write_file)
-            os.system(f"sh github_update.sh research")
+            self.summary.set_entry(entry)
+            self.store("research").write_json(PLAYER_DAT_FILE, self.build_data)
             saved_id = self.current_entry["id"]
             self.current_entry = None
             await ctx.send(f"Saved build id {saved_id}")
 
         @self._bot.command(name='delete')
         async def delete(ctx, build_id: int):
-            if build_id not in self.build_data:
+            if str(build_id) not in self.build_data["builds"]:
                 await ctx.send(f"No such build: {build_id}")
                 return
 
-            del self.build_data[build_id]
-            with open(PLAYER_DAT_FILE, 'w') as write_file:
-                json.dump(self.build_data, write_file)
-            os.system(f"sh github_update.sh research")
+            del self.build_data["builds"][str(build_id)]
+            self.summary.remove(build_id)
+            self.store("research").write_json(PLAYER_DAT_FILE, self.build_data)
             await ctx.send(f"Deleted build id {build_id}")
 
         @delete.error
@@ -376,7 +466,21 @@ class DiscordBot():
         @self._bot.command(name='github_nuke')
         @binding
         async def github_nuke(ctx):
-            os.system("sh github_nuke.sh")
+            """
+            Drop every local store checkout. Pending writes are pushed first, and the
+            next command that needs a branch clones it again.
+            """
+            # Let clones in progress finish before deleting their directories.
+            await asyncio.gather(*self._checkouts.values(), return_exceptions=True)
+            stores = self.stores()
+            with self._stores_lock:
+                self._stores.clear()
+            self._checkouts.clear()
+            def nuke():
+                for _, store in stores:
+                    store.stop()
+                shutil.rmtree(STORE_DIR, ignore_errors=True)
+            await asyncio.get_running_loop().run_in_executor(None, nuke)
             await ctx.send(f"Nuked git repo")
 
         @self._bot.command(name='register')
@@ -392,24 +496,19 @@ class DiscordBot():
                     "img": player_img,
                     "active": True
                 }
-            with open(PLAYER_DAT_FILE, 'r') as player_file:
-                player_data = json.load(player_file)
-
-            player_data[player_id] = player_obj
-
-            with open(PLAYER_DAT_FILE, 'w') as write_file:
-                json.dump(player_data, write_file)
-            os.system(f"sh github_update.sh {ctx.guild.id}")
+            guild_id = str(ctx.guild.id)
+            self._registry.upsert(guild_id, player_id, player_obj)
+            # players.json (on this guild's branch) is exported from the registry when the store commits.
+            self.store(guild_id).write_deferred(PLAYER_DAT_FILE, lambda: self._registry.roster(guild_id))
             await ctx.send(f"{player_name}, Registered succesfully!")
 
         @self._bot.command(name='listplayers')
         @binding
         @github_init
         async def listplayers(ctx):
-            with open(PLAYER_DAT_FILE, 'r') as player_file:
-                player_data = json.load(player_file)
-            for player in player_data.values():
-                self.queue_message(player["name"])
+            session = self.get_session(ctx.channel)
+            for name in self._registry.names(ctx.guild.id):
+                session.queue_message(name)
 
         @self._bot.command(name='dc')
         @binding
@@ -431,93 +530,264 @@ class DiscordBot():
         @self._bot.command(name='newgame', aliases=['ng'])
         @binding
         @github_init
+        @profiled("cmd_newgame")
         async def newgame(ctx):
-            if self._bind_channel is None:
+            session = self.get_session(ctx.channel)
+            if session is None:
                 await ctx.send('atlas-games needs to be bound to a channel first! Use $host')
+            elif not session.game_lock.acquire(blocking=False):
+                await ctx.send('Game is busy! Try again soon...')
             else:
-                await ctx.send('Starting a new round of atlas-games! Use $next to advance and $player to view player stats.')
-                with self._game_lock:
-                    self._world_data = json.load(open("game/world_data.json", 'r'))
-                    self._event_data = json.load(open("game/event_data.json", 'r'))
-                    self._player_data = json.load(open(PLAYER_DAT_FILE, 'r'))
-                    self._game = GameState(self._world_data, self._player_data, self._event_data, self.queue_message, bot=self._bot)
-
-                    def player_highlighter(this: GameState, event_data):
-                        ascent, descent = NORMAL_FONT.normal.getmetrics()
-                        line_height = ascent + descent
-                        image_size = 64
-
-                        batch_width = 500
-                        batch_height = 0
-                        # Tuple(y, images, text)
-                        render_batch = []
-                        dummy_image = Image.new(mode='RGBA', size=(1000, 50), color=(54, 57, 63))
-                        dummy_draw = ImageDraw.Draw(dummy_image)
-                        for idx, (event, event_type, players) in enumerate(event_data):
-                            imagelist = [p.get_active_image() for p in players]
-
-                            images_width = image_size*len(players)* 1.25 + image_size/4
-                            result_height = round(image_size*1.25) + 5
-
-                            event_raw_text, n_lines = break_text(event['text'].format(*(f"\\*{p.name}\\*" for p in players)), dummy_draw, NORMAL_FONT, batch_width)
-                            print(event_raw_text)
-
-                            result_height += line_height*n_lines
-                            render_batch.append((batch_height, imagelist, event_raw_text))
-                            batch_height += result_height
-
-                            if len(render_batch) == 5 or idx == len(event_data) - 1:
-                                result = Image.new(mode='RGBA', size=(batch_width, batch_height), color=(54, 57, 63))
-                                d = ImageDraw.Draw(result)
-                                for y, images, text in render_batch:
-                                    text_start_y = y + round(image_size * 1.25) + 5
-                                    render_text(text, result, d, NORMAL_FONT, (0, text_start_y), (255,255,255))
-                                    for i, image  in enumerate(images):
-                                        result.paste(im=image, box=(int(i*image_size*1.25) + image_size//4, y+image_size // 4), mask=image.convert('RGBA'))
-                                self.queue_message(result)
-                                batch_height = 0
-                                render_batch = []
-
-                    self._game.set_event_printer(player_highlighter)
+                try:
+                    loop = asyncio.get_running_loop()
+                    try:
+                        pack = await loop.run_in_executor(RENDER_POOL, self._datapack.get)
+                    except DataPackError as e:
+                        print(e)
+                        await ctx.send(f'World/event data is invalid ({len(e.errors)} errors), check the logs.')
+                        return
+                    await ctx.send('Starting a new round of atlas-games! Use $next to advance and $player to view player stats.')
+                    player_data = self._registry.roster(ctx.guild.id)
+                    await loop.run_in_executor(RENDER_POOL,
+                            session.new_game, pack.world, player_data, pack.events, self._bot)
+                finally:
+                    session.game_lock.release()
+
+        async def announce_winner(ctx, session):
+            """
+            Announce the winner, record the game's stats and end the game. Caller must hold the game lock.
+            """
+            game = session.game
+            if ctx.guild is not None:
+                guild_id = str(ctx.guild.id)
+                await asyncio.get_running_loop().run_in_executor(None, self._stats.record_game, guild_id, game.results(),
+                                                                 session.player_ids, game.get_seed(), game.get_day())
+                # stats.json is exported from the stats db when the store commits.
+                self.store(guild_id).write_deferred(STATS_DAT_FILE, lambda: self._stats.export_json(guild_id))
+            if session.game._players:
+                for player_name in session.game._players:
+                    await ctx.send(f"The winner is **{player_name}**!")
+                    break
+            else:
+                await ctx.send("What a tragedy! no winners this time around.")
+            session.end_game()
 
         @self._bot.command(name='next', aliases=['n'])
+        @profiled("cmd_next")
         async def next_turn(ctx):
-            if self._game_lock.acquire(blocking=False):
+            session = self.get_session(ctx.channel)
+            if session is None or session.game is None:
+                print('No game is running! Start a new game with $newgame.')
+                await ctx.send('No game is running! Start a new game with $newgame.')
+            elif session.game_lock.acquire(blocking=False):
                 print('Got game lock')
-                if self._game is None:
-                    print('No game is running! Start a new game with $newgame.')
-                    await ctx.send('No game is running! Start a new game with $newgame.')
-                else:
-                    if self._game.get_num_alive_players() <= 1:
-                        if self._game._players:
-                            for player_name in self._game._players:
-                                await ctx.send(f"The winner is **{player_name}**!")
-                                self._game = None
-                                self._message_send_pause = False
-                                self._game_lock.release()
-                                return
-                        else:
-                            await ctx.send("What a tragedy! no winners this time around.")
-                            self._game = None
-                            self._message_send_pause = False
-                            self._game_lock.release()
-                            return
-                    print('Starting turn')
-                    self._game.turn()
-                    self.queue_message(
-                        f"Alive: {self._game.get_num_alive_players()}, Dead: {self._game.get_num_dead_players()}")
-                    self.queue_message(self._game.print_map())
-                    self.queue_message(
-                        "Day concluded --- type `$next` or react ⏭️ to continue")
-                self._game_lock.release()
+                try:
+                    if session.game is None:
+                        print('No game is running! Start a new game with $newgame.')
+                        await ctx.send('No game is running! Start a new game with $newgame.')
+                    elif session.alive_players() <= 1:
+                        await announce_winner(ctx, session)
+                    else:
+                        # Simulate + render in the shared worker pool; other channels keep going.
+                        await asyncio.get_running_loop().run_in_executor(RENDER_POOL, session.play_turn)
+                finally:
+                    session.game_lock.release()
             else:
                 print('Game is busy! Try again soon...')
                 await ctx.send('Game is busy! Try again soon...')
 
+        @self._bot.command(name='auto')
+        async def auto(ctx, days: str = None):
+            """
+            $auto [days]    advance up to `days` days without $next (default AUTO_DEFAULT_DAYS)
+            $auto stop      stop after the day being sent
+
+            Pipelined: the next day is simulated and rendered while the current one uploads,
+            and is published once the current day has been sent (plus AUTO_DAY_DELAY).
+            While sending is paused the game lock is released (other commands keep working),
+            and auto mode carries on after $resume.
+            """
+            session = self.get_session(ctx.channel)
+            if days == "stop":
+                if session is not None and session.auto_running:
+                    session.auto_stop = True
+                    await ctx.send("Stopping auto mode after this day.")
+                return
+            try:
+                days = min(int(days), AUTO_MAX_DAYS) if days is not None else AUTO_DEFAULT_DAYS
+            except ValueError:
+                days = 0
+            if days < 1:
+                # The first day is simulated before the loop, so it always needs at least one iteration.
+                await ctx.send("Usage: `$auto [days]` (at least 1) or `$auto stop`")
+                return
+            if session is None or session.game is None:
+                await ctx.send('No game is running! Start a new game with $newgame.')
+                return
+            if session.auto_running:
+                await ctx.send("Auto mode is already running (`$auto stop` to stop).")
+                return
+            if not session.game_lock.acquire(blocking=False):
+                await ctx.send('Game is busy! Try again soon...')
+                return
+            loop = asyncio.get_running_loop()
+            session.auto_running = True
+            session.auto_stop = False
+            game = session.game
+            locked = True
+            pending = None
+
+            async def wait_while_held() -> bool:
+                """
+                Sending is held (eg. paused until $resume): give the game lock back until it resumes.
+                Return False if auto mode should stop instead ($auto stop, or the game changed).
+                """
+                nonlocal locked
+                session.game_lock.release()
+                locked = False
+                while not await session.messages.wait_sending(1):
+                    if session.auto_stop:
+                        return False
+                while not session.game_lock.acquire(blocking=False):
+                    if session.auto_stop:
+                        return False
+                    await asyncio.sleep(0.1)
+                locked = True
+                return session.game is game and not session.auto_stop
+
+            async def wait_sent() -> bool:
+                """
+                Wait until everything queued has been sent, waiting out pauses without the lock.
+                """
+                while not await session.messages.wait_sent():
+                    if not await wait_while_held():
+                        return False
+                return True
+
+            try:
+                if session.game is None:
+                    return
+                if session.alive_players() <= 1:
+                    await announce_winner(ctx, session)
+                    return
+                await ctx.send(f"Auto mode: advancing up to {days} days (`$auto stop` to stop)")
+                pending = loop.run_in_executor(RENDER_POOL, session.next_day)
+                for i in range(days):
+                    day = await pending
+                    pending = None
+                    held = False
+                    if i > 0:
+                        # Previous day has to finish uploading first.
+                        held = not await session.messages.wait_sent()
+                        if not held:
+                            await asyncio.sleep(AUTO_DAY_DELAY)
+                    last = i == days - 1 or day.alive <= 1 or session.auto_stop
+                    # A held day is queued right away, so days stay in order if $next runs during the pause.
+                    session.publish_day(day, prompt=last)
+                    if last:
+                        break
+                    if held and not await wait_while_held():
+                        if session.game is game:
+                            session.prompt_next()
+                        break
+                    if session.alive_players() <= 1:
+                        # Finished by $next during the pause.
+                        break
+                    # Simulate the next day while this one uploads.
+                    pending = loop.run_in_executor(RENDER_POOL, session.next_day)
+                if locked and session.game is game and session.alive_players() <= 1 and await wait_sent():
+                    await announce_winner(ctx, session)
+            finally:
+                if pending is not None:
+                    # Cancelled mid-way: the lock is only released once the worker is done with the game.
+                    await asyncio.wait([pending])
+                session.auto_running = False
+                if locked:
+                    session.game_lock.release()
+
+        @self._bot.command(name='leaderboard', aliases=['lb'])
+        async def leaderboard(ctx, by: str = "wins"):
+            """
+            $leaderboard [wins|kills|placement]     top players of this server over all finished games
+            """
+            if by not in LEADERBOARDS:
+                await ctx.send(f"Usage: `$leaderboard [{'|'.join(LEADERBOARDS)}]`")
+                return
+            rows = self._stats.leaderboard(ctx.guild.id, by)
+            if not rows:
+                await ctx.send("No finished games yet!")
+                return
+            lines = [f"{i}. **{row['name']}**: {row['wins']} wins, {row['kills']} kills, "
+                     f"avg placement {row['avg_placement']:.1f} ({row['games']} games)"
+                     for i, row in enumerate(rows, start=1)]
+            await ctx.send(f"Leaderboard ({by}):\n" + "\n".join(lines))
+
+        @self._bot.command(name='stats')
+        async def stats(ctx, *, player_name: str = None):
+            """
+            $stats [playername]     a player's stats over all finished games (default: yourself)
+            """
+            player = player_name if player_name is not None else str(ctx.author.id)
+            row = self._stats.player(ctx.guild.id, player)
+            if row is None:
+                await ctx.send(f"No stats for {player_name or ctx.author.name} yet.")
+                return
+            message = (f"**{row['name']}**: {row['games']} games, {row['wins']} wins, {row['kills']} kills, {row['deaths']} deaths\n"
+                       f"Average placement {row['avg_placement']:.1f}, best {row['best_placement']}")
+            if row["nemesis"] is not None:
+                message += f"\nNemesis: **{row['nemesis']['name']}** ({row['nemesis']['kills']} kills)"
+            await ctx.send(message)
+
+        @self._bot.command(name='replay')
+        @profiled("cmd_replay")
+        async def replay(ctx):
+            """
+            $replay     animated map of the game so far (or of the last game)
+            Frames are rendered in the replay process pool; if the GIF is over discord's
+            limit it is rendered again at half the width.
+            """
+            session = self.get_session(ctx.channel)
+            if session is None or session.replay is None or len(session.replay) < 2:
+                await ctx.send('Nothing to replay yet! Start a game with $newgame and play a few days.')
+                return
+            days = len(session.replay) - 1
+            await ctx.send(f'Rendering a replay of {days} days...')
+            loop = asyncio.get_running_loop()
+            path = os.path.join(tempfile.gettempdir(), f"replay-{ctx.channel.id}-{time.monotonic_ns()}.gif")
+            try:
+                for width in (REPLAY_WIDTH, REPLAY_WIDTH // 2):
+                    await loop.run_in_executor(RENDER_POOL, render_replay, session.replay, path, width)
+                    if os.path.getsize(path) <= REPLAY_MAX_BYTES:
+                        await ctx.send(file=discord.File(path, filename="replay.gif"))
+                        return
+                await ctx.send(f'The replay is too large to upload ({days} days).')
+            finally:
+                if os.path.exists(path):
+                    os.remove(path)
+
+        @self._bot.command(name='profile')
+        @commands.has_permissions(administrator=True)
+        async def profile_cmd(ctx, mode: str = None):
+            """
+            $profile                show the profiling mode
+            $profile <mode>|off     mode: cprofile, sample or all
+            """
+            if mode is not None:
+                try:
+                    PROFILER.set_mode(mode)
+                except ValueError as e:
+                    await ctx.send(str(e))
+                    return
+            files = PROFILER.files()
+            await ctx.send(f"Profiling: {PROFILER.mode or 'off'} (modes: {', '.join(PROFILE_MODES)}). "
+                           f"{len(files)} profile files in `{PROFILER.directory}`")
+
         @self._bot.command(name='resume', aliases=['r'])
         async def resume(ctx):
             print("Resuming printout")
-            self._message_send_pause = False
+            session = self.get_session(ctx.channel)
+            if session is not None:
+                session.messages.resume()
         
         @self._bot.event
         async def on_message(message):
@@ -547,7 +817,8 @@ class DiscordBot():
             context = await self._bot.get_context(reaction.message)
             if user.bot:
                 return
-            if self._message_send_pause:
+            session = self.get_session(reaction.message.channel)
+            if session is not None and session.messages.paused:
                 if reaction.emoji == "▶️" and ("`$resume`" in reaction.message.content):
                     await resume(context)
             if reaction.emoji == "⏭️" and ("`$next`" in reaction.message.content):
@@ -555,11 +826,14 @@ class DiscordBot():
                     
         @self._bot.command(name='player', aliases=['p'])
         async def player_info(ctx, player_name):
-            if self._game is None:
+            session = self.get_session(ctx.channel)
+            # Answer from the published snapshot: the game itself may be simulated days ahead.
+            snapshot = session.snapshot if session is not None else None
+            if session is None or session.game is None or snapshot is None:
                 await ctx.send('No game is running! Start a new game with $newgame.')
             else:
                 try:
-                    await ctx.send(self._game.player_info(player_name))
+                    await ctx.send(snapshot.player_info(player_name))
                 except:
                     await ctx.send("`$player <playername>`")
 
@@ -573,71 +847,91 @@ $hello -- pings the bot, returns the current hosting port (debug use)
 $dc <port> -- disconnect the bot running on the specified port (debug use)
 $newgame -- only after the bot is bound, starts a new round of atlas games
 $next -- starts the next day given that a game is already running
+$auto [days] -- advances several days automatically ($auto stop to stop)
+$replay -- animated map of the game so far
+$leaderboard [wins|kills|placement] -- top players over all finished games
+$stats [playername] -- a player's stats over all finished games
 $resume -- resume printing
 $player <playername> -- returns the statistics of a player
 ```''')
 
-        @tasks.loop(seconds=1.0)
-        async def loop():
-            """
-            Loop function for the bot. Since I can't send messages from other threads
-            (something about asyncio) using this as an in-between.
-            For now: Reads messages out of the message queue (can be filled by other threads)
-            and spits them out into the bound channel.
-            """
-            self = loop.self
-            print(f"Heartbeat: {time.time()}")
-            if not self._running:
-                return
-            elif self._message_send_pause:
-                return
+    @property
+    def id_map(self):
+        """
+        Map (item id, item) of the wynnbuilder item db (loads it on first use).
+        """
+        return self._items.id_map()
 
-            if self._bind_channel is not None:
-                buffered_message = []
-                buffered_msg_len = 0
-                sent_msgs = 0
-                while not self._messages.empty():
-                    content = self._messages.get()
-                    if isinstance(content, str):
-                        buffered_msg_len += len(content) + 1
-                        if len(buffered_message) == 0:
-                            sent_msgs += 1
-                        buffered_message.append(content)
-                        if buffered_msg_len > 1000:
-                            await self._bind_channel.send('\n'.join(buffered_message))
-                            buffered_message = []
-                    else:
-                        if len(buffered_message) > 0:
-                            await self._bind_channel.send('\n'.join(buffered_message))
-                            buffered_message = []
-
-                        if isinstance(content, Image.Image):
-                            with BytesIO() as image_binary:
-                                content.save(image_binary, 'PNG')
-                                image_binary.seek(0)
-                                await self._bind_channel.send(file=discord.File(fp=image_binary, filename='content.png'))
-                            sent_msgs += 1
-                    if sent_msgs >= 5 and not self._messages.empty():
-                        self._message_send_pause = True
-                        break
-                if len(buffered_message) > 0:
-                    await self._bind_channel.send('\n'.join(buffered_message))
-                if self._message_send_pause:
-                    await self._bind_channel.send('Paused sending messages -- type `$resume` or react ▶️ to resume')
+    def store(self, branch: str) -> GitPersistence:
+        """
+        The git store checkout for a branch (a guild id, or "research"), created on first use.
+        Commands check it out through the github_init decorators before reading it.
+        """
+        with self._stores_lock:
+            store = self._stores.get(branch, None)
+            if store is None:
+                store = GitPersistence(os.path.join(STORE_DIR, branch))
+                self._stores[branch] = store
+            return store
+
+    def stores(self):
+        """
+        (branch, GitPersistence) pairs of every store opened so far.
+        """
+        with self._stores_lock:
+            return list(self._stores.items())
+
+    def get_session(self, channel) -> ChannelSession:
+        """
+        Get the session bound to this channel, or None.
+        """
+        return self._sessions.get(channel.id, None)
+
+    def open_session(self, channel) -> ChannelSession:
+        """
+        Bind a channel (get or create its session). Must be called from the event loop.
+        """
+        with self._sessions_lock:
+            session = self._sessions.get(channel.id, None)
+            if session is None:
+                session = ChannelSession(channel, is_active=lambda: self._running)
+                self._sessions[channel.id] = session
+        if self._bot.is_ready():
+            session.messages.start()
+        return session
+
+    def sessions(self):
+        with self._sessions_lock:
+            return list(self._sessions.values())
+
+    def get_session_by_id(self, channel_id: int):
+        return self._sessions.get(channel_id, None)
+
+    def game_snapshot(self, channel_id: int):
+        """
+        Latest published snapshot of the game in this channel, or None.
+        """
+        session = self.get_session_by_id(channel_id)
+        if session is None:
+            return None
+        return session.snapshot
 
     def queue_message(self, content) -> bool:
         """
-        Queue a new message to be sent by the bot.
+        Queue a new message to be sent by the bot (to every bound channel).
         Return: True on success, false if bot is not running.
         """
         if not self._running:
             return False
 
-        self._messages.put(content)
+        for session in self.sessions():
+            session.queue_message(content)
         return True
 
     def start(self):
         self._running = True
+        for session in self.sessions():
+            session.messages.wake()
 
     def pause(self):
         self._running = False
@@ -645,19 +939,41 @@ $player <playername> -- returns the statistics of a player
     def is_running(self) -> bool:
         return self._running
 
+    def startup_times(self) -> dict:
+        """
+        Seconds from process start to each startup phase reached so far:
+        imports (modules loaded), run (bot constructed, connecting), connected (first on_ready).
+        """
+        return {phase: at - PROCESS_START for phase, at in self._started.items()}
+
+    def message_stats(self) -> dict:
+        """
+        Outgoing queue depth and send latency, per channel.
+        """
+        return {channel_id: session.messages.stats() for channel_id, session in list(self._sessions.items())}
+
     def run(self):
         """
         Run the bot. Starts an HTTP server in another thread to listen for input
         from the dashboard.
         """
         try:
+            self._started["run"] = time.monotonic()
+            # Fork the replay workers while this is still the only thread.
+            start_replay_pool()
             start_server(SERVER_PORT)
             self._bot.run(os.environ['TOKEN'])
         except Exception as e:
             print(e)
             print("exiting")
+        finally:
+            # Push anything still pending before the dyno goes away.
+            for _, store in self.stores():
+                store.stop()
 
 BOT_OBJ = DiscordBot()
+# Dashboard files (index.html, lib/*.js, ...), served from memory.
+STATIC_ASSETS = StaticAssets(os.getcwd())
 
 class RequestHandler(SimpleHTTPRequestHandler):
     """
@@ -674,7 +990,30 @@ class RequestHandler(SimpleHTTPRequestHandler):
         (or google since this docs page is kinda bad)
         """
         path = self.path
-        if path.startswith("/api/"):
+        url = urlsplit(path)
+        if url.path == "/api/summary" and BOT_OBJ.research_mode:
+            # ?page=N&per_page=M&format=json|html (no per_page: everything)
+            query = parse_qs(url.query)
+            try:
+                page = int(query.get('page', ['0'])[0])
+                per_page = int(query['per_page'][0]) if 'per_page' in query else None
+            except ValueError:
+                self.send_error(400)
+                return
+            fmt = query.get('format', ['html'])[0]
+            send_cached(self, BOT_OBJ.summary.page(page, per_page, fmt))
+        elif url.path == "/api/metrics":
+            body = metrics.REGISTRY.render()
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == "/api/game" or url.path.startswith("/api/game/"):
+            self.serve_game(url.path[len("/api/game"):].strip('/'))
+        elif url.path.startswith("/api/stats/"):
+            self.serve_stats(url.path[len("/api/stats/"):].strip('/'), parse_qs(url.query))
+        elif path.startswith("/api/"):
             self.send_response(200)
             self.send_header('Content-type','text/html')
             self.end_headers()
@@ -690,24 +1029,113 @@ class RequestHandler(SimpleHTTPRequestHandler):
                 BOT_OBJ.pause()
             elif path == "status":
                 message = "Running status: " + str(BOT_OBJ.is_running())
-            elif path == "summary" and BOT_OBJ.research_mode:
-                entries = []
-                for entry in BOT_OBJ.build_data["builds"].values():
-                    build = entry["build"]
-                    val = '['+', '.join(item['name'] for item in build['equips'][:-1])+']' + str(build['sp']) + ' + ' + entry['add']['name'] + ' >> '
-                    val += ', '.join(e[0] for e in entry['pops']) + f" ({entry['id']})"
-                    entries.append(val)
-                message = '<br>'.join(sorted(entries))
+                message += "<br>Messages: " + json.dumps(BOT_OBJ.message_stats())
+                message += "<br>Startup (s): " + json.dumps({k: round(v, 2) for k, v in BOT_OBJ.startup_times().items()})
             else:
                 message = "/api/help"
             self.wfile.write(bytes(message, "utf8"))
 
         else:
-            # IS THIS SECURE? TODO
-            for suffix in [".html", ".js", ".css", ".txt"]:
-                if path.endswith(suffix):
-                    return super().do_GET()
-            self.send_error(403)
+            response = STATIC_ASSETS.get(url.path)
+            if response is None:
+                self.send_error(404 if STATIC_ASSETS.resolve(url.path) else 403)
+                return
+            send_cached(self, response)
+
+    def serve_game(self, path: str):
+        """
+        /api/game                       list of games: [{channel, version, day, alive}]
+        /api/game/<channel>             full state of the latest turn
+        /api/game/<channel>/players     alive and dead players
+        /api/game/<channel>/teams       teams and their locations
+        /api/game/<channel>/map         latest map image
+        /api/game/<channel>/events      server-sent event stream of turn results (event, death, map, ...)
+        Served from immutable snapshots published after each turn.
+        """
+        if path == "":
+            games = [snapshot.info() for snapshot in (session.snapshot for session in BOT_OBJ.sessions()) if snapshot is not None]
+            send_cached(self, CachedResponse(json.dumps(games).encode('utf8'), 'application/json'))
+            return
+        parts = path.split('/')
+        try:
+            channel_id = int(parts[0])
+        except ValueError:
+            self.send_error(404)
+            return
+        view = parts[1] if len(parts) > 1 else "state"
+        if view == "events" and len(parts) == 2:
+            session = BOT_OBJ.get_session_by_id(channel_id)
+            if session is None:
+                self.send_error(404)
+                return
+            serve_stream(self, session.stream)
+            return
+        snapshot = BOT_OBJ.game_snapshot(channel_id)
+        if snapshot is None or len(parts) > 2 or view not in snapshot.responses:
+            self.send_error(404)
+            return
+        send_cached(self, snapshot.responses[view])
+
+    def serve_stats(self, path: str, query: dict):
+        """
+        /api/stats/<guild>?by=wins|kills|placement&limit=N     leaderboard
+        /api/stats/<guild>/<player id or name>                 one player's stats
+        Read from the stats aggregates (see stats.py).
+        """
+        parts = path.split('/')
+        if len(parts) == 1:
+            by = query.get('by', ['wins'])[0]
+            try:
+                limit = max(1, min(int(query.get('limit', ['10'])[0]), 100))
+            except ValueError:
+                limit = None
+            if by not in LEADERBOARDS or limit is None:
+                self.send_error(400)
+                return
+            body = {"guild": parts[0], "by": by, "players": BOT_OBJ._stats.leaderboard(parts[0], by, limit)}
+        elif len(parts) == 2:
+            body = BOT_OBJ._stats.player(parts[0], unquote(parts[1]))
+            if body is None:
+                self.send_error(404)
+                return
+        else:
+            self.send_error(404)
+            return
+        send_cached(self, CachedResponse(json.dumps(body).encode('utf8'), 'application/json'))
+
+    def do_POST(self):
+        """
+        Handle an HTTP POST request.
+        /api/decode: body is wynnbuilder urls (one per line), returns the decoded builds as json.
+            At most DECODE_MAX_BYTES of body and DECODE_MAX_URLS urls per request.
+        """
+        if self.path != "/api/decode":
+            self.send_error(404)
+            return
+        # The body is not read on errors, so don't reuse the connection.
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.close_connection = True
+            self.send_error(400, "Bad Content-Length")
+            return
+        if length > DECODE_MAX_BYTES:
+            self.close_connection = True
+            self.send_error(413, f"Body larger than {DECODE_MAX_BYTES} bytes")
+            return
+        urls = [url for url in self.rfile.read(length).decode('utf8', 'replace').splitlines() if url.strip()]
+        if len(urls) > DECODE_MAX_URLS:
+            self.send_error(413, f"More than {DECODE_MAX_URLS} urls")
+            return
+        decoded = decode_builds(urls, BOT_OBJ._items)
+        body = json.dumps([{"url": url, "build": build, "error": error} for url, build, error in decoded]).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
 def start_server(port: int):
     """
@@ -0,0 +1,375 @@
+"""
+Per-channel game sessions.
+
+Each bound channel gets its own ChannelSession: its own GameState, game lock,
+outgoing message queue and pause state. World/event data are shared between
+sessions (read only), and turn simulation/rendering runs in a shared worker
+pool so games in different channels don't serialize behind each other.
+"""
+from __future__ import annotations
+
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from PIL import Image, ImageDraw
+
+from game.game_state import GameState
+from draw import NORMAL_FONT, break_text, render_text
+from dispatch import MessageDispatcher
+from encode import EncodedImage, encode_image, predict_bytes
+from snapshots import GameSnapshot
+from replay import Replay, ReplayDay
+from stream import EventStream
+from metrics import histogram
+from profiling import profile
+
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', 4))
+# Shared by all sessions: game setup (avatar downloads), turns and rendering.
+RENDER_POOL = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+# Games with more players than this run in large-roster mode: no avatars, and only
+# events with deaths are posted to discord (the dashboard stream still gets everything).
+LARGE_ROSTER = int(os.environ.get('LARGE_ROSTER', 200))
+# Days simulated ahead of $next by the pre-simulation thread (0: simulate on demand).
+PRESIM_DAYS = int(os.environ.get('PRESIM_DAYS', 3))
+
+# Event cards are packed into as few images as fit under both limits (see pack_cards).
+EVENT_IMAGE_MAX_HEIGHT = int(os.environ.get('EVENT_IMAGE_MAX_HEIGHT', 1000))
+EVENT_IMAGE_MAX_BYTES = int(os.environ.get('EVENT_IMAGE_MAX_BYTES', 1024 * 1024))
+EVENT_CARD_WIDTH = 500
+EVENT_AVATAR_SIZE = 64
+
+TURN_SECONDS = histogram("atlas_turn_seconds", "GameState.turn duration (including event card rendering)")
+RENDER_SECONDS = histogram("atlas_render_seconds", "Image render time", ["image"])
+
+def pack_cards(heights: list, max_height: int = EVENT_IMAGE_MAX_HEIGHT, max_bytes: int = EVENT_IMAGE_MAX_BYTES) -> list:
+    """
+    Split event cards (pixel heights, in order) into images: each image takes as many of the
+    next cards as fit under max_height and under max_bytes of predicted encoded size (from
+    recent "events" encodes, see encode.predict_bytes). Height and size only grow with each
+    added card, so filling each image greedily gives the fewest images. A card over the limits gets an image of its own.
+    Return: list of ranges of card indices
+    """
+    batches = []
+    start = 0
+    height = 0
+    for i, card_height in enumerate(heights):
+        if i > start:
+            predicted = predict_bytes("events", (EVENT_CARD_WIDTH, height + card_height))
+            if height + card_height > max_height or (predicted is not None and predicted > max_bytes):
+                batches.append(range(start, i))
+                start = i
+                height = 0
+        height += card_height
+    if start < len(heights):
+        batches.append(range(start, len(heights)))
+    return batches
+
+class DayResult:
+    """
+    Output of one simulated day, held until it is published.
+    """
+    __slots__ = ("messages", "events", "snapshot", "alive", "replay")
+
+    def __init__(self):
+        self.messages = []                  # str / Image / EncodedImage, in order
+        self.events = []                    # (stream event, data)
+        self.snapshot: GameSnapshot = None  # State after this day
+        self.alive = 0                      # Players alive after this day
+        self.replay: ReplayDay = None       # Team positions after this day
+
+class ChannelSession:
+    """
+    Game state and message queue for one channel.
+
+    With PRESIM_DAYS > 0, a background thread simulates and renders upcoming days
+    into a bounded look-ahead buffer as soon as the game is created, and `$next`
+    just publishes the next ready day. The game is fully determined by its seed, so
+    this gives the same days as simulating on demand. While the worker runs it owns
+    `game`; commands must go through next_day() and the published snapshot.
+    """
+    def __init__(self, channel, is_active=lambda: True):
+        """
+        channel:    discord channel this session is bound to
+        is_active:  callable, outgoing messages are held while it returns False
+        """
+        self.channel = channel
+        self.game: GameState = None
+        self.game_lock = Lock()
+        self.messages = MessageDispatcher(channel, is_active)
+        self.snapshot: GameSnapshot = None      # Latest published snapshot (immutable, swapped on publish)
+        self._versions = itertools.count(1)     # Snapshot versions
+        self.stream = EventStream()             # Live turn results for /api/game/<channel>/events
+        self._local = threading.local()         # .day: DayResult being simulated on this thread
+        self.auto_running = False               # $auto in progress
+        self.auto_stop = False                  # Set by `$auto stop`
+        # Look-ahead buffer, filled by the pre-simulation thread.
+        self._lookahead = deque()
+        self._lookahead_cond = threading.Condition()
+        self._generation = 0                    # Bumped on new/end game; stale workers exit
+        self._presim_thread: threading.Thread = None
+        self._presim_error: Exception = None
+        self.large_roster = False               # Current game has more than LARGE_ROSTER players
+        self.replay: Replay = None              # Published days of the current (or last) game, for $replay
+        self.player_ids = dict()                # Map (player name, registry player id) of the current game
+
+    def queue_message(self, content) -> bool:
+        self.messages.queue_message(content)
+        return True
+
+    def _game_output(self, content) -> bool:
+        """
+        Output function for the GameState: buffered into the day being simulated, if any.
+        """
+        day = getattr(self._local, "day", None)
+        if day is not None:
+            day.messages.append(content)
+            return True
+        return self.queue_message(content)
+
+    def _publish_event(self, event: str, data: dict):
+        day = getattr(self._local, "day", None)
+        if day is not None:
+            day.events.append((event, data))
+        else:
+            self.stream.publish(event, data)
+
+    def new_game(self, world_data: dict, player_data: dict, event_data: dict, bot=None, seed: int = None,
+                 presim_days: int = None):
+        """
+        Create a new game for this channel and start pre-simulating it.
+        Blocking (downloads avatars), run in RENDER_POOL. Caller must hold game_lock.
+        presim_days: look-ahead buffer size (default PRESIM_DAYS, 0: simulate on demand)
+        """
+        self._cancel_presim()
+        n_players = sum(1 for data in player_data.values() if data.get('active', True))
+        self.large_roster = n_players > LARGE_ROSTER
+        # Large games skip avatar downloads and event cards (see print_events).
+        game = GameState(world_data, player_data, event_data, self._game_output, seed=seed, bot=bot,
+                         avatars=not self.large_roster)
+        game.set_event_printer(self.print_events)
+        self.game = game
+        self.player_ids = {data['name']: player_id for player_id, data in player_data.items()}
+        state = self.publish_snapshot()
+        self.replay = Replay()
+        self.replay.append(ReplayDay.capture(game))
+        self.stream.publish("newgame", {"day": state["day"], "alive": len(state["alive"]), "version": self.snapshot.version})
+        if presim_days is None:
+            presim_days = PRESIM_DAYS
+        if presim_days > 0:
+            self._start_presim(game, presim_days)
+
+    def end_game(self):
+        """
+        Drop the current game. Caller must hold game_lock.
+        """
+        self._cancel_presim()
+        if self.game is not None:
+            self.stream.publish("endgame", {"day": self.snapshot.day if self.snapshot else 0})
+        self.game = None
+        self.messages.resume()
+
+    def alive_players(self) -> int:
+        """
+        Players alive as of the last published day (the game itself may be simulated ahead).
+        """
+        return self.snapshot.alive if self.snapshot is not None else 0
+
+    def simulate_day(self, game: GameState = None) -> DayResult:
+        """
+        Simulate and render one day without publishing anything. Blocking, run in RENDER_POOL.
+        Caller must hold game_lock (or be the pre-simulation thread that owns the game).
+        """
+        if game is None:
+            game = self.game
+        print(f'Starting turn ({self.channel.id})')
+        day = DayResult()
+        self._local.day = day
+        try:
+            n_dead = game.get_num_dead_players()
+            with TURN_SECONDS.time(), profile("turn"):
+                game.turn()
+            day.alive = game.get_num_alive_players()
+            day.replay = ReplayDay.capture(game)
+            day.messages.append(f"Alive: {day.alive}, Dead: {game.get_num_dead_players()}")
+            # Encode the map once here; the same bytes go to discord and /api/game/<channel>/map.
+            with profile("render_map"):
+                with RENDER_SECONDS.labels("map").time():
+                    map_image = game.print_map()
+                game_map = encode_image(map_image, "map")
+            day.messages.append(game_map)
+            state = game.snapshot()
+            version = next(self._versions)
+            day.snapshot = GameSnapshot(self.channel.id, version, state, game_map)
+            for player in state["dead"][n_dead:]:
+                day.events.append(("death", dict(player, day=state["day"])))
+            day.events.append(("map", {"day": state["day"], "version": version,
+                                       "url": f"/api/game/{self.channel.id}/map"}))
+        finally:
+            self._local.day = None
+        return day
+
+    def next_day(self) -> DayResult:
+        """
+        Next unpublished day: from the look-ahead buffer if pre-simulating (waits for it
+        if it isn't ready yet), otherwise simulated now. Blocking, run in RENDER_POOL.
+        Caller must hold game_lock.
+        """
+        with self._lookahead_cond:
+            if self._presim_thread is None:
+                day = None
+            else:
+                while not self._lookahead and self._presim_error is None and self._presim_thread.is_alive():
+                    self._lookahead_cond.wait(1)
+                if self._presim_error is not None:
+                    raise self._presim_error
+                day = self._lookahead.popleft() if self._lookahead else None
+                self._lookahead_cond.notify_all()
+        if day is None:
+            day = self.simulate_day()
+        return day
+
+    def publish_day(self, day: DayResult, prompt: bool = True):
+        """
+        Queue a simulated day's messages and publish its snapshot and stream events.
+        prompt: end with the "type $next" message
+        """
+        for content in day.messages:
+            self.queue_message(content)
+        self.snapshot = day.snapshot
+        if self.replay is not None:
+            self.replay.append(day.replay)
+        for event, data in day.events:
+            self.stream.publish(event, data)
+        if prompt:
+            self.prompt_next()
+
+    def prompt_next(self):
+        self.queue_message(
+            "Day concluded --- type `$next` or react ⏭️ to continue")
+
+    def play_turn(self):
+        """
+        Publish the next day. Blocking, run in RENDER_POOL.
+        Caller must hold game_lock.
+        """
+        self.publish_day(self.next_day())
+
+    def _start_presim(self, game: GameState, buffer_days: int):
+        with self._lookahead_cond:
+            generation = self._generation
+            self._presim_error = None
+            self._presim_thread = threading.Thread(target=self._presimulate, args=(game, generation, buffer_days),
+                                                   name=f"presim-{self.channel.id}", daemon=True)
+        self._presim_thread.start()
+
+    def _cancel_presim(self):
+        """
+        Stop the pre-simulation thread (it exits after its current day) and drop buffered days.
+        """
+        with self._lookahead_cond:
+            self._generation += 1
+            self._lookahead.clear()
+            self._presim_thread = None
+            self._presim_error = None
+            self._lookahead_cond.notify_all()
+
+    def _presimulate(self, game: GameState, generation: int, buffer_days: int):
+        """
+        Pre-simulation thread: keep up to `buffer_days` days ready until the game ends or is replaced.
+        """
+        alive = game.get_num_alive_players()
+        while alive > 1:
+            with self._lookahead_cond:
+                while generation == self._generation and len(self._lookahead) >= buffer_days:
+                    self._lookahead_cond.wait()
+                if generation != self._generation:
+                    return
+            try:
+                day = self.simulate_day(game)
+            except Exception as e:
+                print(f"Pre-simulation failed ({self.channel.id}): {e}")
+                with self._lookahead_cond:
+                    if generation == self._generation:
+                        self._presim_error = e
+                        self._lookahead_cond.notify_all()
+                return
+            with self._lookahead_cond:
+                if generation != self._generation:
+                    return
+                self._lookahead.append(day)
+                self._lookahead_cond.notify_all()
+            alive = day.alive
+
+    def lookahead_depth(self) -> int:
+        return len(self._lookahead)
+
+    def publish_snapshot(self, game_map: EncodedImage = None) -> dict:
+        """
+        Publish an immutable snapshot of the current game state. Caller must hold game_lock.
+        Return: the GameState.snapshot() it was built from
+        """
+        state = self.game.snapshot()
+        self.snapshot = GameSnapshot(self.channel.id, next(self._versions), state, game_map)
+        return state
+
+    def print_events(self, this: GameState, event_data):
+        """
+        Event printer: renders events as cards with player avatars, packed into images by pack_cards.
+        Also pushes each event to the live stream before rendering starts.
+        In large-roster mode only events with deaths are posted, as text.
+        """
+        day = this.get_day()
+        for event, event_type, players in event_data:
+            names = [p.name for p in players]
+            self._publish_event("event", {"day": day, "type": event_type, "players": names,
+                                          "text": event['text'].format(*names)})
+
+        if self.large_roster:
+            deadly = [(event, players) for event, event_type, players in event_data if event['deaths']]
+            self._game_output(f"{len(event_data)} events today, {len(deadly)} of them deadly:")
+            for event, players in deadly:
+                self._game_output(event['text'].format(*(f"**{p.name}**" for p in players)))
+            return
+
+        ascent, descent = NORMAL_FONT.normal.getmetrics()
+        line_height = ascent + descent
+        dummy_image = Image.new(mode='RGBA', size=(1000, 50), color=(54, 57, 63))
+        dummy_draw = ImageDraw.Draw(dummy_image)
+        # Tuple(height, images, text)
+        cards = []
+        for event, event_type, players in event_data:
+            imagelist = [p.get_active_image() for p in players]
+            event_raw_text, n_lines = break_text(event['text'].format(*(f"\\*{p.name}\\*" for p in players)), dummy_draw, NORMAL_FONT, EVENT_CARD_WIDTH)
+            cards.append((round(EVENT_AVATAR_SIZE*1.25) + 5 + line_height*n_lines, imagelist, event_raw_text))
+
+        for batch in pack_cards([height for height, _, _ in cards]):
+            self._output_cards(cards[batch.start:batch.stop])
+
+    def _output_cards(self, cards: list):
+        """
+        Render event cards into one image and output it, encoded (in the render worker, so the
+        dispatcher only uploads). Split in two if it came out over EVENT_IMAGE_MAX_BYTES.
+        """
+        render_start = time.perf_counter()
+        result = Image.new(mode='RGBA', size=(EVENT_CARD_WIDTH, sum(height for height, _, _ in cards)), color=(54, 57, 63))
+        d = ImageDraw.Draw(result)
+        y = 0
+        for height, images, text in cards:
+            text_start_y = y + round(EVENT_AVATAR_SIZE * 1.25) + 5
+            render_text(text, result, d, NORMAL_FONT, (0, text_start_y), (255,255,255))
+            for i, image  in enumerate(images):
+                result.paste(im=image, box=(int(i*EVENT_AVATAR_SIZE*1.25) + EVENT_AVATAR_SIZE//4, y+EVENT_AVATAR_SIZE // 4), mask=image.convert('RGBA'))
+            y += height
+        RENDER_SECONDS.labels("events").observe(time.perf_counter() - render_start)
+        encoded = encode_image(result, "events")
+        if encoded.nbytes > EVENT_IMAGE_MAX_BYTES and len(cards) > 1:
+            # The size prediction was off (it adapts); pack_cards uses the new sample from now on.
+            self._output_cards(cards[:len(cards)//2])
+            self._output_cards(cards[len(cards)//2:])
+            return
+        self._game_output(encoded)
@@ -0,0 +1,73 @@
+"""
+Immutable per-turn game snapshots for the /api/game endpoints.
+
+A snapshot is published once after each turn (from the render worker that ran
+the turn). All response bodies are serialized and gzipped at publish time, so
+serving a request never touches the game lock or the live GameState.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+
+from encode import EncodedImage
+from webcache import CachedResponse
+
+# Versions restart at 1 with each process; keep etags from colliding across restarts.
+_ETAG_PREFIX = os.urandom(4).hex()
+
+class GameSnapshot:
+    """
+    Pre-serialized view of one game at one version (turn).
+    """
+    def __init__(self, channel_id: int, version: int, state: dict, game_map: EncodedImage = None):
+        """
+        channel_id: channel the game runs in
+        version:    increases by one every publish (per channel)
+        state:      GameState.snapshot()
+        game_map:   encoded map image for this turn, if rendered
+        """
+        self.channel_id = channel_id
+        self.version = version
+        self.day = state["day"]
+        self.alive = len(state["alive"])
+        self.published = time.time()
+        # Map (player name, (alive, entry from state)), for $player.
+        self._players = {p["name"]: (True, p) for p in state["alive"]}
+        self._players.update((p["name"], (False, p)) for p in state["dead"])
+        self._team_names = {team["id"]: team["name"] for team in state["teams"]}
+        header = {"channel": str(channel_id), "version": version, "day": self.day}
+
+        def response(name: str, body: dict) -> CachedResponse:
+            data = dict(header)
+            data.update(body)
+            return CachedResponse(json.dumps(data).encode('utf8'), 'application/json',
+                                  f"{_ETAG_PREFIX}-{channel_id}-{version}-{name}", gzip_level=9)
+
+        self.responses = {
+            "state": response("state", state),
+            "players": response("players", {"alive": state["alive"], "dead": state["dead"]}),
+            "teams": response("teams", {"teams": state["teams"]}),
+        }
+        if game_map is not None:
+            content_type = "image/" + game_map.filename.rsplit('.', 1)[-1]
+            self.responses["map"] = CachedResponse(game_map.data, content_type,
+                                                   f"{_ETAG_PREFIX}-{channel_id}-{version}-map", gzip_level=None)
+
+    def info(self) -> dict:
+        return {"channel": str(self.channel_id), "version": self.version, "day": self.day, "alive": self.alive}
+
+    def player_info(self, name: str) -> str:
+        """
+        $player text (as Player.pretty_info) for a player as of this snapshot.
+        """
+        entry = self._players.get(name, None)
+        if entry is None:
+            return "No such player!"
+        alive, player = entry
+        team = self._team_names.get(player["team"], "") if alive else ""
+        info = f"Player name={name} [{team}]:\nKills: {player['kills']}\nLocation: {player['location']}\nAlive: {alive}"
+        if alive:
+            return info
+        return info + f"\nDeath: [{player['death']}]"
@@ -0,0 +1,231 @@
+"""
+Cross-game player statistics backed by sqlite.
+
+Each finished game is appended once (games + per-player results rows), and the
+per-player aggregates are updated in the same transaction: games, wins, placement
+sum/average, kills, deaths and nemesis (the player who killed them most often,
+kept up to date from the kill_pairs counts). $leaderboard, $stats and /api/stats
+read only the aggregates, through indexes, so they don't depend on how many
+games have been played.
+
+Like the player registry, the aggregates (not the per-game history) are exported
+to the guild's branch of the git store as stats.json and imported when that
+branch is checked out. The export names its guild, and importing it into
+another guild is refused.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Mapping
+
+STATS_PATH = os.environ.get('STATS_PATH', "atlas-games_stats.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id     INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id    TEXT NOT NULL,
+    finished_at REAL NOT NULL,
+    seed        INTEGER,
+    days        INTEGER NOT NULL,
+    players     INTEGER NOT NULL,
+    winner_id   TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    game_id     INTEGER NOT NULL,
+    player_id   TEXT NOT NULL,
+    placement   INTEGER NOT NULL,
+    kills       INTEGER NOT NULL,
+    death_day   INTEGER,
+    death       TEXT,
+    PRIMARY KEY (game_id, player_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS player_stats (
+    guild_id        TEXT NOT NULL,
+    player_id       TEXT NOT NULL,
+    name            TEXT NOT NULL,
+    games           INTEGER NOT NULL DEFAULT 0,
+    wins            INTEGER NOT NULL DEFAULT 0,
+    placement_sum   INTEGER NOT NULL DEFAULT 0,
+    avg_placement   REAL NOT NULL DEFAULT 0,
+    best_placement  INTEGER,
+    kills           INTEGER NOT NULL DEFAULT 0,
+    deaths          INTEGER NOT NULL DEFAULT 0,
+    nemesis_id      TEXT,
+    nemesis_kills   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, player_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kill_pairs (
+    guild_id    TEXT NOT NULL,
+    victim_id   TEXT NOT NULL,
+    killer_id   TEXT NOT NULL,
+    kills       INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, victim_id, killer_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS player_stats_wins ON player_stats (guild_id, wins DESC, kills DESC);
+CREATE INDEX IF NOT EXISTS player_stats_kills ON player_stats (guild_id, kills DESC, wins DESC);
+CREATE INDEX IF NOT EXISTS player_stats_placement ON player_stats (guild_id, avg_placement, games DESC);
+CREATE INDEX IF NOT EXISTS player_stats_name ON player_stats (guild_id, name);
+"""
+
+_ADD_RESULT = """
+INSERT INTO player_stats (guild_id, player_id, name, games, wins, placement_sum, avg_placement, best_placement, kills, deaths)
+VALUES (?1, ?2, ?3, 1, ?4, ?5, ?5, ?5, ?6, ?7)
+ON CONFLICT (guild_id, player_id) DO UPDATE SET
+    name=excluded.name,
+    games=games + 1,
+    wins=wins + excluded.wins,
+    placement_sum=placement_sum + excluded.placement_sum,
+    avg_placement=CAST(placement_sum + excluded.placement_sum AS REAL) / (games + 1),
+    best_placement=MIN(IFNULL(best_placement, excluded.best_placement), excluded.best_placement),
+    kills=kills + excluded.kills,
+    deaths=deaths + excluded.deaths
+"""
+
+_ADD_KILL = """
+INSERT INTO kill_pairs (guild_id, victim_id, killer_id, kills) VALUES (?, ?, ?, ?)
+ON CONFLICT (guild_id, victim_id, killer_id) DO UPDATE SET kills=kills + excluded.kills
+"""
+
+_STATS_COLUMNS = ("player_id", "name", "games", "wins", "avg_placement", "best_placement", "kills", "deaths")
+
+# $leaderboard orderings (each one has an index).
+LEADERBOARDS = {
+    "wins": "wins DESC, kills DESC",
+    "kills": "kills DESC, wins DESC",
+    "placement": "avg_placement, games DESC",
+}
+
+class GameStats:
+    """
+    Thread safe stats store. Each thread gets its own sqlite connection.
+    """
+    def __init__(self, path: str = STATS_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(_SCHEMA)
+            conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record_game(self, guild_id, standings: List[dict], player_ids: Mapping[str, str], seed: int = None,
+                    days: int = 0) -> int:
+        """
+        Append a finished game and update the aggregates, in one transaction.
+        standings:  GameState.results()
+        player_ids: map (player name, registry player id); players without an id are skipped
+        Return: the new game id
+        """
+        guild_id = str(guild_id)
+        standings = [result for result in standings if result["name"] in player_ids]
+        winner = player_ids[standings[0]["name"]] if standings and standings[0]["placement"] == 1 else None
+        # Kills per (victim, killer) in this game.
+        pairs = dict()
+        for result in standings:
+            victim = player_ids[result["name"]]
+            for killer in result["killers"]:
+                if killer in player_ids:
+                    key = (victim, player_ids[killer])
+                    pairs[key] = pairs.get(key, 0) + 1
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                game_id = conn.execute(
+                    "INSERT INTO games (guild_id, finished_at, seed, days, players, winner_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    (guild_id, time.time(), seed, days, len(standings), winner)).lastrowid
+                conn.executemany("INSERT INTO results (game_id, player_id, placement, kills, death_day, death) VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(game_id, player_ids[r["name"]], r["placement"], r["kills"], r["day"], r["death"] or None)
+                                  for r in standings])
+                conn.executemany(_ADD_RESULT,
+                                 [(guild_id, player_ids[r["name"]], r["name"], int(r["placement"] == 1), r["placement"],
+                                   r["kills"], int(r["day"] is not None)) for r in standings])
+                self._add_kills(conn, guild_id, pairs)
+        return game_id
+
+    def _add_kills(self, conn: sqlite3.Connection, guild_id: str, pairs: Mapping[tuple, int]):
+        """
+        Add (victim, killer) kill counts and move nemeses where a killer overtook the current one.
+        """
+        conn.executemany(_ADD_KILL, [(guild_id, victim, killer, n) for (victim, killer), n in pairs.items()])
+        for victim, killer in pairs:
+            kills = conn.execute("SELECT kills FROM kill_pairs WHERE guild_id=? AND victim_id=? AND killer_id=?",
+                                 (guild_id, victim, killer)).fetchone()[0]
+            conn.execute("UPDATE player_stats SET nemesis_id=?, nemesis_kills=? WHERE guild_id=? AND player_id=? AND nemesis_kills < ?",
+                         (killer, kills, guild_id, victim, kills))
+
+    def leaderboard(self, guild_id, by: str = "wins", limit: int = 10) -> List[dict]:
+        """
+        Top players of a guild. by: a LEADERBOARDS key (raises KeyError otherwise).
+        """
+        rows = self._conn().execute(
+            f"SELECT {', '.join(_STATS_COLUMNS)} FROM player_stats WHERE guild_id=? ORDER BY {LEADERBOARDS[by]} LIMIT ?",
+            (str(guild_id), limit))
+        return [dict(zip(_STATS_COLUMNS, row)) for row in rows]
+
+    def player(self, guild_id, player: str) -> dict:
+        """
+        One player's aggregates (by player id or name) with their nemesis, or None.
+        """
+        conn = self._conn()
+        columns = ", ".join(f"s.{column}" for column in _STATS_COLUMNS)
+        query = (f"SELECT {columns}, s.nemesis_kills, n.name FROM player_stats s "
+                 "LEFT JOIN player_stats n ON n.guild_id = s.guild_id AND n.player_id = s.nemesis_id "
+                 "WHERE s.guild_id=? AND s.{} = ?")
+        row = conn.execute(query.format("player_id"), (str(guild_id), str(player))).fetchone()
+        if row is None:
+            row = conn.execute(query.format("name"), (str(guild_id), str(player))).fetchone()
+        if row is None:
+            return None
+        stats = dict(zip(_STATS_COLUMNS, row))
+        stats["nemesis"] = {"name": row[-1], "kills": row[-2]} if row[-1] is not None else None
+        return stats
+
+    def game_count(self, guild_id) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM games WHERE guild_id=?", (str(guild_id),)).fetchone()[0]
+
+    def export_json(self, guild_id) -> dict:
+        """
+        A guild's aggregates (stats.json on the guild's branch of the git store).
+        """
+        conn = self._conn()
+        players = dict()
+        for player_id, name, games, wins, placement_sum, best, kills, deaths in conn.execute(
+                "SELECT player_id, name, games, wins, placement_sum, best_placement, kills, deaths "
+                "FROM player_stats WHERE guild_id=?", (str(guild_id),)):
+            players[player_id] = {"name": name, "games": games, "wins": wins, "placement_sum": placement_sum,
+                                  "best_placement": best, "kills": kills, "deaths": deaths}
+        kills = [list(row) for row in conn.execute(
+                    "SELECT victim_id, killer_id, kills FROM kill_pairs WHERE guild_id=?", (str(guild_id),))]
+        return {"guild": str(guild_id), "players": players, "kills": kills}
+
+    def import_json(self, guild_id, data: Mapping):
+        """
+        Replace a guild's aggregates with an export_json() dict, in one transaction.
+        Raises ValueError (and changes nothing) if the dict was exported from another guild.
+        """
+        guild_id = str(guild_id)
+        if data.get("guild", guild_id) != guild_id:
+            raise ValueError(f"stats.json is for guild {data['guild']}, not {guild_id}")
+        rows = [(guild_id, player_id, p["name"], p["games"], p["wins"], p["placement_sum"],
+                 p["placement_sum"] / p["games"] if p["games"] else 0, p["best_placement"], p["kills"], p["deaths"])
+                for player_id, p in data.get("players", {}).items()]
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.execute("DELETE FROM player_stats WHERE guild_id=?", (guild_id,))
+                conn.execute("DELETE FROM kill_pairs WHERE guild_id=?", (guild_id,))
+                conn.executemany("INSERT INTO player_stats (guild_id, player_id, name, games, wins, placement_sum, "
+                                 "avg_placement, best_placement, kills, deaths) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._add_kills(conn, guild_id, {(victim, killer): n for victim, killer, n in data.get("kills", [])})
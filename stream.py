@@ -0,0 +1,138 @@
+"""
+Server-sent event streams for the web dashboard.
+
+Each game channel has one EventStream. Publishing encodes the SSE frame once,
+appends it to a bounded history (for Last-Event-ID reconnects) and pushes it
+to every connected client's bounded buffer; it never waits on a client.
+A client that falls too far behind is disconnected and replays from the
+history when the browser reconnects.
+"""
+from __future__ import annotations
+
+import json
+import time
+from collections import deque
+from threading import Condition, Lock
+from typing import List
+
+STREAM_HISTORY = 512        # frames kept for reconnects
+CLIENT_BUFFER = 256         # frames buffered per client before it is dropped
+KEEPALIVE_SECONDS = 15.0
+
+class StreamClient:
+    """
+    One connected client. Frames are pushed by the publisher and pulled by the
+    client's http thread.
+    """
+    def __init__(self, backlog: List[bytes], max_buffer: int = CLIENT_BUFFER):
+        self._cond = Condition()
+        self._frames = deque(backlog)
+        self._max_buffer = max(max_buffer, len(backlog))
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, frame: bytes):
+        with self._cond:
+            if len(self._frames) >= self._max_buffer:
+                self.overflowed = True
+            else:
+                self._frames.append(frame)
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify()
+
+    def pull(self, timeout: float) -> List[bytes]:
+        """
+        Wait for frames. Returns [] on timeout.
+        """
+        with self._cond:
+            if not self._frames and not self.closed and not self.overflowed:
+                self._cond.wait(timeout)
+            frames = list(self._frames)
+            self._frames.clear()
+            return frames
+
+class EventStream:
+    """
+    Fan-out of server-sent events to any number of clients. Thread safe.
+    """
+    def __init__(self, history: int = STREAM_HISTORY, client_buffer: int = CLIENT_BUFFER):
+        self._lock = Lock()
+        self._history = deque(maxlen=history)   # (id, frame)
+        self._clients = set()
+        self._client_buffer = client_buffer
+        self._next_id = 1
+        # Event ids restart with the process; the stream id lets clients notice.
+        self.stream_id = f"{int(time.time())}"
+
+    def publish(self, event: str, data: dict) -> int:
+        """
+        Publish one event to every client. Never blocks on clients.
+        """
+        payload = json.dumps(data)
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            frame = f"id: {self.stream_id}-{event_id}\nevent: {event}\ndata: {payload}\n\n".encode('utf8')
+            self._history.append((event_id, frame))
+            clients = list(self._clients)
+        for client in clients:
+            client.push(frame)
+        return event_id
+
+    def subscribe(self, last_event_id: str = None) -> StreamClient:
+        """
+        Connect a client. If `last_event_id` is from this stream, replay everything after it
+        that is still in the history.
+        """
+        with self._lock:
+            backlog = []
+            if last_event_id:
+                stream_id, _, last = last_event_id.rpartition('-')
+                if stream_id == self.stream_id and last.isdigit():
+                    backlog = [frame for event_id, frame in self._history if event_id > int(last)]
+            client = StreamClient(backlog, self._client_buffer)
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client: StreamClient):
+        with self._lock:
+            self._clients.discard(client)
+
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients)
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+def serve_stream(handler, stream: EventStream):
+    """
+    Serve an event stream on an http request (blocks the handler thread until the client goes away).
+    """
+    client = stream.subscribe(handler.headers.get('Last-Event-ID', None))
+    try:
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('X-Accel-Buffering', 'no')
+        handler.end_headers()
+        handler.wfile.write(b"retry: 3000\n\n")
+        handler.wfile.flush()
+        while not client.closed and not client.overflowed:
+            frames = client.pull(KEEPALIVE_SECONDS)
+            if frames:
+                handler.wfile.write(b''.join(frames))
+            else:
+                handler.wfile.write(b": keepalive\n\n")
+            handler.wfile.flush()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        stream.unsubscribe(client)
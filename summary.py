@@ -0,0 +1,142 @@
+"""
+Research build summary, maintained incrementally.
+
+/api/summary used to rebuild and sort every build line on each request, from
+the http thread, while the bot thread mutated build_data. Now the bot thread
+updates the summary on $save/$delete/$importbuilds and readers only ever see
+immutable snapshots (one per version). Rendered pages are cached per version,
+so refreshes when nothing changed cost a dict lookup (or a 304).
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Mapping, Tuple
+
+from webcache import CachedResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+_PAGE_CACHE_SIZE = 32
+
+def summary_line(entry: dict) -> str:
+    """
+    One line of the summary for a build entry.
+    """
+    build = entry["build"]
+    val = '['+', '.join(item['name'] for item in build['equips'][:-1])+']' + str(build['sp']) + ' + ' + ('null' if entry['add'] is None else entry['add']['name']) + ' >> '
+    val += ', '.join(e[0] for e in entry['pops']) + f" ({entry['id']})"
+    return val
+
+class SummarySnapshot:
+    """
+    Immutable view of the summary at one version.
+    """
+    __slots__ = ("version", "lines")
+
+    def __init__(self, version: int, lines: Tuple[Tuple[str, int]]):
+        self.version = version
+        self.lines = lines      # sorted (line, build id)
+
+class ResearchSummary:
+    """
+    Sorted build summary lines with versioned snapshots. Thread safe.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._lines: Mapping[int, str] = dict()     # Map (build id, line)
+        self._sorted: List[Tuple[str, int]] = []    # sorted (line, build id)
+        self._version = 0
+        self._snapshot = SummarySnapshot(0, ())
+        self._pages = OrderedDict()                 # LRU of rendered pages for the current version
+        # Versions restart at 0 with the process; keep etags from colliding across restarts.
+        self._etag_prefix = os.urandom(4).hex()
+
+    def load(self, build_data: dict):
+        """
+        Rebuild from scratch (build_data in research store format).
+        """
+        with self._lock:
+            self._lines = {entry['id']: summary_line(entry) for entry in build_data["builds"].values()}
+            self._sorted = sorted((line, build_id) for build_id, line in self._lines.items())
+            self._bump()
+
+    def set_entry(self, entry: dict):
+        """
+        Add or replace one build.
+        """
+        line = summary_line(entry)
+        build_id = entry['id']
+        with self._lock:
+            self._remove(build_id)
+            self._lines[build_id] = line
+            bisect.insort(self._sorted, (line, build_id))
+            self._bump()
+
+    def remove(self, build_id: int):
+        with self._lock:
+            if self._remove(build_id):
+                self._bump()
+
+    def _remove(self, build_id: int) -> bool:
+        line = self._lines.pop(build_id, None)
+        if line is None:
+            return False
+        idx = bisect.bisect_left(self._sorted, (line, build_id))
+        del self._sorted[idx]
+        return True
+
+    def _bump(self):
+        self._version += 1
+        # Snapshots are built lazily by the first reader of this version.
+        self._snapshot = None
+        self._pages.clear()
+
+    def snapshot(self) -> SummarySnapshot:
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = SummarySnapshot(self._version, tuple(self._sorted))
+            return self._snapshot
+
+    def page(self, page: int = 0, per_page: int = None, fmt: str = "html") -> CachedResponse:
+        """
+        Rendered page of the summary (cached until the next change).
+        per_page None: everything on one page.
+        """
+        if per_page is not None:
+            per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+        page = max(0, page)
+        key = (page, per_page, fmt)
+        with self._lock:
+            cached = self._pages.get(key, None)
+            if cached is not None:
+                self._pages.move_to_end(key)
+                return cached
+        snapshot = self.snapshot()
+        response = self._render(snapshot, page, per_page, fmt)
+        with self._lock:
+            if snapshot.version == self._version:
+                self._pages[key] = response
+                if len(self._pages) > _PAGE_CACHE_SIZE:
+                    self._pages.popitem(last=False)
+        return response
+
+    def _render(self, snapshot: SummarySnapshot, page: int, per_page: int, fmt: str) -> CachedResponse:
+        if per_page is None:
+            lines = snapshot.lines
+        else:
+            lines = snapshot.lines[page*per_page:(page+1)*per_page]
+        etag = f"{self._etag_prefix}-{snapshot.version}-{page}-{per_page}-{fmt}"
+        if fmt == "json":
+            body = json.dumps({
+                "version": snapshot.version,
+                "total": len(snapshot.lines),
+                "page": page,
+                "per_page": per_page,
+                "builds": [{"id": build_id, "summary": line} for line, build_id in lines],
+            })
+            return CachedResponse(body.encode('utf8'), 'application/json', etag)
+        return CachedResponse('<br>'.join(line for line, _ in lines).encode('utf8'), 'text/html; charset=utf-8', etag)
@@ -0,0 +1,15 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Fonts and game data are loaded relative to the repo root (like the Procfile runs it).
+os.chdir(ROOT)
+# Keep the databases opened by default (eg. when importing server.py) out of the repo.
+_DB_DIR = tempfile.mkdtemp(prefix="atlas-test-")
+atexit.register(shutil.rmtree, _DB_DIR, True)
+os.environ.setdefault("REGISTRY_PATH", os.path.join(_DB_DIR, "players.db"))
+os.environ.setdefault("STATS_PATH", os.path.join(_DB_DIR, "stats.db"))
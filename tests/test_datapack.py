@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from game.datapack import DataPackError, DataPackLoader, compile_datapack, load_datapack
+
+@pytest.fixture
+def data_dir(tmp_path):
+    shutil.copy("game/world_data.json", tmp_path / "world_data.json")
+    shutil.copy("game/event_data.json", tmp_path / "event_data.json")
+    return tmp_path
+
+def paths(data_dir):
+    return str(data_dir / "world_data.json"), str(data_dir / "event_data.json"), str(data_dir / "cache")
+
+def edit_events(data_dir, edit):
+    path = data_dir / "event_data.json"
+    event_data = json.loads(path.read_text())
+    edit(event_data)
+    path.write_text(json.dumps(event_data))
+
+def test_events_are_frozen(data_dir):
+    pack = load_datapack(*paths(data_dir))
+    event = next(iter(pack.events.values()))[0]
+    with pytest.raises(TypeError):
+        event["text"] = "changed"
+    assert isinstance(event["deaths"], tuple)
+
+def test_cache_hit(data_dir, monkeypatch):
+    first = load_datapack(*paths(data_dir))
+    assert len(os.listdir(data_dir / "cache")) == 1
+
+    def no_compile(*args):
+        raise AssertionError("compiled again")
+    monkeypatch.setattr("game.datapack.compile_datapack", no_compile)
+    second = load_datapack(*paths(data_dir))
+    assert second.digest == first.digest
+    assert second.events.keys() == first.events.keys()
+
+def test_cache_invalidated_by_source_change(data_dir):
+    first = load_datapack(*paths(data_dir))
+    edit_events(data_dir, lambda event_data: next(iter(event_data.values()))[0].update(text="{0} changed."))
+    second = load_datapack(*paths(data_dir))
+    assert second.digest != first.digest
+    assert next(iter(second.events.values()))[0]["text"] == "{0} changed."
+    assert len(os.listdir(data_dir / "cache")) == 2
+
+def test_corrupt_cache_is_ignored(data_dir):
+    first = load_datapack(*paths(data_dir))
+    for name in os.listdir(data_dir / "cache"):
+        (data_dir / "cache" / name).write_bytes(b"garbage")
+    assert load_datapack(*paths(data_dir)).digest == first.digest
+
+def test_errors_reported_together():
+    with open("game/world_data.json") as f:
+        world_data = json.load(f)
+    with open("game/event_data.json") as f:
+        event_data = json.load(f)
+    event_type = next(iter(event_data))
+    event_data[event_type][0]["num_players"] = 0
+    del event_data[event_type][1]["deaths"]
+    world_data["starting"].append(99999)
+    with pytest.raises(DataPackError) as e:
+        compile_datapack(world_data, event_data)
+    errors = e.value.errors
+    assert errors[0] == "world: unknown starting node 99999"
+    assert f"events: {event_type}[0]: player index out of range (num_players=0)" in errors
+    assert errors[-1] == f"events: {event_type}[1]: missing deaths"
+
+def test_loader_keeps_pack_on_bad_reload(data_dir):
+    loader = DataPackLoader(*paths(data_dir), check_interval=0)
+    pack = loader.get()
+    assert loader.get() is pack
+    edit_events(data_dir, lambda event_data: next(iter(event_data.values()))[0].pop("text"))
+    assert loader.get() is pack
+    assert isinstance(loader.last_error, DataPackError)
+    shutil.copy("game/event_data.json", data_dir / "event_data.json")
+    os.utime(data_dir / "event_data.json", ns=(1, 1))
+    reloaded = loader.get()
+    assert reloaded.digest == pack.digest
+    assert loader.last_error is None
@@ -0,0 +1,198 @@
+import asyncio
+import time
+
+import discord
+import pytest
+from PIL import Image
+
+import dispatch
+from dispatch import PAUSE_MESSAGE, MessageDispatcher, TokenBucket
+from encode import EncodedImage
+
+class FakeChannel:
+    """
+    Records (content, [attachment filenames]) per send. Sends in `fail` are
+    popped one per send and raised instead.
+    """
+    def __init__(self, fail=()):
+        self.sent = []
+        self.fail = list(fail)
+
+    async def send(self, content=None, file=None, files=None):
+        if self.fail:
+            raise self.fail.pop(0)
+        files = files if files is not None else ([file] if file is not None else [])
+        self.sent.append((content, [f.filename for f in files]))
+
+class Response:
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.reason = "error"
+        self.headers = headers or {}
+
+def rate_limited():
+    return discord.HTTPException(Response(429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.05"}), "slow down")
+
+def server_error():
+    return discord.HTTPException(Response(500), "oops")
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(dispatch, "SEND_RETRY_SECONDS", 0)
+
+def image(name: str = "events", nbytes: int = 10) -> EncodedImage:
+    return EncodedImage(b"x" * nbytes, f"{name}.png", "png-fast", nbytes, 0.0)
+
+def dispatcher(channel, is_active=lambda: True) -> MessageDispatcher:
+    messages = MessageDispatcher(channel, is_active)
+    messages._bucket = TokenBucket(1000, 1)
+    messages.start()
+    return messages
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+def test_token_bucket_limits_bursts():
+    async def main():
+        bucket = TokenBucket(3, 0.3)
+        start = time.monotonic()
+        for _ in range(3):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        await bucket.acquire()
+        return burst, time.monotonic() - start
+    burst, total = run(main())
+    assert burst < 0.05
+    assert total >= 0.09
+
+def test_token_bucket_honours_reset_after():
+    async def main():
+        bucket = TokenBucket(100, 1)
+        bucket.update_from_headers({"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.2"})
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+    assert run(main()) >= 0.19
+
+def test_text_is_batched():
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        for line in ("a", "b", "c"):
+            messages.queue_message(line)
+        await messages.wait_idle()
+    run(main())
+    assert channel.sent == [("a\nb\nc", [])]
+
+def test_pause_after_burst():
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        for i in range(dispatch.PAUSE_AFTER + 3):
+            messages.queue_message(str(i) * (dispatch.TEXT_BATCH_CHARS + 1))
+        await messages.wait_idle()
+        paused = (messages.paused, len(channel.sent))
+        messages.resume()
+        await messages.wait_idle()
+        return paused
+    paused, sent = run(main())
+    assert paused
+    assert sent == dispatch.PAUSE_AFTER + 1
+    assert channel.sent[dispatch.PAUSE_AFTER][0] == PAUSE_MESSAGE
+    assert len(channel.sent) == dispatch.PAUSE_AFTER + 4
+
+def test_rate_limited_send_is_retried():
+    channel = FakeChannel(fail=[rate_limited()])
+    async def main():
+        messages = dispatcher(channel)
+        messages.queue_message(Image.new('RGB', (8, 8)))
+        await messages.wait_idle()
+    run(main())
+    assert [files for _, files in channel.sent] == [["content.png"]]
+
+def test_failed_send_is_retried_then_dropped():
+    channel = FakeChannel(fail=[server_error()] * dispatch.SEND_ATTEMPTS + [server_error()])
+    async def main():
+        messages = dispatcher(channel)
+        messages.queue_message("x" * (dispatch.TEXT_BATCH_CHARS + 1))
+        messages.queue_message("next")
+        await messages.wait_idle()
+        return messages.dropped_count
+    # The first message is dropped, the second goes through on its second attempt.
+    assert run(main()) == 1
+    assert channel.sent == [("next", [])]
+
+def test_encode_failure_does_not_stall_queue(monkeypatch):
+    async def broken(image, name="content"):
+        raise OSError("encoder died")
+    monkeypatch.setattr(dispatch, "encode_async", broken)
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        messages.queue_message(Image.new('RGB', (8, 8)))
+        messages.queue_message("after")
+        await messages.wait_idle()
+    run(main())
+    assert channel.sent == [("after", [])]
+
+def test_attachments_share_a_message():
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        messages.queue_message("Day 1")
+        for _ in range(12):
+            messages.queue_message(image())
+        messages.queue_message(image("map"))
+        return await messages.wait_sent()
+    assert run(main())
+    first, second = channel.sent
+    assert first[0] == "Day 1" and len(first[1]) == dispatch.MAX_FILES_PER_MESSAGE
+    assert len(set(first[1])) == len(first[1])     # duplicate filenames made unique
+    assert second == (None, ["events.png", "events-1.png", "map.png"])
+
+def test_attachments_split_by_size(monkeypatch):
+    monkeypatch.setattr(dispatch, "MESSAGE_MAX_BYTES", 25)
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        for _ in range(3):
+            messages.queue_message(image(nbytes=10))
+        return await messages.wait_sent()
+    assert run(main())
+    assert [len(files) for _, files in channel.sent] == [2, 1]
+
+def test_encode_failure_leaves_out_one_attachment(monkeypatch):
+    async def broken(image, name="content"):
+        raise OSError("encoder died")
+    monkeypatch.setattr(dispatch, "encode_async", broken)
+    channel = FakeChannel()
+    async def main():
+        messages = dispatcher(channel)
+        messages.queue_message("Day 1")
+        messages.queue_message(Image.new('RGB', (8, 8)))
+        messages.queue_message(image("map"))
+        messages.queue_message("Day 2")
+        messages.queue_message(Image.new('RGB', (8, 8)))
+        await messages.wait_sent()
+        return messages.dropped_count
+    assert run(main()) == 2
+    # The text before an image that failed to encode is still sent.
+    assert channel.sent == [("Day 1", ["map.png"]), ("Day 2", [])]
+
+def test_wait_sent_does_not_block_while_paused():
+    async def main():
+        channel = FakeChannel()
+        messages = dispatcher(channel)
+        messages.paused = True
+        messages.queue_message("held")
+        assert not await messages.wait_sent()
+        await messages.wait_idle()
+        assert not await messages.wait_sending(0.05)
+        waiter = asyncio.create_task(messages.wait_sending())
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        messages.resume()
+        assert await waiter
+        assert await messages.wait_sent()
+        return channel.sent
+    assert run(main()) == [("held", [])]
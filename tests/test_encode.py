@@ -0,0 +1,44 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image, ImageDraw
+
+from encode import encode_image, encode_stats, predict_bytes
+
+def card(size=(200, 100)) -> Image.Image:
+    image = Image.new('RGBA', size, (54, 57, 63, 255))
+    ImageDraw.Draw(image).rectangle((10, 10, 60, 40), fill=(255, 255, 255, 255))
+    return image
+
+def test_flat_image_is_palettized_losslessly():
+    image = card()
+    encoded = encode_image(image, "events")
+    assert encoded.profile == "png-palette"
+    assert encoded.filename == "events.png"
+    assert encoded.nbytes == len(encoded.data)
+    decoded = Image.open(BytesIO(encoded.data)).convert('RGB')
+    assert decoded.tobytes() == image.convert('RGB').tobytes()
+
+def test_first_profile_always_runs():
+    # A zero budget still produces an image (the first applicable profile).
+    encoded = encode_image(card(), "map", budget_ms=0)
+    assert Image.open(BytesIO(encoded.data)).size == (200, 100)
+
+def test_many_colours_are_quantized():
+    image = Image.new('RGB', (64, 64))
+    image.putdata([(x * 4, y * 4, (x + y) * 2) for y in range(64) for x in range(64)])
+    encoded = encode_image(image, "avatar", budget_ms=10000)
+    assert encoded.profile in ("png-quantized", "png-fast")
+    assert encoded.nbytes <= len(encode_image(image, "avatar", budget_ms=0).data)
+
+def test_stats_record_encodes():
+    encode_image(card(), "events")
+    stats = encode_stats()
+    assert stats["count"] >= 1
+    assert stats["last"][0] == "events.png"
+
+def test_predict_bytes():
+    assert predict_bytes("prediction-test", (200, 100)) is None
+    encoded = encode_image(card(), "prediction-test")
+    assert predict_bytes("prediction-test", (200, 100)) == pytest.approx(encoded.nbytes, rel=0.01)
+    assert predict_bytes("prediction-test", (200, 200)) == pytest.approx(2 * encoded.nbytes, rel=0.01)
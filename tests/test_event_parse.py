@@ -0,0 +1,65 @@
+import json
+
+from game.event_parse import check_event, compile_tsv, main, parse_list, parse_template
+
+NAME_IDS = {"Ragni": 1, "Detlas": 2}
+
+def row(text, n, deaths="", teams="", solo=None, comp="", radius=0, event_type="idle", location=""):
+    if solo is None:
+        solo = n
+    return "\t".join([text, str(n), deaths, teams, str(solo), comp, str(radius), event_type, location])
+
+def test_parse_list():
+    assert parse_list("") == []
+    assert parse_list("0,1") == [[0, 1]]
+    assert parse_list("[0, 1] [2]") == [[0, 1], [2]]
+
+def test_parse_template():
+    assert parse_template("{0} hits {1}.") == [["", 0], [" hits ", 1], [".", None]]
+    assert parse_template("{1}") == [["", 1]]
+
+def test_metadata():
+    lines = [row("{0} and {1} fight {2} at Ragni.", 3, deaths="[2]", teams="[0,1]", solo=1,
+                 event_type="fight", location="Ragni, Detlas")]
+    events, errors, warnings = compile_tsv(lines, NAME_IDS)
+    assert errors == [] and warnings == []
+    event = events["fight"][0]
+    assert event["deaths"] == [2] and event["team_list"] == [[0, 1]]
+    assert (event["team_sizes"], event["complement_sizes"], event["solo_count"]) == ([2], [], 1)
+    assert event["location_ids"] == [1, 2]
+    assert event["template"][0] == ["", 0]
+
+def test_all_errors_reported():
+    lines = [
+        row("{0} idles.", 1),
+        "too\tfew\tcolumns",
+        row("{0} hits {3}.", 2, teams="[0]", solo=1),
+        "",
+        row("{0} and {1}", 2, teams="[0,1]", comp="[1]", solo=0),
+        row("{0} goes to Nowhere.", 1, location="Nowhere"),
+        row("{0} waits.", 1, solo=0),
+    ]
+    events, errors, warnings = compile_tsv(lines, NAME_IDS)
+    assert [error.split(":")[0] for error in errors] == ["line 2", "line 3", "line 5"]
+    assert "text refers to players beyond num_players" in errors[1]
+    assert errors[2] == "line 5: team_list and complement_list intersect"
+    assert warnings == ["line 6: unknown location 'Nowhere'", "line 6: no known location, event can't happen",
+                        "line 7: num_players != TeamList + Solo + Complement"]
+    assert [event["text"] for event in events["idle"]] == ["{0} idles.", "{0} goes to Nowhere.", "{0} waits."]
+
+def test_check_event():
+    event = {"text": "{0}", "num_players": 1, "deaths": [], "team_list": [], "complement_list": [], "radius": 0}
+    assert check_event(event) == []
+    assert check_event(dict(event, text="{name}")) == ["bad format text (unsupported field {name}): '{name}'"]
+    assert check_event({"text": "{0}"}) == ["missing num_players, deaths, team_list, complement_list, radius"]
+
+def test_main_writes_nothing_on_error(tmp_path):
+    (tmp_path / "world.json").write_text(json.dumps({"nodes": {"1": "Ragni", "2": "Detlas"}}))
+    (tmp_path / "events.tsv").write_text(row("{0} idles.", 1) + "\n" + row("{1}", 1) + "\n")
+    output = tmp_path / "event_data.json"
+    args = [str(tmp_path / "events.tsv"), "--world", str(tmp_path / "world.json"), "-o", str(output)]
+    assert main(args) == 1
+    assert not output.exists()
+    (tmp_path / "events.tsv").write_text(row("{0} idles.", 1) + "\n")
+    assert main(args) == 0
+    assert json.loads(output.read_text())["idle"][0]["solo_count"] == 1
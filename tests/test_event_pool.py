@@ -0,0 +1,69 @@
+import json
+from random import Random
+from types import SimpleNamespace
+
+import pytest
+
+from game.event_pool import EventPool, RandomSet
+
+class FakePlayer:
+    def __init__(self, name, team_id, node_id):
+        self.name = name
+        self.team = SimpleNamespace(id=team_id)
+        self.location = SimpleNamespace(id=node_id)
+
+def test_random_set():
+    items = RandomSet(range(5))
+    items.remove(1)
+    items.discard(1)
+    items.add(3)
+    assert list(items) == [0, 4, 2, 3]
+    assert 4 in items and 1 not in items
+    rng = Random(1)
+    assert {items.choice(rng) for _ in range(100)} == {0, 2, 3, 4}
+
+def test_pool_indexes():
+    # Team 1: a, b at node 10; team 2: c at node 10, d at node 20.
+    a, b, c, d = (FakePlayer("a", 1, 10), FakePlayer("b", 1, 10),
+                  FakePlayer("c", 2, 10), FakePlayer("d", 2, 20))
+    pool = EventPool([a, b, c, d])
+    rng = Random(2)
+    assert pool.count(None) == 4 and pool.count((10,)) == 3 and pool.count((20, 30)) == 1
+    assert sorted(p.name for p in pool.sample_players(rng, (10,), 3)) == ["a", "b", "c"]
+    assert pool.sample_players(rng, (20,), 2) is None
+    assert pool.sample_players(rng, (10,), 2, exclude=lambda p: p.team.id == 1) is None
+    assert pool.pick_team(rng, (20,), 2, ()) == 2
+    assert pool.pick_team(rng, None, 2, (1, 2)) is None
+
+    pool.remove(d)
+    assert pool.pick_team(rng, (20,), 1, ()) is None
+    assert pool.pick_team(rng, (10,), 2, ()) == 1
+    pool.remove(a)
+    assert pool.pick_team(rng, None, 2, ()) is None
+    assert len(pool) == 2 and a not in pool
+    pool.add(a)
+    assert pool.pick_team(rng, (10,), 2, ()) == 1
+
+def test_same_seed_same_game():
+    from benchmark import make_players
+    from game.game_state import GameState
+
+    with open("game/world_data.json") as f:
+        world_data = json.load(f)
+    with open("game/event_data.json") as f:
+        event_data = json.load(f)
+
+    def play(seed):
+        lines = []
+        game = GameState(world_data, make_players(300), event_data, output_function=lambda *args: None,
+                         seed=seed, avatars=False)
+        game.set_event_printer(lambda this, events: lines.extend(
+            (event["text"], [p.name for p in event_players]) for event, _, event_players in events))
+        for _ in range(3):
+            game.turn()
+            lines.append(game.get_num_alive_players())
+        return lines
+
+    first = play(99)
+    assert first == play(99)
+    assert first[-1] < 300
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from itemdb import ItemDatabase, ItemIndex, read_snapshot, read_snapshot_header, write_snapshot
+
+ITEMS = [
+    {"id": 1, "name": "Warp", "tier": "Legendary", "type": "wand", "agi": 10, "dexReq": 5},
+    {"id": 2, "name": "Cataclysm", "tier": "Mythic", "type": "dagger"},
+    {"id": 3, "name": "internal_name", "displayName": "Shown Name", "tier": "Rare", "type": "ring", "lore": "dropped"},
+    {"id": 4, "name": "Warpath", "tier": "Rare", "type": "bow"},
+]
+
+def test_index_lookup():
+    index = ItemIndex({item["id"]: item for item in ITEMS})
+    assert index.lookup("warp") == 1
+    assert index.lookup("  SHOWN   name ") == 3
+    assert index.lookup("internal_name") == 3
+    assert index.lookup("warpp") is None
+    assert index.prefix("war") == ["Warp", "Warpath"]
+    assert index.suggest("cataclysn") == ["Cataclysm"]
+    assert index.suggest("wrap")[0] == "Warp"
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "items.snapshot")
+    write_snapshot(path, ITEMS, {"source": "test", "version": "1", "fetched": 123})
+    header, items = read_snapshot(path)
+    assert header["count"] == 4 and header["version"] == "1"
+    assert read_snapshot_header(path)["sha256"] == header["sha256"]
+    assert "lore" not in items[2]
+    assert items[0] == ITEMS[0]
+
+def test_corrupt_snapshot(tmp_path):
+    path = tmp_path / "items.snapshot"
+    write_snapshot(str(path), ITEMS, {"fetched": 0})
+    data = bytearray(path.read_bytes())
+    data[-1] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
+
+def test_database_loads_snapshot_without_network(tmp_path):
+    path = str(tmp_path / "items.snapshot")
+    write_snapshot(path, ITEMS, {"source": "test", "version": "1", "fetched": time.time()})
+    db = ItemDatabase(path, url="http://invalid.invalid/", max_age=3600)
+    assert not db.is_loaded()
+    assert db.id_map()[3]["displayName"] == "Shown Name"
+    assert db.is_loaded()
+    assert db.meta["version"] == "1"
+    assert db.find("Shown Name")["id"] == 3
+    assert db.find("nothing like it") is None
+
+def test_failed_refresh_keeps_snapshot(tmp_path):
+    path = str(tmp_path / "items.snapshot")
+    write_snapshot(path, ITEMS, {"source": "test", "version": "1", "fetched": 0})
+    db = ItemDatabase(path, url="http://invalid.invalid/", max_age=0)
+    assert len(db.id_map()) == 4
+    deadline = time.monotonic() + 10
+    while db._refreshing and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert not db._refreshing
+    assert len(db.id_map()) == 4
+    assert read_snapshot_header(path)["version"] == "1"
@@ -0,0 +1,51 @@
+import pytest
+
+from metrics import Counter, Gauge, Histogram, CallbackGauge, Registry
+
+def render(*metrics) -> str:
+    registry = Registry()
+    for metric in metrics:
+        registry.register(metric)
+    return registry.render().decode('utf8')
+
+def test_counter_and_gauge_exposition():
+    sent = Counter("atlas_sent", "Messages sent", ["channel"])
+    sent.labels(2).inc()
+    sent.labels(1).inc(3)
+    depth = Gauge("atlas_depth", "Queue depth")
+    depth.set(1.5)
+    assert render(sent, depth) == (
+        "# HELP atlas_sent Messages sent\n"
+        "# TYPE atlas_sent counter\n"
+        'atlas_sent_total{channel="1"} 3\n'
+        'atlas_sent_total{channel="2"} 1\n'
+        "# HELP atlas_depth Queue depth\n"
+        "# TYPE atlas_depth gauge\n"
+        "atlas_depth 1.5\n")
+
+def test_histogram_exposition():
+    turn = Histogram("atlas_turn_seconds", "Turn time", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        turn.observe(value)
+    assert render(turn).splitlines()[2:] == [
+        'atlas_turn_seconds_bucket{le="0.1"} 1',
+        'atlas_turn_seconds_bucket{le="1"} 2',
+        'atlas_turn_seconds_bucket{le="+Inf"} 3',
+        "atlas_turn_seconds_sum 5.55",
+        "atlas_turn_seconds_count 3",
+    ]
+
+def test_callback_labels_and_escaping():
+    lag = CallbackGauge("atlas_lag", "Lag", lambda: {'a"b\\c': 2, "x": 0.25}, ["branch"])
+    commits = CallbackGauge("atlas_commits", "Commits", lambda: 7, kind="counter")
+    broken = CallbackGauge("atlas_broken", "Raises", lambda: 1 / 0)
+    lines = render(lag, commits, broken).splitlines()
+    assert 'atlas_lag{branch="a\\"b\\\\c"} 2' in lines
+    assert 'atlas_lag{branch="x"} 0.25' in lines
+    assert "atlas_commits_total 7" in lines
+    # A failing callback only loses its own samples.
+    assert lines[-2:] == ["# HELP atlas_broken Raises", "# TYPE atlas_broken gauge"]
+
+def test_label_count_checked():
+    with pytest.raises(ValueError):
+        Counter("atlas_x", "x", ["a", "b"]).labels("only one")
@@ -0,0 +1,40 @@
+"""
+The array movement backend plays the same seeded game as the object model.
+"""
+import pytest
+
+pytest.importorskip("numpy")
+
+from benchmark import make_players
+from game.datapack import load_datapack
+from game.game_state import GameState
+
+@pytest.fixture(scope="module")
+def pack(tmp_path_factory):
+    return load_datapack(cache_dir=str(tmp_path_factory.mktemp("datapack")))
+
+def play(pack, seed, movement, n_players=60, max_days=15):
+    game = GameState(pack.world, make_players(n_players), pack.events, output_function=lambda *args: None,
+                     seed=seed, avatars=False, movement=movement)
+    game.set_event_printer(lambda this, event_data: None)
+    days = [game.snapshot()]
+    while game.get_num_alive_players() > 1 and game.get_day() < max_days:
+        game.turn()
+        days.append(game.snapshot())
+    return days
+
+@pytest.mark.parametrize("movement", ["objects", "array"])
+def test_same_seed_same_game(pack, movement):
+    assert play(pack, 5, movement) == play(pack, 5, movement)
+    assert play(pack, 5, movement) != play(pack, 6, movement)
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_array_movement_matches_objects(pack, seed):
+    assert play(pack, seed, "array") == play(pack, seed, "objects")
+
+def test_array_movement_plays_a_game(pack):
+    days = play(pack, 1, "array")
+    assert len(days) > 1
+    final = days[-1]
+    assert len(final["alive"]) + len(final["dead"]) == 60
+    assert all(player["location"] in pack.world.name_ids for player in final["alive"])
@@ -0,0 +1,129 @@
+"""
+GitPersistence against a local bare repository (the STORE_REMOTE setup).
+"""
+import json
+import os
+import subprocess
+import time
+
+import pytest
+
+from persistence import GitPersistence
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test", *args],
+                          cwd=cwd, check=True, capture_output=True, text=True).stdout
+
+def remote_json(remote: str, branch: str, name: str):
+    return json.loads(git("--git-dir", remote, "show", f"{branch}:{name}"))
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+@pytest.fixture
+def remote(tmp_path):
+    """
+    Bare store repo with one commit on its default branch (checkout branches from it).
+    """
+    remote = str(tmp_path / "store.git")
+    git("init", "--bare", "-q", remote)
+    seed = str(tmp_path / "seed")
+    git("clone", "-q", remote, seed)
+    git("commit", "-q", "--allow-empty", "-m", "init", cwd=seed)
+    git("push", "-q", "origin", "HEAD", cwd=seed)
+    return remote
+
+@pytest.fixture
+def make_store(tmp_path, remote):
+    stores = []
+    def make(debounce: float = 0.3, max_delay: float = 10):
+        store = GitPersistence(str(tmp_path / f"checkout{len(stores)}"), remote, debounce=debounce, max_delay=max_delay)
+        store.checkout("1234")
+        stores.append(store)
+        return store
+    yield make
+    for store in stores:
+        store.stop(10)
+
+def test_writes_are_coalesced(remote, make_store):
+    store = make_store(debounce=0.3)
+    for i in range(5):
+        store.write_json("players.json", {"n": i})
+    assert store.commit_count == 0
+    assert store.read_json("players.json") == {"n": 4}
+    assert wait_for(lambda: store.commit_count == 1)
+    time.sleep(0.5)
+    assert store.commit_count == 1
+    assert remote_json(remote, "1234", "players.json") == {"n": 4}
+    assert store.lag() == 0
+
+def test_max_delay_bounds_debounce(remote, make_store):
+    store = make_store(debounce=0.5, max_delay=0.8)
+    deadline = time.monotonic() + 3
+    while store.commit_count == 0 and time.monotonic() < deadline:
+        store.write_json("players.json", {"t": time.monotonic()})
+        time.sleep(0.1)
+    # Writes never stopped for `debounce` seconds, but max_delay forced a commit.
+    assert store.commit_count >= 1
+
+def test_deferred_write_produced_at_commit(remote, make_store):
+    store = make_store(debounce=0.1)
+    data = {"n": 1}
+    store.write_deferred("stats.json", lambda: data)
+    data["n"] = 2
+    assert store.flush(10)
+    assert remote_json(remote, "1234", "stats.json") == {"n": 2}
+
+def test_stop_flushes(remote, make_store):
+    store = make_store(debounce=60, max_delay=60)
+    store.write_json("players.json", {"a": 1})
+    store.write_json("stats.json", {"b": 2})
+    store.stop(10)
+    assert store.commit_count == 1
+    assert remote_json(remote, "1234", "players.json") == {"a": 1}
+    assert remote_json(remote, "1234", "stats.json") == {"b": 2}
+
+def test_retry_after_push_failure(remote, make_store):
+    store = make_store(debounce=0.05)
+    moved = remote + ".moved"
+    os.rename(remote, moved)
+    try:
+        store.write_json("players.json", {"n": 1})
+        assert not store.flush(1)
+        assert store.last_error is not None
+        assert store.commit_count == 0
+        # A newer write replaces the failed one instead of being queued behind it.
+        store.write_json("players.json", {"n": 2})
+    finally:
+        os.rename(moved, remote)
+    assert store.flush(10)
+    assert store.last_error is None
+    assert store.commit_count == 1
+    assert remote_json(remote, "1234", "players.json") == {"n": 2}
+
+def test_commit_without_checkout_keeps_pending(tmp_path, remote):
+    store = GitPersistence(str(tmp_path / "never"), remote, debounce=0.05)
+    try:
+        store.write_json("players.json", {})
+        assert not store.flush(0.5)
+        assert "not checked out" in store.last_error
+        assert store.lag() > 0
+    finally:
+        store.stop(0.5)
+
+def test_write_before_first_checkout(tmp_path, remote):
+    store = GitPersistence(str(tmp_path / "late"), remote, debounce=0.05)
+    try:
+        store.write_json("players.json", {"early": True})
+        start = time.monotonic()
+        store.checkout("1234")
+        assert time.monotonic() - start < 5
+        assert store.flush(10)
+        assert remote_json(remote, "1234", "players.json") == {"early": True}
+    finally:
+        store.stop(10)
@@ -0,0 +1,41 @@
+import pstats
+import time
+
+import pytest
+
+from profiling import Profiler
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def test_disabled_is_noop(tmp_path):
+    profiler = Profiler(None, str(tmp_path / "profiles"))
+    with profiler.profile("turn"):
+        busy(0.01)
+    assert profiler.files() == []
+
+def test_writes_profiles(tmp_path):
+    profiler = Profiler("all", str(tmp_path))
+    with profiler.profile("turn"):
+        with profiler.profile("nested"):
+            busy(0.05)
+    files = profiler.files()
+    assert [f.rsplit('.', 1)[1] for f in files] == ["collapsed", "pstats"]
+    assert all("-turn-" in f for f in files)
+    pstats.Stats(str(tmp_path / files[1]))
+    collapsed = (tmp_path / files[0]).read_text()
+    assert "test_profiling.py:busy" in collapsed
+
+def test_rotation_keeps_newest(tmp_path):
+    profiler = Profiler("sample", str(tmp_path), keep=2)
+    for i in range(4):
+        with profiler.profile(f"cmd{i}"):
+            pass
+        time.sleep(0.01)
+    assert [f.split('-')[3] for f in profiler.files()] == ["cmd2", "cmd3"]
+
+def test_bad_mode():
+    with pytest.raises(ValueError):
+        Profiler("flame")
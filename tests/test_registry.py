@@ -0,0 +1,53 @@
+import threading
+
+from registry import PlayerRegistry
+
+def test_upsert_and_roster(tmp_path):
+    registry = PlayerRegistry(str(tmp_path / "players.db"))
+    registry.upsert("g1", 2, {"name": "bob", "img": "b.png"})
+    registry.upsert("g1", 1, {"name": "alice", "img": "a.png", "team": "red"})
+    registry.upsert("g1", 2, {"name": "bobby", "img": "b2.png", "active": False})
+    registry.upsert("g2", 1, {"name": "carol"})
+    assert registry.roster("g1") == {
+        "1": {"name": "alice", "img": "a.png", "active": True, "team": "red"},
+        "2": {"name": "bobby", "img": "b2.png", "active": False},
+    }
+    assert registry.roster("g1", active_only=True) == {"1": {"name": "alice", "img": "a.png", "active": True, "team": "red"}}
+    assert registry.names("g1") == ["alice", "bobby"]
+    assert registry.count("g2") == 1
+    assert registry.get("g2", "1") == {"name": "carol", "img": "", "active": True}
+    assert registry.get("g2", "2") is None
+
+def test_set_active(tmp_path):
+    registry = PlayerRegistry(str(tmp_path / "players.db"))
+    registry.upsert("g", "1", {"name": "alice"})
+    assert registry.set_active("g", "1", False)
+    assert not registry.set_active("g", "2", False)
+    assert registry.get("g", "1")["active"] is False
+
+def test_import_replaces_only_that_guild(tmp_path):
+    registry = PlayerRegistry(str(tmp_path / "players.db"))
+    registry.upsert("g1", "9", {"name": "old"})
+    registry.upsert("g2", "9", {"name": "other guild"})
+    players = {"1": {"name": "alice", "img": "a.png", "active": True}, "2": {"name": "bob", "img": "", "active": False}}
+    registry.import_json("g1", players)
+    assert registry.roster("g1") == players
+    assert registry.names("g2") == ["other guild"]
+    registry.import_json("g1", {"3": {"name": "carol"}}, replace=False)
+    assert registry.count("g1") == 3
+
+def test_roster_round_trip_from_threads(tmp_path):
+    registry = PlayerRegistry(str(tmp_path / "players.db"))
+    def register(start):
+        for i in range(start, start + 50):
+            registry.upsert("g", i, {"name": f"p{i}"})
+    threads = [threading.Thread(target=register, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    roster = registry.roster("g")
+    assert len(roster) == 200
+    other = PlayerRegistry(str(tmp_path / "copy.db"))
+    other.import_json("g", roster)
+    assert other.roster("g") == roster
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+from PIL import Image
+
+if not os.path.exists(os.path.join("game", "resources", "map.png")):
+    pytest.skip("needs game/resources/map.png (not in the repo)", allow_module_level=True)
+
+import replay
+from replay import Replay, ReplayDay, render_replay
+
+def make_replay():
+    game = Replay()
+    game.append(ReplayDay(0, ((1, (100, 100), ("alice",)), (2, (500, 300), ("bob", "carol")))))
+    # Team 1 merged into team 2; bob split off into team 3.
+    game.append(ReplayDay(1, ((2, (700, 300), ("alice", "carol")), (3, (900, 100), ("bob",)))))
+    return game
+
+def test_frames():
+    frames = list(make_replay().frames(frames_per_day=4, frame_ms=50, hold_ms=100))
+    assert len(frames) == 1 + 3 + 1
+    assert [duration for _, duration, _ in frames] == [100, 50, 50, 50, 300]
+    assert frames[0][0] == "Start  -  3 players"
+    assert frames[-1][0] == "Day 1  -  3 alive"
+    # Mid-way, team 1 is heading for team 2.
+    start = {team_id: (x, y) for x, y, _, team_id in frames[0][2]}
+    end = {team_id: (x, y) for x, y, _, team_id in frames[-1][2]}
+    middle = {team_id: (x, y) for x, y, _, team_id in frames[2][2] if team_id == 1}
+    assert middle[1] == pytest.approx(((start[1][0] + end[2][0]) / 2, (start[1][1] + end[2][1]) / 2))
+
+def test_render_gif(tmp_path):
+    path = str(tmp_path / "replay.gif")
+    assert render_replay(make_replay(), path, width=160, frames_per_day=3, parallel=False) == 4
+    with Image.open(path) as image:
+        # The base map, then one image per frame.
+        assert image.n_frames == 1 + 4
+        assert image.width == 160
+
+def test_render_png_frames(tmp_path):
+    path = str(tmp_path / "frames")
+    assert render_replay(make_replay(), path, width=160, frames_per_day=3, parallel=False) == 4
+    # Constant frame rate: held frames are repeated.
+    frame_ms = replay.REPLAY_FRAME_MS
+    repeats = [round(duration / frame_ms) for duration in
+               (replay.REPLAY_HOLD_MS, frame_ms, frame_ms, 3 * replay.REPLAY_HOLD_MS)]
+    names = sorted(os.listdir(path))
+    assert names == [f"{i:05d}.png" for i in range(sum(repeats))]
+    with Image.open(os.path.join(path, names[-1])) as image:
+        assert image.width == 160
+
+def test_no_pool_once_threads_run(monkeypatch):
+    monkeypatch.setattr(replay, "_POOL", None)
+    monkeypatch.setattr(replay.threading, "active_count", lambda: 2)
+    assert replay.replay_pool() is None
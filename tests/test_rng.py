@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from game.rng import GameRng
+
+def test_streams_are_deterministic_and_independent():
+    a, b = GameRng(42), GameRng(42)
+    assert a.random("events", 1).random() == b.random("events", 1).random()
+    assert a.random("events", 1).random() != a.random("events", 2).random()
+    assert a.random("events", 1).random() != a.random("merge", 1).random()
+    assert a.random("events", 1).random() != GameRng(43).random("events", 1).random()
+
+def test_keyed_draws_ignore_order():
+    rng = GameRng(7)
+    keys = list(range(200))
+    forward = [rng.draws("follow", 3).uniform(k) for k in keys]
+    draws = rng.draws("follow", 3)
+    shuffled = keys[:]
+    random.Random(0).shuffle(shuffled)
+    assert {k: draws.uniform(k) for k in shuffled} == dict(zip(keys, forward))
+    table = rng.draws("follow", 3).table(50)
+    assert table[:50] == forward[:50]
+    assert all(0 <= u < 1 for u in forward)
+
+def test_array_draws_match_scalar_draws():
+    np = pytest.importorskip("numpy")
+    for seed in (0, 1, 2 ** 40):
+        draws = GameRng(seed).draws("walk", 5)
+        keys = np.array([9, 0, 3, 3, 120])
+        assert draws.uniforms(keys).tolist() == [draws.uniform(int(k)) for k in keys]
+        assert len(draws.uniforms([])) == 0
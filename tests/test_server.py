@@ -0,0 +1,301 @@
+"""
+Dashboard HTTP endpoints, against a RequestHandler on a local port (the bot is never started).
+"""
+import asyncio
+import gzip
+import http.client
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault("PORT", "0")
+
+import dispatch
+import server
+from dispatch import TokenBucket
+from session import ChannelSession, DayResult
+from snapshots import GameSnapshot
+from stats import GameStats
+from summary import ResearchSummary
+from webcache import StaticAssets
+
+class FakeItems:
+    def simplified(self, item_id):
+        return {"id": item_id, "name": f"item{item_id}"}
+
+@pytest.fixture
+def api(monkeypatch):
+    monkeypatch.setattr(server.BOT_OBJ, "_items", FakeItems())
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.RequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    def request(method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=10)
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response, data
+    yield request
+    httpd.shutdown()
+    httpd.server_close()
+
+URL = "https://wynnbuilder.github.io/#5_" + "001" * 9 + "00" * 5 + "0000"
+
+def test_decode(api):
+    response, data = api("POST", "/api/decode", body=f"{URL}\n\nnot a url\n")
+    assert response.status == 200
+    decoded = json.loads(data)
+    assert [entry["error"] is None for entry in decoded] == [True, False]
+    assert decoded[0]["build"]["equips"][0] == {"id": 1, "name": "item1"}
+
+def test_decode_limits(api, monkeypatch):
+    monkeypatch.setattr(server, "DECODE_MAX_BYTES", 1000)
+    monkeypatch.setattr(server, "DECODE_MAX_URLS", 3)
+    response, _ = api("POST", "/api/decode", body="x" * 1001)
+    assert response.status == 413
+    response, _ = api("POST", "/api/decode", body="\n".join([URL] * 4))
+    assert response.status == 413
+    response, _ = api("POST", "/api/decode", body="\n".join([URL] * 3))
+    assert response.status == 200
+    for length in ["-5", "abc"]:
+        response, _ = api("POST", "/api/decode", body="", headers={"Content-Length": length})
+        assert response.status == 400
+
+def build_entry(build_id: int) -> dict:
+    equips = [{"id": i, "name": f"item number {i}"} for i in range(9)]
+    return {"build": {"equips": equips, "sp": [0, 0, 0, 0, build_id]}, "add": None, "pops": [], "id": build_id}
+
+@pytest.fixture
+def summary(monkeypatch):
+    summary = ResearchSummary()
+    summary.load({"id": 20, "builds": {str(i): build_entry(i) for i in range(20)}})
+    monkeypatch.setattr(server.BOT_OBJ, "research_mode", True)
+    monkeypatch.setattr(server.BOT_OBJ, "summary", summary)
+    return summary
+
+def test_summary_etag(api, summary):
+    response, body = api("GET", "/api/summary")
+    assert response.status == 200
+    etag = response.getheader("ETag")
+    assert response.getheader("Vary") == "Accept-Encoding"
+    assert body.count(b"<br>") == 19
+
+    response, body = api("GET", "/api/summary", headers={"If-None-Match": etag})
+    assert response.status == 304 and body == b""
+
+    # A change is a new version, so the old etag no longer matches.
+    summary.set_entry(build_entry(20))
+    response, body = api("GET", "/api/summary", headers={"If-None-Match": etag})
+    assert response.status == 200
+    assert response.getheader("ETag") != etag
+    assert body.count(b"<br>") == 20
+
+def test_summary_gzip_has_its_own_etag(api, summary):
+    response, plain = api("GET", "/api/summary?format=json")
+    plain_etag = response.getheader("ETag")
+    response, body = api("GET", "/api/summary?format=json", headers={"Accept-Encoding": "gzip"})
+    assert response.status == 200
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert response.getheader("Vary") == "Accept-Encoding"
+    gzip_etag = response.getheader("ETag")
+    assert gzip_etag == plain_etag[:-1] + '-gzip"'
+    assert gzip.decompress(body) == plain
+    assert json.loads(plain)["total"] == 20
+
+    # Each etag only validates its own representation.
+    response, _ = api("GET", "/api/summary?format=json", headers={"Accept-Encoding": "gzip", "If-None-Match": plain_etag})
+    assert response.status == 200
+    response, body = api("GET", "/api/summary?format=json", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag})
+    assert response.status == 304 and body == b""
+    assert response.getheader("ETag") == gzip_etag
+    response, _ = api("GET", "/api/summary?format=json", headers={"If-None-Match": gzip_etag})
+    assert response.status == 200
+
+class FakeSession:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+@pytest.fixture
+def games(monkeypatch):
+    state = {
+        "day": 2, "seed": 1,
+        "alive": [{"name": "alice", "team": 0, "location": "Ragni", "kills": 1}],
+        "dead": [{"name": "bob", "kills": 0, "death": "bob fell"}],
+        "teams": [{"id": 0, "name": "alice", "location": "Ragni", "players": ["alice"]}],
+    }
+    sessions = {5: FakeSession(GameSnapshot(5, 3, state)), 6: FakeSession(None)}
+    monkeypatch.setattr(server.BOT_OBJ, "_sessions", sessions)
+    return sessions
+
+def test_game_endpoints(api, games):
+    response, body = api("GET", "/api/game")
+    assert response.status == 200
+    assert json.loads(body) == [{"channel": "5", "version": 3, "day": 2, "alive": 1}]
+
+    response, body = api("GET", "/api/game/5")
+    assert json.loads(body)["alive"][0]["name"] == "alice"
+    response, body = api("GET", "/api/game/5/players")
+    assert json.loads(body)["dead"] == [{"name": "bob", "kills": 0, "death": "bob fell"}]
+    response, body = api("GET", "/api/game/5/teams", headers={"If-None-Match": response.getheader("ETag")})
+    assert response.status == 200
+    etag = response.getheader("ETag")
+    response, body = api("GET", "/api/game/5/teams", headers={"If-None-Match": etag})
+    assert response.status == 304
+
+    for path in ["/api/game/5/map", "/api/game/6", "/api/game/7", "/api/game/x", "/api/game/5/teams/1"]:
+        response, _ = api("GET", path)
+        assert response.status == 404, path
+
+def test_static_files(api, monkeypatch, tmp_path):
+    (tmp_path / "index.html").write_text("<p>dashboard</p>" * 100)
+    (tmp_path / "server.py").write_text("secret")
+    monkeypatch.setattr(server, "STATIC_ASSETS", StaticAssets(str(tmp_path)))
+    response, body = api("GET", "/")
+    assert response.status == 200 and body.startswith(b"<p>dashboard</p>")
+    assert response.getheader("Cache-Control") == "public, max-age=0, must-revalidate"
+    response, body = api("GET", "/index.html", headers={"If-None-Match": response.getheader("ETag")})
+    assert response.status == 304 and body == b""
+    response, _ = api("GET", "/", headers={"Accept-Encoding": "gzip"})
+    assert response.getheader("Content-Encoding") == "gzip"
+    response, _ = api("GET", "/", headers={"Accept-Encoding": "gzip", "If-None-Match": response.getheader("ETag")})
+    assert response.status == 304
+    assert api("GET", "/server.py")[0].status == 403
+    assert api("GET", "/missing.js")[0].status == 404
+
+def test_metrics_endpoint(api):
+    response, body = api("GET", "/api/metrics")
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "text/plain; version=0.0.4; charset=utf-8"
+    text = body.decode('utf8')
+    assert "# TYPE atlas_command_seconds histogram\n" in text
+    assert "# TYPE atlas_persistence_commits counter\n" in text
+    assert text.endswith("\n")
+
+def test_stats_endpoint(api, monkeypatch, tmp_path):
+    stats = GameStats(str(tmp_path / "stats.db"))
+    results = [{"name": f"p{i}", "placement": i + 1, "kills": 0, "killers": [], "death": None, "day": None}
+               for i in range(3)]
+    stats.record_game("5", results, {f"p{i}": str(i) for i in range(3)}, 1, 1)
+    monkeypatch.setattr(server.BOT_OBJ, "_stats", stats)
+    response, body = api("GET", "/api/stats/5?by=wins&limit=2")
+    assert [player["name"] for player in json.loads(body)["players"]] == ["p0", "p1"]
+    # The limit is clamped to 1..100.
+    for limit, count in [("0", 1), ("-3", 1), ("1000", 3)]:
+        response, body = api("GET", f"/api/stats/5?limit={limit}")
+        assert response.status == 200 and len(json.loads(body)["players"]) == count
+    assert api("GET", "/api/stats/5?limit=x")[0].status == 400
+    assert api("GET", "/api/stats/5?by=bogus")[0].status == 400
+    assert json.loads(api("GET", "/api/stats/5/p2")[1])["games"] == 1
+    assert api("GET", "/api/stats/5/nobody")[0].status == 404
+
+class FakeChannel:
+    id = 40
+    name = "atlas"
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, file=None, files=None):
+        self.sent.append(content)
+
+class FakeContext:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, content):
+        self.channel.sent.append(content)
+
+class FakeGame:
+    def __init__(self, alive):
+        self.alive = alive
+        self.day = 0
+
+    def get_num_alive_players(self):
+        return self.alive
+
+@pytest.fixture
+def auto_session(monkeypatch):
+    monkeypatch.setattr(server, "AUTO_DAY_DELAY", 0)
+    monkeypatch.setattr(dispatch, "PAUSE_AFTER", 1000)
+    channel = FakeChannel()
+    session = ChannelSession(channel)
+    session.messages._bucket = TokenBucket(1000, 1)
+    session.game = FakeGame(alive=5)
+    def snapshot():
+        state = {"day": session.game.day, "seed": 0, "teams": [], "dead": [],
+                 "alive": [{"name": f"p{i}", "team": 0, "location": "", "kills": 0} for i in range(session.game.alive)]}
+        return GameSnapshot(channel.id, session.game.day + 1, state)
+    def simulate_day():
+        session.game.day += 1
+        day = DayResult()
+        day.messages.append(f"day {session.game.day}")
+        day.alive = session.game.alive
+        day.snapshot = snapshot()
+        return day
+    session.snapshot = snapshot()
+    session.simulate_day = simulate_day
+    monkeypatch.setattr(server.BOT_OBJ, "_sessions", {channel.id: session})
+    return session
+
+def run_auto(*args):
+    return server.BOT_OBJ._bot.get_command("auto").callback(FakeContext(server.BOT_OBJ._sessions[40].channel), *args)
+
+def run(coro):
+    return asyncio.run(asyncio.wait_for(coro, 10))
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+def test_auto_rejects_bad_counts(auto_session):
+    async def main():
+        auto_session.messages.start()
+        for days in ["0", "-3", "lots"]:
+            await run_auto(days)
+    run(main())
+    assert auto_session.channel.sent == ["Usage: `$auto [days]` (at least 1) or `$auto stop`"] * 3
+    assert auto_session.game.day == 0
+
+def test_auto_releases_lock_while_paused(auto_session):
+    session = auto_session
+    async def main():
+        session.messages.start()
+        session.messages.paused = True
+        task = asyncio.create_task(run_auto("4"))
+        # Day 1 is queued, day 2 is simulated and queued behind the pause, then the lock is let go.
+        await wait_until(lambda: session.game.day == 2 and not session.game_lock.locked())
+        await asyncio.sleep(0.1)
+        assert not task.done() and session.auto_running
+        assert session.game.day == 2
+        assert session.game_lock.acquire(blocking=False)
+        session.game_lock.release()
+        session.messages.resume()
+        await task
+    run(main())
+    text = "\n".join(m for m in session.channel.sent if m)
+    assert [line for line in text.splitlines() if line.startswith("day")] == ["day 1", "day 2", "day 3", "day 4"]
+    assert text.endswith("Day concluded --- type `$next` or react ⏭️ to continue")
+    assert not session.game_lock.locked() and not session.auto_running
+
+def test_auto_stop_while_paused(auto_session):
+    session = auto_session
+    async def main():
+        session.messages.start()
+        session.messages.paused = True
+        task = asyncio.create_task(run_auto("10"))
+        await wait_until(lambda: session.game.day == 2 and not session.game_lock.locked())
+        await run_auto("stop")
+        await task
+        assert session.game.day == 2
+        assert not session.auto_running
+        session.messages.resume()
+        await session.messages.wait_idle()
+    run(main())
+    text = "\n".join(m for m in session.channel.sent if m)
+    assert [line for line in text.splitlines() if line.startswith("day")] == ["day 1", "day 2"]
+    assert text.endswith("Day concluded --- type `$next` or react ⏭️ to continue")
+    assert not session.game_lock.locked()
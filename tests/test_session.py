@@ -0,0 +1,156 @@
+import io
+import json
+import time
+
+import pytest
+import requests
+from PIL import Image
+
+from encode import EncodedImage
+from game.game_state import GameState
+import session
+from session import ChannelSession, pack_cards
+from snapshots import GameSnapshot
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+
+class Avatar:
+    def __init__(self):
+        buf = io.BytesIO()
+        Image.new("RGB", (64, 64), (200, 100, 50)).save(buf, format="PNG")
+        buf.seek(0)
+        self.raw = buf
+
+@pytest.fixture
+def world_data():
+    with open("game/world_data.json") as f:
+        return json.load(f)
+
+@pytest.fixture
+def event_data():
+    with open("game/event_data.json") as f:
+        return json.load(f)
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(requests, "get", lambda url, stream=False: Avatar())
+    monkeypatch.setattr(GameState, "print_map", lambda self, location_list=None: Image.new("RGB", (32, 32)))
+
+def players(*names) -> dict:
+    return {str(i): {"name": name, "img": "avatar"} for i, name in enumerate(names)}
+
+def test_sessions_are_independent(world_data, event_data):
+    first = ChannelSession(FakeChannel(1))
+    second = ChannelSession(FakeChannel(2))
+    first.new_game(world_data, players("alice", "bob", "carol"), event_data, presim_days=0)
+    second.new_game(world_data, players("dave", "erin"), event_data, presim_days=0)
+    assert first.game is not second.game
+    assert first.game._world is not second.game._world
+
+    queued = second.messages.queue_depth()
+    first.play_turn()
+    assert first.messages.queue_depth() > queued
+    assert second.messages.queue_depth() == queued
+    assert first.game._turn_counter == 1
+    assert second.game._turn_counter == 0
+    assert sorted(second.game._players_static) == ["dave", "erin"]
+
+    first.end_game()
+    assert first.game is None
+    assert second.game is not None
+
+def test_snapshot_published_per_turn(world_data, event_data):
+    session = ChannelSession(FakeChannel(3))
+    session.new_game(world_data, players("alice", "bob", "carol"), event_data, presim_days=0)
+    first = session.snapshot
+    assert (first.version, first.day, first.alive) == (1, 0, 3)
+    assert "map" not in first.responses
+    client = session.stream.subscribe()
+    session.play_turn()
+    frames = b''.join(client.pull(0)).decode('utf8')
+    assert "event: event\n" in frames
+    assert frames.endswith(f'event: map\ndata: {{"day": 1, "version": 2, "url": "/api/game/3/map"}}\n\n')
+    snapshot = session.snapshot
+    assert (snapshot.version, snapshot.day) == (2, 1)
+    assert snapshot.responses["map"].content_type == "image/png"
+    state = json.loads(snapshot.responses["state"].body)
+    assert state["channel"] == "3" and state["day"] == 1
+    assert len(state["alive"]) + len(state["dead"]) == 3
+    # The previous snapshot is untouched.
+    assert json.loads(first.responses["state"].body)["day"] == 0
+
+def queued(session):
+    """
+    Queued messages, with images as their encoded bytes.
+    """
+    return [content.data if isinstance(content, EncodedImage) else content
+            for _, content in session.messages._pending]
+
+def published_state(session) -> dict:
+    state = json.loads(session.snapshot.responses["state"].body)
+    del state["channel"], state["version"]
+    return state
+
+def test_presim_matches_step_by_step(world_data, event_data):
+    roster = players(*(f"player{i}" for i in range(12)))
+    stepped = ChannelSession(FakeChannel(4))
+    presim = ChannelSession(FakeChannel(5))
+    stepped.new_game(world_data, roster, event_data, seed=1234, presim_days=0)
+    presim.new_game(world_data, roster, event_data, seed=1234, presim_days=3)
+    try:
+        assert queued(stepped) == queued(presim)
+        for _ in range(4):
+            stepped.play_turn()
+            presim.play_turn()
+            assert published_state(stepped) == published_state(presim)
+            assert queued(stepped) == queued(presim)
+    finally:
+        presim.end_game()
+
+def test_player_info_reads_published_day(world_data, event_data):
+    roster = players(*(f"player{i}" for i in range(40)))
+    session = ChannelSession(FakeChannel(6))
+    session.new_game(world_data, roster, event_data, seed=7, presim_days=3)
+    try:
+        deadline = time.monotonic() + 30
+        while session.lookahead_depth() < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # The game object is days ahead, but nothing has been published yet.
+        assert session.game.get_num_dead_players() > 0
+        assert session.snapshot.day == 0
+        dead = session.game._dead_players[0].name
+        assert session.snapshot.player_info(dead).endswith("Alive: True")
+        session.play_turn()
+        assert session.snapshot.day == 1
+    finally:
+        session.end_game()
+
+def no_prediction(name, size):
+    return None
+
+def test_pack_cards_by_height(monkeypatch):
+    monkeypatch.setattr(session, "predict_bytes", no_prediction)
+    assert pack_cards([300] * 7, max_height=1000) == [range(0, 3), range(3, 6), range(6, 7)]
+    assert pack_cards([], max_height=1000) == []
+
+def test_pack_cards_oversized_card_alone(monkeypatch):
+    monkeypatch.setattr(session, "predict_bytes", no_prediction)
+    assert pack_cards([100, 1200, 100], max_height=1000) == [range(0, 1), range(1, 2), range(2, 3)]
+
+def test_pack_cards_by_predicted_bytes(monkeypatch):
+    monkeypatch.setattr(session, "predict_bytes", lambda name, size: size[1] * 1000)
+    assert pack_cards([200] * 5, max_height=10000, max_bytes=450000) == [range(0, 2), range(2, 4), range(4, 5)]
+
+def test_snapshot_player_info():
+    state = {
+        "day": 3, "seed": 1,
+        "alive": [{"name": "alice", "team": 7, "location": "Ragni", "kills": 2}],
+        "dead": [{"name": "bob", "location": "Detlas", "kills": 0, "death": "bob fell"}],
+        "teams": [{"id": 7, "name": "Team A", "location": "Ragni", "players": ["alice"]}],
+    }
+    snapshot = GameSnapshot(1, 1, state)
+    assert snapshot.player_info("alice") == "Player name=alice [Team A]:\nKills: 2\nLocation: Ragni\nAlive: True"
+    assert snapshot.player_info("bob") == "Player name=bob []:\nKills: 0\nLocation: Detlas\nAlive: False\nDeath: [bob fell]"
+    assert snapshot.player_info("carol") == "No such player!"
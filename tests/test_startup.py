@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+
+from PIL import ImageChops
+
+from game import game_visualizer
+
+def test_import_loads_nothing_heavy():
+    code = ("import sys, server, game.game_visualizer as v; "
+            "print(len(v._assets), [m for m in ('numpy', 'requests', 'multiprocessing') if m in sys.modules])")
+    output = subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PORT="0"),
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "0 []"
+
+def test_asset_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(game_visualizer, "ASSET_CACHE_DIR", str(tmp_path))
+    first = game_visualizer._scaled_asset("team0.png", game_visualizer._prepare_marker)
+    [name] = os.listdir(tmp_path)
+    assert name.startswith("team0.png.") and name.endswith(".rgba")
+    cached = game_visualizer._scaled_asset("team0.png", game_visualizer._prepare_marker)
+    assert cached.size == (game_visualizer.MARKER_WIDTH, game_visualizer.MARKER_HEIGHT)
+    assert ImageChops.difference(first, cached).getbbox() is None
+    # A corrupt cache file is rebuilt.
+    (tmp_path / name).write_bytes(b"garbage")
+    assert game_visualizer._scaled_asset("team0.png", game_visualizer._prepare_marker).size == cached.size
@@ -0,0 +1,50 @@
+import pytest
+
+from stats import GameStats
+
+def result(name, placement, kills=0, day=None, killers=()):
+    return {"name": name, "placement": placement, "kills": kills, "killers": list(killers),
+            "death": None if day is None else f"{name} died", "day": day}
+
+IDS = {"alice": "1", "bob": "2", "carol": "3"}
+
+@pytest.fixture
+def stats(tmp_path):
+    stats = GameStats(str(tmp_path / "stats.db"))
+    # alice beats bob twice, carol wins once (killing alice).
+    stats.record_game("g", [result("alice", 1, 2), result("bob", 2, 0, 3, ["alice"]), result("carol", 3, 0, 2, ["alice"])], IDS, 1, 3)
+    stats.record_game("g", [result("alice", 1, 1), result("bob", 2, 0, 4, ["alice"])], IDS, 2, 4)
+    stats.record_game("g", [result("carol", 1, 1), result("alice", 2, 0, 5, ["carol"])], IDS, 3, 5)
+    return stats
+
+def test_aggregates(stats):
+    alice = stats.player("g", "alice")
+    assert (alice["games"], alice["wins"], alice["kills"], alice["deaths"]) == (3, 2, 3, 1)
+    assert alice["avg_placement"] == pytest.approx(4 / 3)
+    assert alice["best_placement"] == 1
+    assert alice["nemesis"] == {"name": "carol", "kills": 1}
+    assert stats.player("g", "2")["nemesis"] == {"name": "alice", "kills": 2}
+    assert stats.player("g", "nobody") is None
+    assert stats.game_count("g") == 3
+
+def test_leaderboards(stats):
+    assert [row["name"] for row in stats.leaderboard("g", "wins")] == ["alice", "carol", "bob"]
+    assert [row["name"] for row in stats.leaderboard("g", "kills", 2)] == ["alice", "carol"]
+    assert stats.leaderboard("g", "placement")[0]["name"] == "alice"
+    assert stats.leaderboard("other") == []
+    with pytest.raises(KeyError):
+        stats.leaderboard("g", "bogus")
+
+def test_export_import_round_trip(stats, tmp_path):
+    data = stats.export_json("g")
+    assert data["guild"] == "g"
+    other = GameStats(str(tmp_path / "other.db"))
+    other.import_json("g", data)
+    assert other.leaderboard("g", "kills") == stats.leaderboard("g", "kills")
+    assert other.player("g", "bob")["nemesis"] == {"name": "alice", "kills": 2}
+
+def test_import_refuses_other_guild(stats):
+    before = stats.leaderboard("g")
+    with pytest.raises(ValueError):
+        stats.import_json("g", {"guild": "h", "players": {}, "kills": []})
+    assert stats.leaderboard("g") == before
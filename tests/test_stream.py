@@ -0,0 +1,81 @@
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stream import EventStream, serve_stream
+
+def parse(frames: bytes):
+    """
+    Split an SSE byte stream into events: [{field: value}] (comments and retry dropped).
+    """
+    events = []
+    for block in frames.decode('utf8').split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if line and not line.startswith(":"))
+        if "data" in fields:
+            events.append(fields)
+    return events
+
+def test_frame_format():
+    stream = EventStream()
+    client = stream.subscribe()
+    assert stream.publish("death", {"name": "bob", "day": 2}) == 1
+    assert stream.publish("map", {"day": 2}) == 2
+    frames = client.pull(1)
+    assert frames[0] == f'id: {stream.stream_id}-1\nevent: death\ndata: {{"name": "bob", "day": 2}}\n\n'.encode('utf8')
+    events = parse(b''.join(frames))
+    assert [event["event"] for event in events] == ["death", "map"]
+    assert json.loads(events[1]["data"]) == {"day": 2}
+
+def test_reconnect_replays_after_last_event_id():
+    stream = EventStream()
+    for i in range(5):
+        stream.publish("event", {"n": i})
+    client = stream.subscribe(f"{stream.stream_id}-3")
+    assert [json.loads(event["data"])["n"] for event in parse(b''.join(client.pull(1)))] == [3, 4]
+    # An id from another stream (eg. before a restart) replays nothing.
+    other = stream.subscribe("123-1")
+    assert other.pull(0.01) == []
+
+def test_slow_client_is_dropped():
+    stream = EventStream(client_buffer=3)
+    client = stream.subscribe()
+    for i in range(5):
+        stream.publish("event", {"n": i})
+    assert client.overflowed
+    assert len(client.pull(0)) == 3
+
+@pytest.fixture
+def served_stream():
+    stream = EventStream()
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            serve_stream(self, stream)
+        def log_message(self, *args):
+            pass
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield stream, httpd.server_address[1]
+    stream.close()
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_serve_stream(served_stream):
+    stream, port = served_stream
+    stream.publish("newgame", {"day": 0})
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("GET", "/", headers={"Last-Event-ID": f"{stream.stream_id}-0"})
+    response = conn.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "text/event-stream"
+    assert response.readline() == b"retry: 3000\n"
+    assert response.readline() == b"\n"
+    stream.publish("map", {"day": 1})
+    received = b""
+    while not received.endswith(b'data: {"day": 1}\n\n'):
+        received += response.readline()
+    events = parse(received)
+    assert [(event["event"], json.loads(event["data"])) for event in events] == [("newgame", {"day": 0}), ("map", {"day": 1})]
+    conn.close()
@@ -0,0 +1,36 @@
+import os
+
+from webcache import CachedResponse, StaticAssets
+
+def test_cached_response_etags():
+    small = CachedResponse(b"hi", "text/plain")
+    assert small.gzip_body is None
+    big = CachedResponse(b"x" * 1000, "text/plain", etag="v1")
+    assert (big.etag, big.gzip_etag) == ('"v1"', '"v1-gzip"')
+    assert CachedResponse(b"x" * 1000, "image/png", gzip_level=None).gzip_body is None
+
+def test_static_paths(tmp_path):
+    (tmp_path / "index.html").write_text("<html></html>")
+    (tmp_path / "secret.py").write_text("TOKEN = 1")
+    assets = StaticAssets(str(tmp_path))
+    assert assets.resolve("/") == os.path.join(assets.root, "index.html")
+    assert assets.get("/").body == b"<html></html>"
+    assert assets.resolve("/secret.py") is None
+    # ".." can't climb out of the root, not even percent-encoded or through a symlink.
+    assert assets.resolve("/%2e%2e/outside.html") == os.path.join(assets.root, "outside.html")
+    (tmp_path / "site").mkdir()
+    (tmp_path / "site" / "link.html").symlink_to(tmp_path / "index.html")
+    assert StaticAssets(str(tmp_path / "site")).resolve("/link.html") is None
+    assert assets.get("/missing.html") is None
+
+def test_static_reload_on_change(tmp_path):
+    page = tmp_path / "page.html"
+    page.write_text("one")
+    assets = StaticAssets(str(tmp_path), check_interval=0)
+    first = assets.get("/page.html")
+    assert assets.get("/page.html") is first
+    page.write_text("two!")
+    second = assets.get("/page.html")
+    assert second.body == b"two!" and second.etag != first.etag
+    page.unlink()
+    assert assets.get("/page.html") is None
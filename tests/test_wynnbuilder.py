@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from wynnbuilder import (B64_DIGITS, DEFAULT_SLOTS, N_EQUIPS, BuildDecodeError, decode_build, decode_builds,
+                         decode_hash, to_int, to_int_signed)
+
+B64_REVERSE = {c: i for i, c in enumerate(B64_DIGITS)}
+
+def reference_to_int(digits):
+    # Per character dict lookup, as server.py decoded hashes before.
+    result = 0
+    for digit in digits:
+        result = (result << 6) + B64_REVERSE[digit]
+    return result
+
+def reference_to_int_signed(digits):
+    result = -1 if B64_REVERSE[digits[0]] & 0x20 else 0
+    for digit in digits:
+        result = (result << 6) + B64_REVERSE[digit]
+    return result
+
+def encode(value: int, n_digits: int) -> str:
+    value &= (1 << (6 * n_digits)) - 1
+    return ''.join(B64_DIGITS[(value >> (6 * i)) & 0x3F] for i in reversed(range(n_digits)))
+
+def make_hash(item_ids, skillpoints, rest="0000"):
+    return ''.join(encode(i, 3) for i in item_ids) + ''.join(encode(sp, 2) for sp in skillpoints) + rest
+
+def test_matches_reference_decoder():
+    rng = random.Random(0)
+    for _ in range(500):
+        digits = ''.join(rng.choice(B64_DIGITS) for _ in range(rng.randint(1, 4)))
+        assert to_int(digits) == reference_to_int(digits)
+        assert to_int_signed(digits) == reference_to_int_signed(digits)
+
+def test_decode_hash():
+    item_ids = [0, 1, 63, 64, 4095, 262143, 1234, 99, 7]
+    skillpoints = [0, 5, -5, 2047, -2048]
+    assert decode_hash(make_hash(item_ids, skillpoints)) == (item_ids, skillpoints)
+
+@pytest.mark.parametrize("bad", ["short", make_hash([0] * N_EQUIPS, [0] * 5)[:-5] + "!!!!!!", "é" * 40])
+def test_decode_hash_errors(bad):
+    with pytest.raises(BuildDecodeError):
+        decode_hash(bad)
+
+class FakeItems:
+    def simplified(self, item_id):
+        return {"id": item_id, "name": f"item{item_id}"} if item_id < 100 else None
+
+def test_decode_builds():
+    url = "https://wynnbuilder.github.io/#5_" + make_hash([1, 2, 3, 4, 5, 6, 7, 8, 500], [1, 2, 3, 4, 5])
+    build = decode_build(url, FakeItems())
+    assert build["sp"] == [1, 2, 3, 4, 5]
+    assert build["equips"][0] == {"id": 1, "name": "item1"}
+    assert build["equips"][8] == {"id": -1, "name": DEFAULT_SLOTS[8]}
+    decoded = decode_builds([url, "", "not a url"], FakeItems())
+    assert [(error is None) for _, _, error in decoded] == [True, False]
+
+class MemoItems:
+    def __init__(self):
+        self.cache = {}
+
+    def simplified(self, item_id):
+        return self.cache.setdefault(item_id, {"id": item_id, "name": f"item{item_id}", "sp": [0] * 5})
+
+def test_decoded_builds_are_fresh_dicts():
+    items = MemoItems()
+    url = "https://wynnbuilder.github.io/#5_" + make_hash([1] * N_EQUIPS, [0] * 5)
+    first = decode_build(url, items)
+    first["equips"][0]["name"] = "edited"
+    first["equips"][1]["sp"][0] = 99
+    second = decode_build(url, items)
+    assert second["equips"][0]["name"] == "item1"
+    assert second["equips"][1]["sp"] == [0] * 5
+    assert items.cache[1] == {"id": 1, "name": "item1", "sp": [0] * 5}
@@ -0,0 +1,161 @@
+"""
+Helpers for serving cacheable HTTP responses from the dashboard server.
+
+A CachedResponse is built once (body, gzipped body, strong ETags) and can be
+sent any number of times; conditional GETs with a matching If-None-Match get
+a 304 with no body. The gzipped body is a different representation, so it has
+its own ETag (the plain one with a "-gzip" suffix).
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import os
+import posixpath
+import time
+from http.server import BaseHTTPRequestHandler
+from threading import Lock
+from urllib.parse import unquote
+
+# Don't bother compressing tiny bodies.
+GZIP_MIN_SIZE = 512
+
+# Static files the dashboard server is allowed to serve, and their content types.
+STATIC_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".txt": "text/plain; charset=utf-8",
+}
+# Revalidate every request (cheap: 304 from memory), so edits show up without a hard refresh.
+STATIC_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+# Don't stat a file more often than this.
+STATIC_CHECK_SECONDS = float(os.environ.get('STATIC_CHECK_SECONDS', 2.0))
+
+class CachedResponse:
+    """
+    Immutable pre-encoded response body.
+    """
+    __slots__ = ("body", "gzip_body", "content_type", "etag", "gzip_etag", "cache_control")
+
+    def __init__(self, body: bytes, content_type: str, etag: str = None, cache_control: str = "no-cache",
+                 gzip_level: int = 6):
+        """
+        body:           response bytes
+        content_type:   Content-Type header
+        etag:           strong etag (without quotes); defaults to a hash of the body
+        cache_control:  Cache-Control header
+        gzip_level:     compression level for the gzipped variant (None: no gzip, eg. for images)
+        """
+        self.body = body
+        self.content_type = content_type
+        if etag is None:
+            etag = hashlib.sha1(body).hexdigest()
+        self.etag = f'"{etag}"'
+        self.gzip_etag = f'"{etag}-gzip"'
+        self.cache_control = cache_control
+        if gzip_level is not None and len(body) >= GZIP_MIN_SIZE:
+            self.gzip_body = gzip.compress(body, compresslevel=gzip_level, mtime=0)
+        else:
+            self.gzip_body = None
+
+def etag_matches(handler: BaseHTTPRequestHandler, etag: str) -> bool:
+    header = handler.headers.get('If-None-Match', None)
+    if header is None:
+        return False
+    return header.strip() == '*' or etag in (tag.strip() for tag in header.split(','))
+
+def accepts_gzip(handler: BaseHTTPRequestHandler) -> bool:
+    return 'gzip' in handler.headers.get('Accept-Encoding', '')
+
+def send_cached(handler: BaseHTTPRequestHandler, response: CachedResponse, head_only: bool = False):
+    """
+    Send a cached response, answering conditional requests with 304 and using gzip if accepted.
+    """
+    gzipped = response.gzip_body is not None and accepts_gzip(handler)
+    if gzipped:
+        body, etag = response.gzip_body, response.gzip_etag
+    else:
+        body, etag = response.body, response.etag
+    if etag_matches(handler, etag):
+        handler.send_response(304)
+        handler.send_header('ETag', etag)
+        handler.send_header('Cache-Control', response.cache_control)
+        handler.send_header('Vary', 'Accept-Encoding')
+        handler.end_headers()
+        return
+    handler.send_response(200)
+    handler.send_header('Content-Type', response.content_type)
+    handler.send_header('ETag', etag)
+    handler.send_header('Cache-Control', response.cache_control)
+    handler.send_header('Vary', 'Accept-Encoding')
+    if gzipped:
+        handler.send_header('Content-Encoding', 'gzip')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    if not head_only:
+        handler.wfile.write(body)
+
+class StaticAssets:
+    """
+    In-memory cache of the static dashboard files.
+
+    Each file is read and gzipped (level 9) once, then served from memory with a strong etag.
+    Files are re-read when their mtime/size changes; the stat itself is throttled to once
+    every `check_interval` seconds per file.
+    """
+    def __init__(self, root: str, types: dict = STATIC_TYPES, check_interval: float = STATIC_CHECK_SECONDS):
+        self.root = os.path.realpath(root)
+        self.types = types
+        self.check_interval = check_interval
+        self._lock = Lock()
+        self._files = {}    # relative path -> [stat key, CachedResponse, last check time]
+
+    def resolve(self, url_path: str):
+        """
+        Map a url path to a file under root. Return None if it is not an allowed static file.
+        """
+        path = posixpath.normpath(unquote(url_path)).lstrip('/')
+        if path in ('', '.'):
+            path = 'index.html'
+        if posixpath.splitext(path)[1] not in self.types:
+            return None
+        full = os.path.realpath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            return None
+        return full
+
+    def _load(self, full: str) -> CachedResponse:
+        with open(full, 'rb') as f:
+            body = f.read()
+        content_type = self.types[os.path.splitext(full)[1]]
+        return CachedResponse(body, content_type, cache_control=STATIC_CACHE_CONTROL, gzip_level=9)
+
+    def get(self, url_path: str):
+        """
+        Cached response for a url path, or None (not allowed or not found).
+        """
+        full = self.resolve(url_path)
+        if full is None:
+            return None
+        now = time.monotonic()
+        entry = self._files.get(full, None)
+        if entry is not None and now - entry[2] < self.check_interval:
+            return entry[1]
+        try:
+            st = os.stat(full)
+        except OSError:
+            with self._lock:
+                self._files.pop(full, None)
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        if entry is not None and entry[0] == key:
+            entry[2] = now
+            return entry[1]
+        try:
+            response = self._load(full)
+        except OSError:
+            return None
+        with self._lock:
+            self._files[full] = [key, response, now]
+        return response
@@ -0,0 +1,126 @@
+"""
+WynnBuilder build hash decoding (v5 urls).
+
+Hash layout (base 64, digits "0-9A-Za-z+-"):
+    9 x 3 digits    item ids (helmet, chestplate, leggings, boots, ring1, ring2, bracelet, necklace, weapon)
+    5 x 2 digits    assigned skillpoints (signed)
+    ...             (level, powders, tomes; ignored)
+
+Digits are decoded with one bytes.translate() over a 256 entry table rather
+than a dict lookup per character, so decoding a spreadsheet worth of urls is
+cheap. Item lookups are memoized per item id by the ItemDatabase; each build
+gets its own copies, so builds can be edited without touching the cache.
+
+Usage: python3 wynnbuilder.py urls.txt     (prints decoded builds as json)
+"""
+from __future__ import annotations
+
+import json
+from copy import deepcopy
+from typing import Iterable, List, Tuple
+
+B64_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz+-"
+_INVALID = 0xFF
+_B64_TABLE = bytearray([_INVALID] * 256)
+for _value, _digit in enumerate(B64_DIGITS):
+    _B64_TABLE[ord(_digit)] = _value
+_B64_TABLE = bytes(_B64_TABLE)
+
+N_EQUIPS = 9
+N_SKILLPOINTS = 5
+ID_DIGITS = 3
+SP_DIGITS = 2
+V5_MIN_LENGTH = N_EQUIPS*ID_DIGITS + N_SKILLPOINTS*SP_DIGITS
+DEFAULT_SLOTS = ["No "+x for x in ["Helmet", "Chestplate", "Leggings", "Boots", "Ring 1", "Ring 2", "Bracelet", "Necklace", "Weapon"]]
+
+class BuildDecodeError(ValueError):
+    pass
+
+def b64_values(digits: str) -> bytes:
+    """
+    Digit values of a base 64 string (one byte per digit).
+    """
+    try:
+        values = digits.encode('ascii').translate(_B64_TABLE)
+    except UnicodeEncodeError:
+        raise BuildDecodeError(f"Invalid characters in {digits!r}")
+    if _INVALID in values:
+        raise BuildDecodeError(f"Invalid characters in {digits!r}")
+    return values
+
+def to_int(digits: str) -> int:
+    result = 0
+    for value in b64_values(digits):
+        result = (result << 6) + value
+    return result
+
+def to_int_signed(digits: str) -> int:
+    values = b64_values(digits)
+    result = -1 if values[0] & 0x20 else 0
+    for value in values:
+        result = (result << 6) + value
+    return result
+
+def hash_from_url(url: str) -> str:
+    """
+    Build hash part of a wynnbuilder url (`...#5_<hash>`).
+    """
+    url = url.strip()
+    if '_' not in url:
+        raise BuildDecodeError(f"Not a wynnbuilder url: {url!r}")
+    return url.split('_')[1]
+
+def decode_hash(wb_hash: str) -> Tuple[List[int], List[int]]:
+    """
+    Decode a v5 build hash. Return (item ids, skillpoints).
+    """
+    if len(wb_hash) < V5_MIN_LENGTH:
+        raise BuildDecodeError(f"Build hash too short ({len(wb_hash)} < {V5_MIN_LENGTH})")
+    values = b64_values(wb_hash[:V5_MIN_LENGTH])
+    item_ids = [(values[i] << 12) | (values[i+1] << 6) | values[i+2]
+                    for i in range(0, N_EQUIPS*ID_DIGITS, ID_DIGITS)]
+    skillpoints = []
+    for i in range(N_EQUIPS*ID_DIGITS, V5_MIN_LENGTH, SP_DIGITS):
+        value = (values[i] << 6) | values[i+1]
+        if values[i] & 0x20:
+            value -= 1 << 12
+        skillpoints.append(value)
+    return item_ids, skillpoints
+
+def decode_build(url: str, items) -> dict:
+    """
+    Decode a wynnbuilder url into a research build ({"equips", "sp"}), made of fresh dicts.
+    items: ItemDatabase
+    """
+    item_ids, skillpoints = decode_hash(hash_from_url(url))
+    equips = []
+    for slot, item_id in enumerate(item_ids):
+        item = items.simplified(item_id)
+        if item is None:
+            equips.append({"id": -1, "name": DEFAULT_SLOTS[slot]})
+        else:
+            equips.append(deepcopy(item))
+    return {"equips": equips, "sp": skillpoints}
+
+def decode_builds(urls: Iterable[str], items) -> List[Tuple[str, dict, str]]:
+    """
+    Decode many urls (blank lines skipped). Return a list of (url, build, error);
+    exactly one of build and error is None.
+    """
+    result = []
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        try:
+            result.append((url, decode_build(url, items), None))
+        except BuildDecodeError as e:
+            result.append((url, None, str(e)))
+    return result
+
+if __name__ == "__main__":
+    import sys
+    from itemdb import ItemDatabase
+    with open(sys.argv[1], 'r') as url_file:
+        decoded = decode_builds(url_file, ItemDatabase())
+    print(json.dumps([{"url": url, "build": build, "error": error} for url, build, error in decoded], indent=2))